@@ -0,0 +1,92 @@
+import discord
+import logging
+from discord import app_commands
+from discord.ext import commands
+from typing import List
+
+
+log = logging.getLogger(__name__)
+
+
+class AdminHandler(commands.Cog):
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+
+    async def reload_config(self) -> str:
+        try:
+            changed = await self.bot.reload_guild_config()
+        except (OSError, ValueError) as error:
+            log.warning("Guild config reload failed: %s", error)
+            return f"설정 파일에 오류가 있어 이전 설정을 유지해요.\n`{error}`"
+
+        if not changed:
+            return "설정이 바뀌지 않았어요."
+        return f"서버 {len(self.bot.guild_config.all())}곳의 설정을 다시 불러왔어요."
+
+    async def reload_extension(self, extension: str) -> str:
+        try:
+            result = await self.bot.reloader.reload(extension)
+        except commands.ExtensionNotLoaded:
+            return f"`{extension}` 확장은 불러온 적이 없어요."
+        except commands.ExtensionError as error:
+            log.warning("Reloading %s failed", extension, exc_info=error)
+            return f"`{extension}` 다시 불러오기에 실패해 이전 버전으로 되돌렸어요.\n`{error.__cause__ or error}`"
+
+        message = f"`{extension}` 다시 불러오기 완료 ({result.seconds * 1000:.0f}ms)"
+        if result.handed_off:
+            message += f"\n상태 인계 : `{'` `'.join(result.handed_off)}`"
+        if result.synced:
+            message += "\n명령어 목록이 바뀌어 다시 동기화했어요."
+        return message
+
+    async def extension_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=extension, value=extension)
+            for extension in sorted(self.bot.extensions)
+            if current.lower() in extension.lower()
+        ][:25]
+
+    @app_commands.command(name="reload", description="확장을 재시작 없이 다시 불러와요.")
+    @app_commands.describe(extension="다시 불러올 확장, 예: Cogs.role_handler")
+    @app_commands.autocomplete(extension=extension_autocomplete)
+    @app_commands.default_permissions(administrator=True)
+    async def reload_command(self, interaction: discord.Interaction, extension: str):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("봇 관리자만 사용할 수 있어요.", ephemeral=True)
+            return
+
+        if self.bot.ipc:
+            # Every shard process reloads its own copy, including this one
+            await self.bot.ipc.broadcast("reload_extension", extension)
+            await interaction.response.send_message(f"모든 샤드 프로세스에 `{extension}` 다시 불러오기를 요청했어요.", ephemeral=True)
+            return
+
+        # the reload itself is well under the 3 second deadline, a tree sync may not be
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        await interaction.followup.send(await self.reload_extension(extension), ephemeral=True)
+
+    @app_commands.command(name="reload-config", description="서버별 설정 파일을 다시 불러와요.")
+    @app_commands.default_permissions(administrator=True)
+    async def reload_config_command(self, interaction: discord.Interaction):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("봇 관리자만 사용할 수 있어요.", ephemeral=True)
+            return
+
+        if self.bot.ipc:
+            # Every shard process reloads its own copy, including this one
+            await self.bot.ipc.broadcast("reload_config")
+            await interaction.response.send_message("모든 샤드 프로세스에 설정 다시 불러오기를 요청했어요.", ephemeral=True)
+            return
+
+        await interaction.response.send_message(await self.reload_config(), ephemeral=True)
+
+    @commands.Cog.listener()
+    async def on_ipc_broadcast(self, name: str, data):
+        if name == "reload_config":
+            log.info("Guild config reload requested over IPC: %s", await self.reload_config())
+        elif name == "reload_extension":
+            log.info("Extension reload requested over IPC: %s", await self.reload_extension(data))
+
+
+async def setup(bot):
+    await bot.add_cog(AdminHandler(bot))
@@ -2,23 +2,45 @@ import discord
 from discord.ext import commands
 import datetime
 from common import config
-import utils
-from typing import Optional
+from typing import Dict, List, Optional
+from common.bootstrap import Channel, Dependency, Registry
+from common.sender import Priority
 
 
 class ChannelEntryHandler(commands.Cog):
+    bootstrap_partial = True
+    handoff_attributes = ("welcome_channels", "goodbye_channels")
+
     def __init__(self, bot: discord.Client):
         self.bot = bot
-        self.welcome_channel: Optional[discord.TextChannel] = None
-        self.goodbye_channel: Optional[discord.TextChannel] = None
+        # per guild id
+        self.welcome_channels: Dict[int, discord.TextChannel] = {}
+        self.goodbye_channels: Dict[int, discord.TextChannel] = {}
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        self.welcome_channel: discord.TextChannel = await utils.get_channel_by_id(self.bot, config.WELCOME_CHANNEL_ID)
-        self.goodbye_channel: discord.TextChannel = await utils.get_channel_by_id(self.bot, config.GOODBYE_CHANNEL_ID)
+    def bootstrap_requires(self) -> List[Dependency]:
+        dependencies: List[Dependency] = []
+        for guild_config in self.bot.guild_config.all():
+            dependencies.append(Channel(guild_config.welcome_channel_id))
+            dependencies.append(Channel(guild_config.goodbye_channel_id))
+        return dependencies
+
+    async def on_bootstrap_ready(self, registry: Registry):
+        self.welcome_channels = {}
+        self.goodbye_channels = {}
+        for guild_config in self.bot.guild_config.all():
+            welcome_channel: Optional[discord.TextChannel] = registry.channel(guild_config.welcome_channel_id)
+            goodbye_channel: Optional[discord.TextChannel] = registry.channel(guild_config.goodbye_channel_id)
+            if welcome_channel is not None:
+                self.welcome_channels[welcome_channel.guild.id] = welcome_channel
+            if goodbye_channel is not None:
+                self.goodbye_channels[goodbye_channel.guild.id] = goodbye_channel
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
+        welcome_channel = self.welcome_channels.get(member.guild.id)
+        if welcome_channel is None:
+            return
+
         welcome_log_embed = discord.Embed(
             description=f"{member.mention} 님이 서버에 입장하셨습니다.",
             color=discord.Color.green(),
@@ -29,14 +51,21 @@ class ChannelEntryHandler(commands.Cog):
             icon_url=config.SERVER_ICON_URL
         )
 
-        await self.welcome_channel.send(
-            embed=welcome_log_embed
+        self.bot.sender.send(
+            welcome_channel,
+            embed=welcome_log_embed,
+            priority=Priority.LOG,
         )
 
     @commands.Cog.listener()
-    async def on_member_remove(self, member: discord.Member):
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # The raw event also fires for members that are not in the member cache
+        goodbye_channel = self.goodbye_channels.get(payload.guild_id)
+        if goodbye_channel is None:
+            return
+
         goodbye_log_embed = discord.Embed(
-            description=f"{member.mention} 님이 서버에서 나가셨습니다.",
+            description=f"{payload.user.mention} 님이 서버에서 나가셨습니다.",
             color=discord.Color.green(),
             timestamp=datetime.datetime.now(),
         )
@@ -45,8 +74,10 @@ class ChannelEntryHandler(commands.Cog):
             icon_url=config.SERVER_ICON_URL
         )
 
-        await self.goodbye_channel.send(
-            embed=goodbye_log_embed
+        self.bot.sender.send(
+            goodbye_channel,
+            embed=goodbye_log_embed,
+            priority=Priority.LOG,
         )
 
 
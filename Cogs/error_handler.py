@@ -1,46 +1,135 @@
+import asyncio
 import discord
+import io
+import logging
 
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
+from collections import deque
 from logging import ERROR as LOG_ERROR, CRITICAL as LOG_CRITICAL
-from typing import Optional
-import utils
+from typing import Deque, List, Optional
 from common import config
+from common.bootstrap import Channel, Dependency, Registry
+from common.error_aggregator import ErrorAggregator, ErrorGroup
+from common.sender import Priority
+from common.structured_logging import get_pipeline
+
+
+log = logging.getLogger(__name__)
 
 
 class ErrorHandler(commands.Cog, name="errors"):
     """Errors handler."""
 
+    handoff_attributes = ("ERROR_LOGGING_CHANNEL", "errors", "early_errors")
+
     def __init__(self, bot: discord.Client) -> None:
         self.bot = bot
         bot.tree.error(coro=self.__dispatch_to_app_command_handler)
         self.ERROR_LOGGING_CHANNEL = None
+        self.errors = ErrorAggregator(
+            window=config.ERROR_SUMMARY_WINDOW,
+            max_reports_per_window=config.ERROR_MAX_REPORTS_PER_WINDOW,
+        )
+        # reported before the channel was resolved, sent by on_bootstrap_ready
+        self.early_errors: Deque[ErrorGroup] = deque(maxlen=config.ERROR_MAX_REPORTS_PER_WINDOW)
 
         self.default_error_message = "🕳️ There is an error."
 
-    @ commands.Cog.listener()
-    async def on_ready(self):
-        self.ERROR_LOGGING_CHANNEL: Optional[discord.TextChannel] = await utils.get_channel_by_id(self.bot, config.ERROR_LOGGING_CHANNEL_ID)
+    def bootstrap_requires(self) -> List[Dependency]:
+        return [Channel(config.ERROR_LOGGING_CHANNEL_ID)]
 
-    async def trace_error(self, level: str, error: Exception):
-        if not self.ERROR_LOGGING_CHANNEL:
-            raise error
+    async def on_bootstrap_ready(self, registry: Registry):
+        self.ERROR_LOGGING_CHANNEL: Optional[discord.TextChannel] = registry.channel(config.ERROR_LOGGING_CHANNEL_ID)
+        while self.ERROR_LOGGING_CHANNEL and self.early_errors:
+            self.send_error(self.early_errors.popleft())
+
+    async def cog_load(self):
+        self.flush_error_summary.start()
+        # ERROR records of every logger reach the channel too, see common/structured_logging.py
+        if pipeline := get_pipeline():
+            pipeline.discord.attach(asyncio.get_running_loop(), self.report_record)
 
-        error_embed = discord.Embed(
-            title=f"Error",
+    async def cog_drain(self, timeout: float):
+        # the repeats counted since the last summary would be lost otherwise
+        await self.flush_error_summary()
+
+    async def cog_unload(self):
+        self.flush_error_summary.cancel()
+        if pipeline := get_pipeline():
+            pipeline.discord.detach()
+
+    def build_error_embed(self, group: ErrorGroup, title: str) -> discord.Embed:
+        return discord.Embed(
+            title=title,
             description=f"""
-            message : `{type(error).__name__}`
-            error : `{error}`
-            level : `{level}`
-            File : `{error.__traceback__.tb_frame.f_code.co_filename}`
-            Line : `{error.__traceback__.tb_lineno}`
+            message : `{group.fingerprint.type}`
+            error : `{group.message}`
+            level : `{group.fingerprint.event}`
+            File : `{group.fingerprint.file}`
+            Line : `{group.fingerprint.line}`
             """,
             color=discord.Color.red(),
         )
 
-        await self.ERROR_LOGGING_CHANNEL.send(embed=error_embed)
+    def build_traceback_file(self, group: ErrorGroup) -> discord.File:
+        return discord.File(io.BytesIO(group.first_traceback.encode()), filename="traceback.txt")
+
+    def send_error(self, group: ErrorGroup):
+        self.bot.sender.send(
+            self.ERROR_LOGGING_CHANNEL,
+            embed=self.build_error_embed(group, "Error"),
+            file=self.build_traceback_file(group),
+            priority=Priority.ERROR,
+        )
 
-        raise error
+    def report_error(self, level: str, error: Exception):
+        # Repeats of the same error are only counted, see flush_error_summary
+        group = self.errors.record(level, error)
+        if group is None:
+            return
+        if self.ERROR_LOGGING_CHANNEL:
+            self.send_error(group)
+        else:
+            self.early_errors.append(group)
+
+    def report_record(self, record: logging.LogRecord):
+        """The Discord sink of the log pipeline, called on the event loop.
+
+        Best effort: a failed send is logged by the sender and comes back here,
+        where the aggregator counts it instead of sending it again.
+        """
+        error = record.exc_info[1] if record.exc_info else None
+        self.report_error(getattr(record, "event", None) or f"{record.name}:{record.lineno}", error or Exception(record.getMessage()))
+
+    async def trace_error(self, level: str, error: Exception, interaction: Optional[discord.Interaction] = None):
+        # The file sink gets it even before the channel is resolved, the channel is reported to directly
+        extra = {"event": level, "reported": True}
+        if interaction is not None:
+            extra.update(guild_id=interaction.guild_id, channel_id=interaction.channel_id, member_id=interaction.user.id)
+        log.error("%s: %s", level, error, exc_info=error, extra=extra)
+        self.report_error(level, error)
+        # Not raised again, Client.on_error would log it without the reported flag
+        # and the Discord sink would post it a second time under another fingerprint
+
+    @tasks.loop(seconds=config.ERROR_SUMMARY_WINDOW)
+    async def flush_error_summary(self):
+        if not self.ERROR_LOGGING_CHANNEL:
+            return
+
+        summary, skipped = self.errors.summarize()
+        for index, (group, count) in enumerate(summary):
+            error_embed = self.build_error_embed(group, f"Error x{count} in the last {config.ERROR_SUMMARY_WINDOW:.0f}s")
+            if skipped and index == len(summary) - 1:
+                error_embed.add_field(name="Skipped", value=f"{skipped} more error(s) were rate limited")
+            self.bot.sender.send(
+                self.ERROR_LOGGING_CHANNEL,
+                embed=error_embed,
+                file=self.build_traceback_file(group),
+                priority=Priority.ERROR,
+            )
+
+        self.errors.prune()
 
     async def __dispatch_to_app_command_handler(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
         self.bot.dispatch("app_command_error", interaction, error)
@@ -127,13 +216,16 @@ class ErrorHandler(commands.Cog, name="errors"):
         # HybridCommandError
         except commands.HybridCommandError as d_error:
             await self.get_app_command_error(ctx.interaction, error)
+        except Exception:
+            # already reported by trace_error
+            pass
 
     @ commands.Cog.listener("on_app_command_error")
     async def get_app_command_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
         """App command Error Handler
         doc: https://discordpy.readthedocs.io/en/latest/interactions/api.html#exception-hierarchy
         """
-        await self.trace_error("get_app_command_error", error)
+        await self.trace_error("get_app_command_error", error, interaction)
 
         try:
             await self.__respond_to_interaction(interaction)
@@ -166,21 +258,12 @@ class ErrorHandler(commands.Cog, name="errors"):
     @ commands.Cog.listener("on_view_error")
     async def get_view_error(self, interaction: discord.Interaction, error: Exception, item: any):
         """View Error Handler"""
-        await self.trace_error("get_view_error", error)
-
-        try:
-            raise error
-        except discord.errors.Forbidden:
-            pass
+        await self.trace_error("get_view_error", error, interaction)
 
     @ commands.Cog.listener("on_modal_error")
     async def get_modal_error(self, interaction: discord.Interaction, error: Exception):
         """Modal Error Handler"""
-        await self.trace_error("get_modal_error", error)
-        try:
-            raise error
-        except discord.errors.Forbidden:
-            pass
+        await self.trace_error("get_modal_error", error, interaction)
 
 
 async def setup(bot: discord.Client):
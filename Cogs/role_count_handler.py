@@ -0,0 +1,40 @@
+import discord
+from discord.ext import commands
+from typing import Optional
+from Cogs.role_handler import RoleHandler
+
+
+class RoleCountHandler(commands.Cog):
+    """Keeps the member counts of the role panels current.
+
+    Only loaded with config.ROLE_COUNTS, on_member_update and on_member_remove
+    only fire for cached members, so these listeners make the bot chunk every
+    guild at startup.
+    """
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+
+    @property
+    def role_handler(self) -> Optional[RoleHandler]:
+        # looked up per event, the role handler may have been reloaded since
+        return self.bot.get_cog("RoleHandler")
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        if self.role_handler:
+            self.role_handler.count_role_change(member.guild.id, member.id, (), member.roles)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if self.role_handler and before.roles != after.roles:
+            self.role_handler.count_role_change(after.guild.id, after.id, before.roles, after.roles)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        if self.role_handler and self.role_handler.role_counts.remove(member.guild.id, member.id):
+            self.role_handler.schedule_refresh(member.guild.id)
+
+
+async def setup(bot):
+    await bot.add_cog(RoleCountHandler(bot))
@@ -3,45 +3,114 @@ from discord.ext import commands
 from common import config
 import utils
 import asyncio
-from typing import Optional
+import logging
+from typing import Dict, Iterable, List, Optional
+from common.bootstrap import Channel, Dependency, Registry
+from common.deferred import DeferredScheduler
+from common.interaction import fast_ack
+from common.panel import Panel, PanelState, panel_hash, reconcile_panels
+from common.role_counts import RoleCounter
+from common.role_mutation import RoleMutationQueue
+from common.sender import Priority
+
+
+log = logging.getLogger(__name__)
 
 
 class RoleHandler(commands.Cog):
+    bootstrap_partial = True
+    handoff_attributes = ("panel_messages", "role_assignment_channels", "role_mutations", "role_counts", "refreshes")
+
     def __init__(self, bot: discord.Client):
         self.bot = bot
-        self.role_assignment_channel: Optional[discord.TextChannel] = None
+        # per role assignment channel id
+        self.panel_messages: Dict[int, PanelState] = {}
+        # per guild id
+        self.role_assignment_channels: Dict[int, discord.TextChannel] = {}
+        self.role_mutations = RoleMutationQueue()
+
+        # members per panel role, shown on the panels and edited at most once per refresh interval
+        self.role_counts = RoleCounter(self.panel_role_ids)
+        self.refreshes = DeferredScheduler(max_concurrency=1)
 
     class role_button(discord.ui.Button):
-        def __init__(self, label: str, emoji: Optional[str], style: discord.ButtonStyle, role: discord.Role, no_duplicate_role_ids: list = []):
-            super().__init__(label=label, emoji=emoji, style=style)
-            self.role = role
-            self.no_duplicate_role_ids = no_duplicate_role_ids
+        def __init__(self, label: str, emoji: Optional[str], style: discord.ButtonStyle, role_id: int, cog: "RoleHandler"):
+            super().__init__(label=label, emoji=emoji, style=style, custom_id=f"role_button:{role_id}")
+            self.role_id = role_id
+            self.cog = cog
+            self.mutations = cog.role_mutations
 
+        @fast_ack()
         async def callback(self, interaction: discord.Interaction):
-            # already has role
-            if self.role in interaction.user.roles:
-                await interaction.user.remove_roles(self.role)
-                await interaction.response.send_message(f"{interaction.user.mention} `{self.role.name}` 역할이 삭제되었습니다!", ephemeral=True)
-                return
-
-            # remove duplicate roles
-            remove_roles = [
-                role for role in interaction.user.roles if role.id in self.no_duplicate_role_ids]
-            for remove_role in remove_roles:
-                await interaction.user.remove_roles(await utils.get_role(interaction.guild, remove_role))
-
-            # add role
-            await interaction.user.add_roles(self.role)
-
-            await interaction.response.send_message(f"{interaction.user.mention} `{self.role.name}` 역할이 추가되었습니다!", ephemeral=True)
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        self.role_assignment_channel: discord.TextChannel = await utils.get_channel_by_id(self.bot, config.ROLE_ASSIGNMENT_CHANNEL_ID)
-
-        # init channel
-        await self.role_assignment_channel.purge()
+            # Acknowledged by fast_ack, the role change is applied together with other pending clicks
+            role = await utils.get_role_by_guild(interaction.guild, self.role_id)
+            if role is None:
+                log.warning("Panel role %s not found in guild %s", self.role_id, interaction.guild_id)
+                return "이 역할을 찾을 수 없어요. 관리자에게 문의해 주세요."
 
+            # already has role
+            if self.role_id in self.mutations.projected_role_ids(interaction.user):
+                pending = self.mutations.submit(interaction.user, remove=[self.role_id])
+                message = f"{interaction.user.mention} `{role.name}` 역할이 삭제되었습니다!"
+            else:
+                # remove the roles this one conflicts with in this guild and add role
+                guild_config = interaction.client.guild_config.get(interaction.guild_id)
+                remove_role_ids = list(guild_config.conflicts(self.role_id)) if guild_config else []
+                pending = self.mutations.submit(interaction.user, add=[self.role_id], remove=remove_role_ids)
+                message = f"{interaction.user.mention} `{role.name}` 역할이 추가되었습니다!"
+
+            roles: List[discord.Role] = await pending
+            # the member update that follows from the gateway is then a no-op
+            self.cog.count_member(interaction.guild_id, interaction.user.id, roles)
+            panel_roles = [role.name for role in roles if role.id in RoleHandler.panel_role_ids]
+            if panel_roles:
+                message += f"\n현재 역할 : `{'` `'.join(panel_roles)}`"
+
+            return message
+
+    interests = [
+        ("FE", "🧑‍💻", discord.ButtonStyle.primary, config.FE_ROLE_ID),
+        ("BE", "👨‍💻", discord.ButtonStyle.primary, config.BE_ROLE_ID),
+        ("AI", "🤖", discord.ButtonStyle.primary, config.AI_ROLE_ID),
+        ("Data", "📊", discord.ButtonStyle.primary, config.DATA_ROLE_ID),
+        ("Blockchain", "🔗", discord.ButtonStyle.primary, config.BLOCKCHAIN_ROLE_ID),
+        ("Game", "🎮", discord.ButtonStyle.primary, config.GAME_ROLE_ID),
+        ("iOS", "📱", discord.ButtonStyle.primary, config.IOS_ROLE_ID),
+        ("Android", "📱", discord.ButtonStyle.primary, config.ANDROID_ROLE_ID),
+        ("Cloud", "☁️", discord.ButtonStyle.primary, config.CLOUD_ROLE_ID),
+        ("Devops", "🛠", discord.ButtonStyle.primary, config.DEVOPS_ROLE_ID),
+        ("Security", "🔒", discord.ButtonStyle.primary, config.SECURITY_ROLE_ID),
+        ("Embedded", "🔌", discord.ButtonStyle.primary, config.EMBEDDED_ROLE_ID),
+    ]
+
+    languages = [
+        ("Java", "☕", discord.ButtonStyle.primary, config.JAVA_ROLE_ID),
+        ("Swift", "📱", discord.ButtonStyle.primary, config.SWIFT_ROLE_ID),
+        ("C/C++", None, discord.ButtonStyle.primary, config.C_ROLE_ID),
+        ("C#", None, discord.ButtonStyle.primary, config.CSHARP_ROLE_ID),
+        ("JS/TS", None, discord.ButtonStyle.primary, config.JS_ROLE_ID),
+        ("Python", "🐍", discord.ButtonStyle.primary, config.PYTHON_ROLE_ID),
+        ("Go", None, discord.ButtonStyle.primary, config.GO_ROLE_ID),
+        ("PHP", None, discord.ButtonStyle.primary, config.PHP_ROLE_ID),
+        ("Ruby", "♦️", discord.ButtonStyle.primary, config.RUBY_ROLE_ID),
+        ("Rust", "⚙️", discord.ButtonStyle.primary, config.RUST_ROLE_ID),
+    ]
+
+    panel_role_ids = {role_id for _, _, _, role_id in interests + languages}
+
+    def build_view(self, buttons: list) -> discord.ui.View:
+        view = discord.ui.View(timeout=None)
+        for label, emoji, style, role_id in buttons:
+            view.add_item(self.role_button(
+                label=label, emoji=emoji, style=style, role_id=role_id, cog=self))
+        return view
+
+    @staticmethod
+    def add_count_fields(embed: discord.Embed, buttons: list, counts: Dict[int, int]):
+        for label, emoji, _, role_id in buttons:
+            embed.add_field(name=f"{emoji} {label}" if emoji else label, value=f"{counts.get(role_id, 0)}명")
+
+    def build_panels(self, counts: Optional[Dict[int, int]] = None) -> List[Panel]:
         # interest roles
         interest_embed = discord.Embed(
             title="관심사",
@@ -54,30 +123,6 @@ class RoleHandler(commands.Cog):
             icon_url=config.SERVER_ICON_URL
         )
 
-        interest_view = discord.ui.View(timeout=None)
-
-        interests = [
-            ("FE", "🧑‍💻", discord.ButtonStyle.primary, config.FE_ROLE_ID),
-            ("BE", "👨‍💻", discord.ButtonStyle.primary, config.BE_ROLE_ID),
-            ("AI", "🤖", discord.ButtonStyle.primary, config.AI_ROLE_ID),
-            ("Data", "📊", discord.ButtonStyle.primary, config.DATA_ROLE_ID),
-            ("Blockchain", "🔗", discord.ButtonStyle.primary, config.BLOCKCHAIN_ROLE_ID),
-            ("Game", "🎮", discord.ButtonStyle.primary, config.GAME_ROLE_ID),
-            ("iOS", "📱", discord.ButtonStyle.primary, config.IOS_ROLE_ID),
-            ("Android", "📱", discord.ButtonStyle.primary, config.ANDROID_ROLE_ID),
-            ("Cloud", "☁️", discord.ButtonStyle.primary, config.CLOUD_ROLE_ID),
-            ("Devops", "🛠", discord.ButtonStyle.primary, config.DEVOPS_ROLE_ID),
-            ("Security", "🔒", discord.ButtonStyle.primary, config.SECURITY_ROLE_ID),
-            ("Embedded", "🔌", discord.ButtonStyle.primary, config.EMBEDDED_ROLE_ID),
-        ]
-
-        for label, emoji, style, role_id in interests:
-            role = await utils.get_role_by_guild(self.role_assignment_channel.guild, role_id)
-            interest_view.add_item(self.role_button(
-                label=label, emoji=emoji, style=style, role=role))
-
-        await self.role_assignment_channel.send(embed=interest_embed, view=interest_view)
-
         # language roles
         language_embed = discord.Embed(
             title="언어",
@@ -90,27 +135,86 @@ class RoleHandler(commands.Cog):
             icon_url=config.SERVER_ICON_URL
         )
 
-        language_view = discord.ui.View(timeout=None)
-
-        languages = [
-            ("Java", "☕", discord.ButtonStyle.primary, config.JAVA_ROLE_ID),
-            ("Swift", "📱", discord.ButtonStyle.primary, config.SWIFT_ROLE_ID),
-            ("C/C++", None, discord.ButtonStyle.primary, config.C_ROLE_ID),
-            ("C#", None, discord.ButtonStyle.primary, config.CSHARP_ROLE_ID),
-            ("JS/TS", None, discord.ButtonStyle.primary, config.JS_ROLE_ID),
-            ("Python", "🐍", discord.ButtonStyle.primary, config.PYTHON_ROLE_ID),
-            ("Go", None, discord.ButtonStyle.primary, config.GO_ROLE_ID),
-            ("PHP", None, discord.ButtonStyle.primary, config.PHP_ROLE_ID),
-            ("Ruby", "♦️", discord.ButtonStyle.primary, config.RUBY_ROLE_ID),
-            ("Rust", "⚙️", discord.ButtonStyle.primary, config.RUST_ROLE_ID),
-        ]
+        if counts is not None:
+            self.add_count_fields(interest_embed, self.interests, counts)
+            self.add_count_fields(language_embed, self.languages, counts)
 
-        for label, emoji, style, role_id in languages:
-            role = await utils.get_role_by_guild(self.role_assignment_channel.guild, role_id)
-            language_view.add_item(self.role_button(
-                label=label, emoji=emoji, style=style, role=role))
+        return [
+            Panel("interest", interest_embed, self.build_view(self.interests)),
+            Panel("language", language_embed, self.build_view(self.languages)),
+        ]
 
-        await self.role_assignment_channel.send(embed=language_embed, view=language_view)
+    async def cog_load(self):
+        # Buttons keep working across restarts without reposting the panels
+        for panel in self.build_panels():
+            self.bot.add_view(panel.view)
+
+    def bootstrap_requires(self) -> List[Dependency]:
+        return [Channel(guild_config.role_assignment_channel_id) for guild_config in self.bot.guild_config.all()]
+
+    async def on_bootstrap_ready(self, registry: Registry):
+        channels = [registry.channel(guild_config.role_assignment_channel_id) for guild_config in self.bot.guild_config.all()]
+        self.role_assignment_channels = {channel.guild.id: channel for channel in channels if channel is not None}
+        await asyncio.gather(*(self.reconcile_channel(channel) for channel in self.role_assignment_channels.values()))
+
+    async def reconcile_channel(self, role_assignment_channel: discord.TextChannel):
+        guild = role_assignment_channel.guild
+        counts = None
+        if config.ROLE_COUNTS:
+            if not guild.chunked and self.bot.intents.members:
+                await guild.chunk()
+            # the only full pass over the members, every later change is applied per event
+            self.role_counts.build(guild)
+            counts = self.role_counts.counts(guild.id)
+
+        # After a restart the panel message ids come from the state store
+        known = self.panel_messages.get(role_assignment_channel.id) or self.bot.store.panel_state(role_assignment_channel.id)
+        panels = self.build_panels(counts)
+        self.panel_messages[role_assignment_channel.id] = await reconcile_panels(role_assignment_channel, panels, known)
+        self.bot.store.save_panel_state(role_assignment_channel.id, self.panel_messages[role_assignment_channel.id])
+
+    def count_member(self, guild_id: int, user_id: int, roles: Iterable[discord.Role]):
+        if self.role_counts.update(guild_id, user_id, (role.id for role in roles)):
+            self.schedule_refresh(guild_id)
+
+    def count_role_change(self, guild_id: int, user_id: int, before: Iterable[discord.Role], after: Iterable[discord.Role]):
+        if self.role_counts.apply_change(guild_id, user_id, {role.id for role in before}, {role.id for role in after}):
+            self.schedule_refresh(guild_id)
+
+    def schedule_refresh(self, guild_id: int):
+        # Not rescheduled while pending, so a steady stream of changes still edits once per interval
+        if guild_id in self.role_assignment_channels and not self.refreshes.is_pending(guild_id):
+            self.refreshes.schedule(guild_id, config.ROLE_COUNT_REFRESH_INTERVAL, lambda: self.refresh_panels(guild_id))
+
+    async def refresh_panels(self, guild_id: int):
+        """Edit the panels whose counts changed since they were last posted."""
+        channel = self.role_assignment_channels.get(guild_id)
+        known = self.panel_messages.get(channel.id) if channel else None
+        if not known:
+            return
+
+        for panel in self.build_panels(self.role_counts.counts(guild_id)):
+            message_id, current_hash = known.get(panel.key, (None, None))
+            content_hash = panel_hash(panel)
+            if message_id is None or content_hash == current_hash:
+                continue
+
+            # only the embed changes, the buttons are left as they are
+            message = await self.bot.sender.submit(
+                channel.id,
+                lambda message_id=message_id, embed=panel.embed: channel.get_partial_message(message_id).edit(embed=embed),
+                priority=Priority.LOG,
+            )
+            # a deleted panel is reposted by the next bootstrap
+            if message is not None:
+                known[panel.key] = (message_id, content_hash)
+
+        self.bot.store.save_panel_state(channel.id, known)
+
+    async def cog_unload(self):
+        # pending refreshes carry over to the reloaded cog
+        if not self.bot.reloader.handing_off(self):
+            await self.refreshes.close()
 
 
 async def setup(bot):
@@ -3,15 +3,34 @@ from discord.ext import commands
 from common import config
 import utils
 import asyncio
-from typing import Optional
+import logging
+import math
+from discord import app_commands
+from typing import Dict, List, Optional
 from datetime import datetime
+from common.bootstrap import Channel, Dependency, Registry
+from common.interaction import fast_ack
+from common.panel import Panel, PanelState, reconcile_panels
+from common.pagination import Paginator
+from common.sender import Priority
+from common.store import Introduction
+
+
+log = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 5
 
 
 class SelfDescriptionHandler(commands.Cog):
+    bootstrap_partial = True
+    handoff_attributes = ("main_chat_channels", "panel_messages")
+
     def __init__(self, bot: discord.Client):
         self.bot = bot
-        self.self_description_channel: Optional[discord.TextChannel] = None
-        self.main_chat_channel: Optional[discord.TextChannel] = None
+        # per guild id
+        self.main_chat_channels: Dict[int, discord.TextChannel] = {}
+        # per self description channel id
+        self.panel_messages: Dict[int, PanelState] = {}
 
     class self_description_modal(discord.ui.Modal):
         def __init__(self, main_chat_channel: discord.TextChannel):
@@ -32,7 +51,8 @@ class SelfDescriptionHandler(commands.Cog):
             )
             self.add_item(self.github_url)
 
-        async def on_submit(self, interaction: discord.Interaction) -> None:
+        @fast_ack()
+        async def on_submit(self, interaction: discord.Interaction) -> str:
             introduction_embed = discord.Embed(
                 title="새로운 유저가 서버에 참여했어요!",
                 color=discord.Color.blue(),
@@ -55,20 +75,54 @@ class SelfDescriptionHandler(commands.Cog):
                 icon_url=interaction.user.display_avatar.url,
             )
 
-            default_role = await utils.get_role_by_guild(interaction.guild, config.DEFULT_ROLE_ID)
-            await interaction.user.add_roles(default_role)
-
-            await self.main_chat_channel.send(f"{interaction.user.mention}", embed=introduction_embed)
-            await interaction.response.send_message(f"{interaction.user.mention}자기소개가 완료되었습니다.", ephemeral=True)
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        self.self_description_channel: discord.TextChannel = await utils.get_channel_by_id(self.bot, config.SELF_DESCRIPTION_CHANNEL_ID)
-        self.main_chat_channel: discord.TextChannel = await utils.get_channel_by_id(self.bot, config.MAIN_CHAT_CHANNEL_ID)
-
-        # init channel
-        await self.self_description_channel.purge()
+            # Indexed for /search-intro and /whois, a resubmission replaces the previous introduction
+            interaction.client.store.save_introduction(
+                interaction.guild_id,
+                interaction.user.id,
+                interaction.user.name,
+                self.short_description.value,
+                self.github_url.value or "",
+            )
 
+            async def add_default_role():
+                guild_config = interaction.client.guild_config.get(interaction.guild_id)
+                if guild_config is None or not guild_config.default_role_id:
+                    return
+                default_role = await utils.get_role_by_guild(interaction.guild, guild_config.default_role_id)
+                # the introduction is still posted without it
+                if default_role is None:
+                    log.warning("Default role %s not found in guild %s", guild_config.default_role_id, interaction.guild_id)
+                    return
+                await interaction.user.add_roles(default_role)
+
+            # Acknowledged by fast_ack, the role and the introduction post do not depend on each other
+            await asyncio.gather(
+                add_default_role(),
+                interaction.client.sender.send(self.main_chat_channel, content=f"{interaction.user.mention}", embed=introduction_embed, priority=Priority.INTERACTION),
+            )
+            return f"{interaction.user.mention}자기소개가 완료되었습니다."
+
+    class self_description_button(discord.ui.Button):
+        def __init__(self, cog: "SelfDescriptionHandler"):
+            super().__init__(label="자기소개", style=discord.ButtonStyle.primary, custom_id="self_description_button")
+            self.cog = cog
+
+        async def callback(self, interaction: discord.Interaction):
+            # Opening the modal must be the first response, so it is not behind fast_ack
+            metrics = getattr(interaction.client, "metrics", None)
+            if metrics:
+                await metrics.time_callback(type(self).callback.__qualname__, self.open_modal(interaction))
+            else:
+                await self.open_modal(interaction)
+
+        async def open_modal(self, interaction: discord.Interaction):
+            main_chat_channel = self.cog.main_chat_channels.get(interaction.guild_id)
+            if main_chat_channel is None:
+                await interaction.response.send_message("이 서버에서는 자기소개를 받을 수 없어요.", ephemeral=True)
+                return
+            await interaction.response.send_modal(self.cog.self_description_modal(main_chat_channel))
+
+    def build_panels(self) -> List[Panel]:
         self_description_embed = discord.Embed(
             title="자기소개",
             description="자기소개에 따라 역할을 부여받을 수 있습니다.",
@@ -81,17 +135,112 @@ class SelfDescriptionHandler(commands.Cog):
         )
 
         self_description_view = discord.ui.View(timeout=None)
-        self_description_button = discord.ui.Button(
-            label="자기소개", style=discord.ButtonStyle.primary)
+        self_description_view.add_item(self.self_description_button(self))
 
-        async def self_description_button_callback(interaction: discord.Interaction):
-            await interaction.response.send_modal(self.self_description_modal(self.main_chat_channel))
+        return [Panel("self_description", self_description_embed, self_description_view)]
 
-        self_description_button.callback = self_description_button_callback
+    async def cog_load(self):
+        # Buttons keep working across restarts without reposting the panels
+        for panel in self.build_panels():
+            self.bot.add_view(panel.view)
+
+    def build_search_embed(self, query: str, introductions: List[Introduction], page: int, page_count: int, total: int) -> discord.Embed:
+        search_embed = discord.Embed(
+            title=f"'{query}' 검색 결과 {total}건",
+            color=discord.Color.blue(),
+        )
+        for introduction in introductions:
+            value = f"<@{introduction.user_id}> {introduction.snippet or introduction.short_description}"
+            if introduction.github_url:
+                value += f"\n{introduction.github_url}"
+            search_embed.add_field(name=introduction.name, value=value, inline=False)
+        search_embed.set_footer(
+            text=f"모도코 · {page + 1}/{page_count}",
+            icon_url=config.SERVER_ICON_URL
+        )
+        return search_embed
+
+    @app_commands.command(name="search-intro", description="자기소개를 검색해요.")
+    @app_commands.describe(query="검색어, 예: rust github")
+    @app_commands.guild_only()
+    async def search_intro(self, interaction: discord.Interaction, query: str):
+        store = self.bot.store
+        introductions, total = await store.search_introductions(interaction.guild_id, query, SEARCH_PAGE_SIZE)
+        if not total:
+            await interaction.response.send_message(f"'{query}'에 맞는 자기소개가 없어요.", ephemeral=True)
+            return
+
+        page_count = math.ceil(total / SEARCH_PAGE_SIZE)
+
+        async def render(page: int) -> discord.Embed:
+            page_introductions, page_total = await store.search_introductions(interaction.guild_id, query, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)
+            return self.build_search_embed(query, page_introductions, page, page_count, page_total)
+
+        kwargs = {"view": Paginator(interaction.user.id, page_count, render)} if page_count > 1 else {}
+        await interaction.response.send_message(
+            embed=self.build_search_embed(query, introductions, 0, page_count, total),
+            allowed_mentions=discord.AllowedMentions.none(),
+            ephemeral=True,
+            **kwargs,
+        )
 
-        self_description_view.add_item(self_description_button)
+    @app_commands.command(name="whois", description="맴버의 자기소개를 보여줘요.")
+    @app_commands.describe(member="자기소개를 볼 맴버")
+    @app_commands.guild_only()
+    async def whois(self, interaction: discord.Interaction, member: discord.Member):
+        introduction = await self.bot.store.introduction(interaction.guild_id, member.id)
+        if introduction is None:
+            await interaction.response.send_message(f"{member.mention} 님은 아직 자기소개를 하지 않았어요.", allowed_mentions=discord.AllowedMentions.none(), ephemeral=True)
+            return
 
-        await self.self_description_channel.send(embed=self_description_embed, view=self_description_view)
+        introduction_embed = discord.Embed(
+            color=discord.Color.blue(),
+            timestamp=datetime.fromtimestamp(introduction.updated_at),
+        )
+        introduction_embed.add_field(
+            name="한줄 자기소개",
+            value=introduction.short_description,
+            inline=False,
+        )
+        if introduction.github_url:
+            introduction_embed.add_field(
+                name="깃허브 주소",
+                value=introduction.github_url,
+                inline=False,
+            )
+        introduction_embed.set_author(
+            name=member.name,
+            icon_url=member.display_avatar.url,
+        )
+        await interaction.response.send_message(embed=introduction_embed, ephemeral=True)
+
+    def bootstrap_requires(self) -> List[Dependency]:
+        dependencies: List[Dependency] = []
+        for guild_config in self.bot.guild_config.all():
+            dependencies.append(Channel(guild_config.self_description_channel_id))
+            dependencies.append(Channel(guild_config.main_chat_channel_id))
+        return dependencies
+
+    async def on_bootstrap_ready(self, registry: Registry):
+        main_chat_channels: Dict[int, discord.TextChannel] = {}
+        self_description_channels: List[discord.TextChannel] = []
+        for guild_config in self.bot.guild_config.all():
+            self_description_channel: Optional[discord.TextChannel] = registry.channel(guild_config.self_description_channel_id)
+            main_chat_channel: Optional[discord.TextChannel] = registry.channel(guild_config.main_chat_channel_id)
+            # the panel is only posted where the introductions can be forwarded
+            if self_description_channel is None or main_chat_channel is None:
+                continue
+            main_chat_channels[main_chat_channel.guild.id] = main_chat_channel
+            self_description_channels.append(self_description_channel)
+        self.main_chat_channels = main_chat_channels
+
+        await asyncio.gather(*(self.reconcile_channel(channel) for channel in self_description_channels))
+
+    async def reconcile_channel(self, self_description_channel: discord.TextChannel):
+        # After a restart the panel message ids come from the state store
+        known = self.panel_messages.get(self_description_channel.id) or self.bot.store.panel_state(self_description_channel.id)
+        self.panel_messages[self_description_channel.id] = await reconcile_panels(self_description_channel, self.build_panels(), known)
+        self.bot.store.save_panel_state(self_description_channel.id, self.panel_messages[self_description_channel.id])
 
 
 async def setup(bot):
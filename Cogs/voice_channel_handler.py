@@ -1,52 +1,233 @@
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 from common import config
-import utils
 import asyncio
-from typing import Optional
+import functools
+import logging
+import time
+from typing import Dict, List, Optional
+from common.bootstrap import Channel, Dependency, Registry, Role
+from common.deferred import DeferredScheduler
+from common.metrics import LatencyStats
+from common.voice_pool import VoiceChannelPool
+from common.voice_sweeper import SweepReport, sweep
+
+
+log = logging.getLogger(__name__)
 
 
 class VoiceChannelHandler(commands.Cog):
+    bootstrap_partial = True
+    handoff_attributes = ("pools", "generator_channels", "authentication_roles", "deletions", "join_latency", "sweeps")
+
     def __init__(self, bot: discord.Client):
         self.bot = bot
-        self.auto_generator_channel: Optional[discord.VoiceChannel] = None
-        self.server_authentication_role: Optional[discord.Role] = None
+        # per guild id
+        self.pools: Dict[int, VoiceChannelPool] = {}
+        self.generator_channels: Dict[int, discord.VoiceChannel] = {}
+        self.authentication_roles: Dict[int, discord.Role] = {}
+        self.deletions = DeferredScheduler(max_concurrency=config.VOICE_CHANNEL_DELETE_CONCURRENCY)
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        self.auto_generator_channel: discord.VoiceChannel = await utils.get_channel_by_id(self.bot, config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID)
-        self.server_authentication_role = await utils.get_role_by_guild(self.auto_generator_channel.guild, config.SERVER_AUTHENTICATION_ROLE_ID)
+        # join-to-move latency, split by whether a pooled channel was available
+        self.join_latency = {
+            "pooled": LatencyStats(),
+            "created": LatencyStats(),
+        }
+        # last orphan sweep per guild id
+        self.sweeps: Dict[int, SweepReport] = {}
+        self.sweep_lock = asyncio.Lock()
+        self.ready_sweep: Optional[asyncio.Task] = None
+
+    def bootstrap_requires(self) -> List[Dependency]:
+        dependencies: List[Dependency] = []
+        for guild_config in self.bot.guild_config.all():
+            dependencies.append(Channel(guild_config.generator_channel_id))
+            dependencies.append(Role(guild_config.authentication_role_id, via=guild_config.generator_channel_id))
+        return dependencies
+
+    async def on_bootstrap_ready(self, registry: Registry):
+        active_guild_ids = set()
+        for guild_config in self.bot.guild_config.all():
+            auto_generator_channel: Optional[discord.VoiceChannel] = registry.channel(guild_config.generator_channel_id)
+            server_authentication_role = registry.role(guild_config.authentication_role_id)
+            if auto_generator_channel is None or server_authentication_role is None:
+                continue
+
+            guild_id = auto_generator_channel.guild.id
+            active_guild_ids.add(guild_id)
+            self.generator_channels[guild_id] = auto_generator_channel
+            self.authentication_roles[guild_id] = server_authentication_role
+
+            pool = self.pools.get(guild_id)
+            if pool is None:
+                pool = self.pools[guild_id] = VoiceChannelPool(
+                    category=auto_generator_channel.category,
+                    name=config.VOICE_CHANNEL_POOL_NAME,
+                    size=config.VOICE_CHANNEL_POOL_SIZE,
+                    max_size=config.VOICE_CHANNEL_POOL_MAX_SIZE,
+                    refill=config.VOICE_CHANNEL_POOL_REFILL,
+                    store=self.bot.store,
+                    dispatch=self.bot.dispatch,
+                )
+            pool.category = auto_generator_channel.category
+            await pool.adopt()
+            await self.replay_releases(guild_id, pool)
+            pool.schedule_refill()
+
+        # guilds removed from the config by a reload
+        for guild_id in set(self.pools) - active_guild_ids:
+            self.pools.pop(guild_id).close()
+            self.generator_channels.pop(guild_id, None)
+            self.authentication_roles.pop(guild_id, None)
+
+        # channels emptied while the bot was down, not waiting for the next periodic pass
+        self.ready_sweep = asyncio.create_task(self.sweep_orphans())
+
+    async def cog_drain(self, timeout: float):
+        # Empty channels are released now instead of after their grace period,
+        # the ones still unfinished are released by the next start
+        for channel_id in await self.deletions.drain(timeout):
+            channel = self.bot.get_channel(channel_id)
+            if channel is not None:
+                self.bot.store.journal("release_voice_channel", channel.guild.id, {"channel_id": channel_id})
+
+    async def replay_releases(self, guild_id: int, pool: VoiceChannelPool):
+        for entry in await self.bot.store.take_journal("release_voice_channel", [guild_id]):
+            channel = self.bot.get_channel(entry["channel_id"])
+            if channel is None:
+                self.bot.store.delete_voice_channel(entry["channel_id"])
+            elif not pool.is_pooled(channel):
+                self.deletions.schedule(channel.id, 0, functools.partial(pool.release, channel))
+
+    async def sweep(self, guild_id: int, dry_run: bool = False) -> Optional[SweepReport]:
+        pool = self.pools.get(guild_id)
+        generator = self.generator_channels.get(guild_id)
+        if pool is None or generator is None or generator.category is None:
+            return None
+
+        # Channels created before the state store existed have no record. They are
+        # adopted until a pass has released every orphan, after that a channel
+        # without a record was not created by the bot
+        last_report = self.sweeps.get(guild_id)
+        adopt_unrecorded = last_report is None or last_report.deferred > 0
+
+        # the READY pass and the periodic one must not release the same channel twice
+        async with self.sweep_lock:
+            report = await sweep(
+                generator,
+                pool,
+                await self.bot.store.load_voice_channels(guild_id),
+                self.deletions.active_keys(),
+                dry_run=dry_run,
+                max_releases=config.VOICE_SWEEP_MAX_RELEASES,
+                concurrency=config.VOICE_CHANNEL_DELETE_CONCURRENCY,
+                adopt_unrecorded=adopt_unrecorded,
+                generated_suffix=config.VOICE_CHANNEL_NAME_SUFFIX,
+            )
+        if not dry_run:
+            self.sweeps[guild_id] = report
+            if report.released or report.deferred:
+                log.info("Swept orphaned voice channels in guild %s: %s", guild_id, report.to_dict())
+        return report
+
+    @tasks.loop(seconds=config.VOICE_SWEEP_INTERVAL)
+    async def sweep_orphans(self):
+        for guild_id in list(self.pools):
+            await self.sweep(guild_id)
+
+    @app_commands.command(name="voice-sweep", description="주인 없이 남은 통화방을 정리해요.")
+    @app_commands.describe(dry_run="정리하지 않고 결과만 보여줘요.")
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.guild_only()
+    async def voice_sweep(self, interaction: discord.Interaction, dry_run: bool = True):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        report = await self.sweep(interaction.guild_id, dry_run=dry_run)
+        if report is None:
+            await interaction.followup.send("이 서버에는 통화방 생성 채널이 설정되어 있지 않아요.", ephemeral=True)
+            return
+
+        sweep_embed = discord.Embed(
+            title="통화방 정리 미리보기" if dry_run else "통화방 정리 결과",
+            color=discord.Color.blue(),
+        )
+        for name, channels in (
+            ("사용 중", report.occupied),
+            ("대기 중", report.pooled),
+            ("삭제 예정", report.pending),
+            ("이동 중", report.claiming),
+            ("주인 없음", report.orphaned),
+            ("봇이 만들지 않음", report.foreign),
+        ):
+            value = " ".join(channel.mention for channel in channels[:20]) or "-"
+            if len(channels) > 20:
+                value += f" 외 {len(channels) - 20}개"
+            sweep_embed.add_field(name=f"{name} {len(channels)}개", value=value, inline=False)
+        if not dry_run:
+            sweep_embed.add_field(name="정리됨", value=f"{report.released}개, 다음 정리로 미룸 {report.deferred}개", inline=False)
+        sweep_embed.set_footer(text=f"API 호출 {report.api_calls}회 · {report.seconds * 1000:.0f}ms")
+        await interaction.followup.send(embed=sweep_embed, ephemeral=True)
+
+    async def cog_load(self):
+        self.sweep_orphans.start()
+
+    async def cog_unload(self):
+        self.sweep_orphans.cancel()
+        # the pools and pending deletions keep running in the reloaded cog
+        if self.bot.reloader.handing_off(self):
+            return
+        for pool in self.pools.values():
+            pool.close()
+        await self.deletions.close()
 
     @commands.Cog.listener()
-    async def on_voice_state_update(
-        self,
-        member: discord.Member,
-        before: discord.VoiceState,
-        after: discord.VoiceState,
-    ):
-        if not self.auto_generator_channel:
+    async def on_generator_join(self, member: discord.Member, channel: discord.VoiceChannel):
+        pool = self.pools.get(member.guild.id)
+        if not pool:
             return
 
         # create voice channel
-        if after.channel != None and after.channel.id == self.auto_generator_channel.id:
-            new_voice_channel = await member.guild.create_voice_channel(
-                name=f"{member.nick or member} 님의 통화방",
-                category=self.auto_generator_channel.category,
-                overwrites={
-                    member.guild.default_role: discord.PermissionOverwrite(manage_channels=False, connect=False, mute_members=False, kick_members=False, deafen_members=False),
-                    member: discord.PermissionOverwrite(manage_channels=True, connect=True, mute_members=False, kick_members=False, deafen_members=False),
-                    self.server_authentication_role: discord.PermissionOverwrite(manage_channels=False, connect=True, view_channel=True),
-                }
-            )
+        started_at = time.perf_counter()
+        pooled = bool(pool.channels)
+
+        new_voice_channel = await pool.claim(
+            name=f"{member.nick or member}{config.VOICE_CHANNEL_NAME_SUFFIX}",
+            overwrites={
+                member.guild.default_role: discord.PermissionOverwrite(manage_channels=False, connect=False, mute_members=False, kick_members=False, deafen_members=False),
+                member: discord.PermissionOverwrite(manage_channels=True, connect=True, mute_members=False, kick_members=False, deafen_members=False),
+                self.authentication_roles[member.guild.id]: discord.PermissionOverwrite(manage_channels=False, connect=True, view_channel=True),
+            },
+            owner_id=member.id,
+        )
+        try:
             await member.move_to(new_voice_channel)
+        except discord.HTTPException:
+            # the member left the generator before the move, nobody will ever leave this channel
+            self.deletions.schedule(new_voice_channel.id, 0, functools.partial(pool.release, new_voice_channel))
             return
 
-        # delete voice channel
-        if before.channel and before.channel.category_id == self.auto_generator_channel.category_id and not before.channel.members and before.channel.id != self.auto_generator_channel.id:
-            await asyncio.sleep(3)
-            await before.channel.delete()
+        self.join_latency["pooled" if pooled else "created"].record(time.perf_counter() - started_at)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        pool = self.pools.get(channel.guild.id)
+        if pool and self.bot.store.voice_channel(channel.id):
+            pool.forget(channel)
+
+    @commands.Cog.listener()
+    async def on_managed_join(self, member: discord.Member, channel: discord.VoiceChannel):
+        # someone came back, keep the voice channel
+        self.deletions.cancel(channel.id)
+
+    @commands.Cog.listener()
+    async def on_managed_empty(self, channel: discord.VoiceChannel):
+        pool = self.pools.get(channel.guild.id)
+        if not pool or pool.is_pooled(channel):
             return
 
+        # release voice channel back into the pool after a grace period
+        self.deletions.schedule(channel.id, config.VOICE_CHANNEL_DELETE_DELAY, lambda: pool.release(channel))
+
 
 async def setup(bot):
     await bot.add_cog(VoiceChannelHandler(bot))
@@ -2,78 +2,181 @@ import discord
 from discord.ext import commands
 import datetime
 from common import config
-import utils
-from typing import Optional, Union
+import asyncio
+from typing import Dict, List, Optional, Union
+from common.sender import MessageScheduler, Priority
+
+
+class VoiceActivityLog:
+    """One activity message per voice channel, edited with the join/leave lines batched per flush window."""
+
+    def __init__(self, sender: MessageScheduler, channel: discord.VoiceChannel):
+        self.sender = sender
+        self.channel = channel
+        self.message_id: Optional[int] = None
+        self.lines: List[str] = []
+        self.pending: List[str] = []
+        self.flush_task: Optional[asyncio.Task] = None
+
+        self.sends = 0
+        self.edits = 0
+
+    def append(self, line: str):
+        self.pending.append(line)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    def build_embed(self) -> discord.Embed:
+        activity_embed = discord.Embed(
+            title="통화방 활동",
+            description="\n".join(self.lines),
+            color=discord.Color.blurple(),
+        )
+        activity_embed.set_footer(
+            text="모도코",
+            icon_url=config.SERVER_ICON_URL
+        )
+        return activity_embed
+
+    async def flush_later(self):
+        try:
+            while self.pending:
+                await asyncio.sleep(config.VOICE_LOG_FLUSH_INTERVAL)
+                await self.flush()
+        finally:
+            self.flush_task = None
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+
+        # roll over to a new message once the current one is full
+        if self.message_id and len("\n".join(self.lines + batch)) > config.VOICE_LOG_MAX_LENGTH:
+            self.message_id = None
+            self.lines = []
+
+        self.lines.extend(batch)
+        embed = self.build_embed()
+
+        if self.message_id is None:
+            self.sends += 1
+            message = await self.sender.send(self.channel, embed=embed, priority=Priority.LOG)
+            self.message_id = message.id if message else None
+            return
+
+        message_id = self.message_id
+        self.edits += 1
+        message = await self.sender.submit(
+            self.channel.id,
+            lambda: self.channel.get_partial_message(message_id).edit(embed=embed),
+            priority=Priority.LOG,
+        )
+        # the activity message was deleted, start over with a fresh one
+        if message is None:
+            self.message_id = None
+            self.lines = []
+            self.pending[:0] = batch
+
+    async def drain(self):
+        """Send the buffered lines now instead of after the flush interval."""
+        if self.flush_task:
+            self.flush_task.cancel()
+        if self.pending:
+            await self.flush()
+
+    def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
 
 
 class VoiceChannelLogHandler(commands.Cog):
+    handoff_attributes = ("activity_logs",)
+
     def __init__(self, bot: discord.Client):
         self.bot = bot
-        self.auto_generator_channel: Optional[discord.VoiceChannel] = None
+        self.activity_logs: Dict[int, VoiceActivityLog] = {}
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        self.auto_generator_channel: discord.VoiceChannel = await utils.get_channel_by_id(self.bot, config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID)
+    def log_activity(self, channel: discord.VoiceChannel, line: str):
+        activity_log = self.activity_logs.get(channel.id)
+        if activity_log is None:
+            activity_log = self.activity_logs[channel.id] = VoiceActivityLog(self.bot.sender, channel)
+        activity_log.append(line)
 
     @commands.Cog.listener()
-    async def on_voice_state_update(
-        self,
-        member:  Union[discord.Member, discord.User],
-        before: discord.VoiceState,
-        after: discord.VoiceState,
-    ):
-        if not self.auto_generator_channel:
+    async def on_managed_join(self, member: Union[discord.Member, discord.User], channel: discord.VoiceChannel):
+        if config.VOICE_LOG_COALESCE:
+            self.log_activity(channel, f"🟢 {discord.utils.format_dt(discord.utils.utcnow(), 'T')} **{member.name}** 님이 들어왔어요.")
             return
 
-        # ignore auto generator channel
-        if after.channel and after.channel.id == config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID:
-            return
+        join_log_embed = discord.Embed(
+            title=f"맴버가 들어왔어요.",
+            color=discord.Color.green(),
+            timestamp=datetime.datetime.now(),
+        )
+        join_log_embed.set_author(
+            name=member.name,
+            icon_url=member.display_avatar.url,
+        )
+        join_log_embed.set_footer(
+            text="모도코",
+            icon_url=config.SERVER_ICON_URL
+        )
+        self.bot.sender.send(
+            channel,
+            embed=join_log_embed,
+            priority=Priority.LOG,
+        )
 
-        # ignore if channel is not changed
-        if before.channel and after.channel and before.channel.id == after.channel.id:
+    @commands.Cog.listener()
+    async def on_managed_leave(self, member: Union[discord.Member, discord.User], channel: discord.VoiceChannel):
+        if config.VOICE_LOG_COALESCE:
+            self.log_activity(channel, f"🔴 {discord.utils.format_dt(discord.utils.utcnow(), 'T')} **{member.name}** 님이 나갔어요.")
             return
 
-        # join voice channel
-        if after.channel and after.channel.category_id == self.auto_generator_channel.category_id:
-            join_log_embed = discord.Embed(
-                title=f"맴버가 들어왔어요.",
-                color=discord.Color.green(),
-                timestamp=datetime.datetime.now(),
-            )
-            join_log_embed.set_author(
-                name=member.name,
-                icon_url=member.display_avatar.url,
-            )
-            join_log_embed.set_footer(
-                text="모도코",
-                icon_url=config.SERVER_ICON_URL
-            )
-            await after.channel.send(
-                embed=join_log_embed
-            )
-
-        # leave voice channel
-        if before.channel and before.channel.category_id == self.auto_generator_channel.category_id and before.channel != after.channel:
-            leave_log_embed = discord.Embed(
-                title="맴버가 나갔어요.",
-                color=discord.Color.red(),
-                timestamp=datetime.datetime.now(),
-            )
-            leave_log_embed.set_author(
-                name=member.name,
-                icon_url=member.display_avatar.url,
-            )
-            leave_log_embed.set_footer(
-                text="모도코",
-                icon_url=config.SERVER_ICON_URL
-            )
-            # Sending messages can fail if the channel is auto deleted
-            try:
-                await before.channel.send(
-                    embed=leave_log_embed
-                )
-            except:
-                pass
+        leave_log_embed = discord.Embed(
+            title="맴버가 나갔어요.",
+            color=discord.Color.red(),
+            timestamp=datetime.datetime.now(),
+        )
+        leave_log_embed.set_author(
+            name=member.name,
+            icon_url=member.display_avatar.url,
+        )
+        leave_log_embed.set_footer(
+            text="모도코",
+            icon_url=config.SERVER_ICON_URL
+        )
+        # Sending messages can fail if the channel is auto deleted, the scheduler drops those
+        self.bot.sender.send(
+            channel,
+            embed=leave_log_embed,
+            priority=Priority.LOG,
+        )
+
+    def end_activity_log(self, channel: discord.abc.GuildChannel):
+        # lines still buffered belong to the ended session and are not sent
+        activity_log = self.activity_logs.pop(channel.id, None)
+        if activity_log:
+            activity_log.close()
+
+    @commands.Cog.listener()
+    async def on_managed_release(self, channel: discord.VoiceChannel):
+        # a recycled channel starts the next session with a new activity message
+        self.end_activity_log(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.end_activity_log(channel)
+
+    async def cog_drain(self, timeout: float):
+        drains = [asyncio.create_task(activity_log.drain()) for activity_log in self.activity_logs.values() if activity_log.pending]
+        if drains:
+            await asyncio.wait(drains, timeout=timeout)
+
+    async def cog_unload(self):
+        if self.bot.reloader.handing_off(self):
+            return
+        for activity_log in self.activity_logs.values():
+            activity_log.close()
 
 
 async def setup(bot):
@@ -0,0 +1,108 @@
+import discord
+from discord.ext import commands
+from typing import Dict, List, Set
+from common.bootstrap import Channel, Dependency, Registry
+
+
+class VoiceStateRouter(commands.Cog):
+    """Classifies every voice state update once and dispatches typed events.
+
+    Subscribers listen with `commands.Cog.listener()` on:
+        on_generator_join(member, channel)
+        on_managed_join(member, channel)
+        on_managed_leave(member, channel)
+        on_managed_empty(channel)
+
+    and, from common/voice_pool.py, on_managed_release(channel) once a session's channel is recycled or deleted.
+    """
+
+    bootstrap_partial = True
+    handoff_attributes = ("generator_channel_ids", "generator_category_ids", "managed_channel_ids", "occupancy")
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        # resolved generator channels of every configured guild
+        self.generator_channel_ids: Set[int] = set()
+        self.generator_category_ids: Set[int] = set()
+
+        # voice channels in a generator category, except the generators themselves
+        self.managed_channel_ids: Set[int] = set()
+        self.occupancy: Dict[int, int] = {}
+
+    def is_managed(self, channel: discord.abc.GuildChannel) -> bool:
+        return channel.id in self.managed_channel_ids
+
+    def index_channel(self, channel: discord.abc.GuildChannel):
+        if not isinstance(channel, discord.VoiceChannel) or channel.id in self.generator_channel_ids:
+            return
+
+        if channel.category_id in self.generator_category_ids:
+            self.managed_channel_ids.add(channel.id)
+            self.occupancy[channel.id] = len(channel.members)
+        else:
+            self.unindex_channel(channel)
+
+    def unindex_channel(self, channel: discord.abc.GuildChannel):
+        self.managed_channel_ids.discard(channel.id)
+        self.occupancy.pop(channel.id, None)
+
+    def bootstrap_requires(self) -> List[Dependency]:
+        return [Channel(guild_config.generator_channel_id) for guild_config in self.bot.guild_config.all()]
+
+    async def on_bootstrap_ready(self, registry: Registry):
+        generators: List[discord.VoiceChannel] = [
+            generator
+            for guild_config in self.bot.guild_config.all()
+            if (generator := registry.channel(guild_config.generator_channel_id))
+        ]
+        self.generator_channel_ids = {generator.id for generator in generators}
+        self.generator_category_ids = {generator.category_id for generator in generators if generator.category_id}
+
+        self.managed_channel_ids.clear()
+        self.occupancy.clear()
+        for generator in generators:
+            for channel in generator.category.voice_channels:
+                self.index_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        self.index_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        if before.category_id != after.category_id:
+            self.index_channel(after)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.unindex_channel(channel)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        before_id = before.channel.id if before.channel else None
+        after_id = after.channel.id if after.channel else None
+
+        # mute, deafen, stream... the channel did not change
+        if before_id == after_id:
+            return
+
+        if before_id in self.managed_channel_ids:
+            occupancy = self.occupancy[before_id] = max(0, self.occupancy.get(before_id, 1) - 1)
+            self.bot.dispatch("managed_leave", member, before.channel)
+            if occupancy == 0:
+                self.bot.dispatch("managed_empty", before.channel)
+
+        if after_id in self.generator_channel_ids:
+            self.bot.dispatch("generator_join", member, after.channel)
+        elif after_id in self.managed_channel_ids:
+            self.occupancy[after_id] = self.occupancy.get(after_id, 0) + 1
+            self.bot.dispatch("managed_join", member, after.channel)
+
+
+async def setup(bot):
+    await bot.add_cog(VoiceStateRouter(bot))
@@ -0,0 +1,130 @@
+import datetime
+import discord
+import time
+from discord import app_commands
+from discord.ext import commands, tasks
+from typing import List, Optional, Union
+from common import config
+from common.bootstrap import Channel, Dependency, Registry
+from common.voice_sessions import VoiceSessionTracker
+
+
+def format_duration(seconds: float) -> str:
+    minutes = int(seconds // 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}시간 {minutes}분" if hours else f"{minutes}분"
+
+
+class VoiceStatsHandler(commands.Cog):
+    bootstrap_partial = True
+    handoff_attributes = ("sessions",)
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self.sessions = VoiceSessionTracker()
+
+    def bootstrap_requires(self) -> List[Dependency]:
+        return [Channel(guild_config.generator_channel_id) for guild_config in self.bot.guild_config.all()]
+
+    async def on_bootstrap_ready(self, registry: Registry):
+        for guild_config in self.bot.guild_config.all():
+            auto_generator_channel: Optional[discord.VoiceChannel] = registry.channel(guild_config.generator_channel_id)
+            if auto_generator_channel is not None:
+                self.reconcile_sessions(auto_generator_channel)
+
+    def reconcile_sessions(self, auto_generator_channel: discord.VoiceChannel):
+        guild_id = auto_generator_channel.guild.id
+
+        # Sync the open sessions with whoever is in voice right now, members may have left while disconnected
+        in_voice = {
+            member.id
+            for channel in auto_generator_channel.category.voice_channels
+            if channel.id != auto_generator_channel.id
+            for member in channel.members
+        }
+        now = time.time()
+        for session_guild_id, user_id in list(self.sessions.sessions):
+            if session_guild_id == guild_id and user_id not in in_voice:
+                self.sessions.close(guild_id, user_id, now)
+        for user_id in in_voice:
+            self.sessions.open(guild_id, user_id, now)
+
+    async def cog_load(self):
+        self.flush_sessions.start()
+
+    async def cog_unload(self):
+        self.flush_sessions.cancel()
+        # open sessions continue in the reloaded cog
+        if not self.bot.reloader.handing_off(self):
+            self.sessions.close_all()
+        self.sessions.flush(self.bot.store)
+
+    @tasks.loop(seconds=config.VOICE_STATS_FLUSH_INTERVAL)
+    async def flush_sessions(self):
+        self.sessions.flush(self.bot.store)
+
+    @commands.Cog.listener()
+    async def on_managed_join(self, member: Union[discord.Member, discord.User], channel: discord.VoiceChannel):
+        self.sessions.open(channel.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_managed_leave(self, member: Union[discord.Member, discord.User], channel: discord.VoiceChannel):
+        self.sessions.close(channel.guild.id, member.id)
+
+    @app_commands.command(name="voice-stats", description="통화방 이용 시간과 순위를 보여줘요.")
+    @app_commands.describe(member="이용 시간을 볼 맴버", top="순위에 보여줄 인원")
+    @app_commands.guild_only()
+    async def voice_stats(
+        self,
+        interaction: discord.Interaction,
+        member: Optional[discord.Member] = None,
+        top: app_commands.Range[int, 1, 25] = 10,
+    ):
+        member = member or interaction.user
+        guild_id = interaction.guild_id
+        store = self.bot.store
+
+        # the closed sessions still in memory are written first, the queries then only read indexed tables
+        self.sessions.flush(store)
+        await store.flush()
+
+        today = datetime.date.today()
+        total = await store.voice_total(guild_id, member.id)
+        week = await store.voice_total(guild_id, member.id, since=(today - datetime.timedelta(days=6)).isoformat())
+        day = await store.voice_total(guild_id, member.id, since=today.isoformat())
+        leaderboard = await store.voice_leaderboard(guild_id, top)
+        current = self.sessions.elapsed(guild_id, member.id)
+
+        stats_embed = discord.Embed(
+            title="통화방 이용 시간",
+            color=discord.Color.blurple(),
+        )
+        stats_embed.set_author(
+            name=member.name,
+            icon_url=member.display_avatar.url,
+        )
+        stats_embed.add_field(name="오늘", value=format_duration(day.seconds + current))
+        stats_embed.add_field(name="최근 7일", value=format_duration(week.seconds + current))
+        stats_embed.add_field(name="전체", value=f"{format_duration(total.seconds + current)} ({total.sessions}회)")
+        stats_embed.add_field(
+            name=f"순위 TOP {top}",
+            value="\n".join(
+                f"{rank}. <@{entry.user_id}> {format_duration(entry.seconds)}"
+                for rank, entry in enumerate(leaderboard, start=1)
+            ) or "아직 기록이 없어요.",
+            inline=False,
+        )
+        stats_embed.set_footer(
+            text="모도코",
+            icon_url=config.SERVER_ICON_URL
+        )
+
+        await interaction.response.send_message(
+            embed=stats_embed,
+            allowed_mentions=discord.AllowedMentions.none(),
+            ephemeral=True,
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(VoiceStatsHandler(bot))
@@ -0,0 +1,128 @@
+"""Compare memory and READY processing time of the computed intents profile against Intents.all().
+
+Feeds a synthetic GUILD_CREATE (plus member chunks when the profile chunks at
+startup) straight into the library's connection state, no gateway involved.
+
+    python -m benchmarks.intents_benchmark --members 10000 50000 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+from main import Bot  # noqa: E402
+from common.intents import IntentsProfile, profile_for_extensions  # noqa: E402
+
+
+GUILD_ID = 1
+VOICE_CHANNEL_ID = 2
+CHUNK_SIZE = 1000
+
+
+def member_payload(user_id: int) -> dict:
+    return {
+        "user": {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None},
+        "roles": [],
+        "joined_at": "2023-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def presence_payload(user_id: int) -> dict:
+    return {
+        "user": {"id": str(user_id)},
+        "status": "online",
+        "client_status": {"desktop": "online"},
+        "activities": [],
+        "guild_id": str(GUILD_ID),
+    }
+
+
+def guild_payload(member_count: int, voice_count: int, include_members: bool) -> dict:
+    voice_members = [member_payload(1000 + i) for i in range(voice_count)]
+    return {
+        "id": str(GUILD_ID),
+        "name": "synthetic",
+        "owner_id": "1000",
+        "member_count": member_count,
+        "large": True,
+        "roles": [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False, "flags": 0}],
+        "channels": [{"id": str(VOICE_CHANNEL_ID), "type": 2, "name": "voice", "position": 0, "permission_overwrites": [], "bitrate": 64000, "user_limit": 0}],
+        "voice_states": [
+            {"user_id": str(1000 + i), "channel_id": str(VOICE_CHANNEL_ID), "session_id": "x", "deaf": False, "mute": False, "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False}
+            for i in range(voice_count)
+        ],
+        "members": voice_members if include_members else [],
+        "presences": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+    }
+
+
+def run(profile: IntentsProfile, member_count: int) -> dict:
+    client = discord.Client(
+        intents=profile.intents,
+        member_cache_flags=profile.member_cache_flags,
+        chunk_guilds_at_startup=profile.chunk_guilds_at_startup,
+    )
+    state = client._connection
+    voice_count = max(1, member_count // 100)
+
+    gc.collect()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+
+    guild = state._add_guild_from_data(guild_payload(member_count, voice_count, profile.intents.voice_states))
+
+    # what READY chunking would deliver and cache for every member of the guild
+    if profile.chunk_guilds_at_startup and profile.intents.members:
+        for offset in range(0, member_count, CHUNK_SIZE):
+            user_ids = range(1000 + offset, 1000 + min(member_count, offset + CHUNK_SIZE))
+            members = [discord.Member(guild=guild, data=member_payload(user_id), state=state) for user_id in user_ids]
+            if profile.intents.presences:
+                for member, user_id in zip(members, user_ids):
+                    member._presence_update(discord.RawPresenceUpdateEvent(data=presence_payload(user_id), state=state), {"id": str(user_id)})
+            for member in members:
+                guild._add_member(member)
+
+    elapsed = time.perf_counter() - started_at
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "cached_members": len(guild._members),
+        "seconds": elapsed,
+        "current_mib": current / 2**20,
+        "peak_mib": peak / 2**20,
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    args = parser.parse_args(argv)
+
+    profiles = {
+        "all": IntentsProfile(discord.Intents.all(), discord.MemberCacheFlags.all(), True),
+        "computed": profile_for_extensions(Bot().initial_extension),
+    }
+    print(f"computed profile: {profiles['computed'].intents!r} {profiles['computed'].member_cache_flags!r} chunk={profiles['computed'].chunk_guilds_at_startup}")
+
+    print(f"{'members':>8} {'profile':>9} {'cached':>8} {'seconds':>8} {'MiB':>8} {'peak MiB':>9}")
+    for member_count in args.members:
+        for name, profile in profiles.items():
+            result = run(profile, member_count)
+            print(f"{member_count:>8} {name:>9} {result['cached_members']:>8} {result['seconds']:>8.3f} {result['current_mib']:>8.1f} {result['peak_mib']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,569 @@
+"""Replay gateway events through the real cogs, without a Discord connection.
+
+The extensions are loaded on a regular Bot whose REST layer is replaced by a
+stub with simulated latency and rate limits. The stub answers like Discord
+would, and echoes the gateway events Discord would send back: a moved member
+arrives as a VOICE_STATE_UPDATE, and a created channel as a CHANNEL_CREATE.
+
+Event streams are JSON lines of {"t": seconds from start, "op": gateway event, "d": payload},
+either recorded with --record or generated by one of the scenarios:
+    voice-storm   members hopping in and out of the generator channel
+    join-raid     members joining and leaving the guild
+    button-spam   members clicking the role panel buttons
+
+    python -m benchmarks.replay voice-storm --members 200 --rate 100
+    python -m benchmarks.replay button-spam --latency 0.2 --rate-limit 5
+    python -m benchmarks.replay --replay events.jsonl
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STATE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="replay-"), "state.db"))
+
+import discord  # noqa: E402
+from discord.http import Route  # noqa: E402
+from discord.webhook.async_ import async_context  # noqa: E402
+from main import Bot  # noqa: E402
+from common import config  # noqa: E402
+from common.interaction import get_interaction_stats  # noqa: E402
+from Cogs.role_handler import RoleHandler  # noqa: E402
+
+
+GUILD_ID = config.GUILD_ID
+BOT_ID = 10
+APPLICATION_ID = 11
+FIRST_MEMBER_ID = 1000
+TEXT_CHANNEL_IDS = [
+    config.ERROR_LOGGING_CHANNEL_ID,
+    config.ROLE_ASSIGNMENT_CHANNEL_ID,
+    config.SELF_DESCRIPTION_CHANNEL_ID,
+    config.MAIN_CHAT_CHANNEL_ID,
+    config.WELCOME_CHANNEL_ID,
+    config.GOODBYE_CHANNEL_ID,
+]
+CATEGORY_ID = 20
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+# payloads
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None, "bot": user_id == BOT_ID}
+
+
+def member_payload(user_id: int, roles: List[int] = ()) -> dict:
+    return {
+        "user": user_payload(user_id),
+        "roles": [str(role_id) for role_id in roles],
+        "joined_at": "2023-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def role_payload(role_id: int, position: int) -> dict:
+    return {"id": str(role_id), "name": f"role{role_id}", "permissions": "0", "position": position, "color": 0, "hoist": False, "managed": False, "mentionable": False, "flags": 0}
+
+
+def channel_payload(channel_id: int, channel_type: int, name: str, parent_id: Optional[int] = None, overwrites: List[dict] = ()) -> dict:
+    return {
+        "id": str(channel_id),
+        "guild_id": str(GUILD_ID),
+        "type": channel_type,
+        "name": name,
+        "position": 0,
+        "parent_id": str(parent_id) if parent_id else None,
+        "permission_overwrites": list(overwrites),
+        "bitrate": 64000,
+        "user_limit": 0,
+    }
+
+
+def role_ids() -> List[int]:
+    return sorted({config.SERVER_AUTHENTICATION_ROLE_ID, *RoleHandler.panel_role_ids})
+
+
+def guild_payload() -> dict:
+    channels = [channel_payload(CATEGORY_ID, 4, "voice")]
+    channels.append(channel_payload(config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID, 2, "generator", CATEGORY_ID))
+    channels.extend(channel_payload(channel_id, 0, f"text{channel_id}") for channel_id in TEXT_CHANNEL_IDS)
+
+    return {
+        "id": str(GUILD_ID),
+        "name": "replay",
+        "owner_id": str(BOT_ID),
+        "member_count": 1,
+        "large": False,
+        "roles": [role_payload(GUILD_ID, 0)] + [role_payload(role_id, position) for position, role_id in enumerate(role_ids(), start=1)],
+        "channels": channels,
+        "voice_states": [],
+        "members": [member_payload(BOT_ID)],
+        "presences": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+    }
+
+
+def voice_state_payload(user_id: int, channel_id: Optional[int]) -> dict:
+    return {
+        "guild_id": str(GUILD_ID),
+        "channel_id": str(channel_id) if channel_id else None,
+        "user_id": str(user_id),
+        "member": member_payload(user_id, [config.SERVER_AUTHENTICATION_ROLE_ID]),
+        "session_id": "replay",
+        "deaf": False,
+        "mute": False,
+        "self_deaf": False,
+        "self_mute": False,
+        "self_video": False,
+        "suppress": False,
+    }
+
+
+def button_payload(interaction_id: int, user_id: int, custom_id: str) -> dict:
+    return {
+        "id": str(interaction_id),
+        "application_id": str(APPLICATION_ID),
+        "type": 3,
+        "token": f"token{interaction_id}",
+        "version": 1,
+        "guild_id": str(GUILD_ID),
+        "channel_id": str(config.ROLE_ASSIGNMENT_CHANNEL_ID),
+        "member": {**member_payload(user_id, [config.SERVER_AUTHENTICATION_ROLE_ID]), "permissions": "0"},
+        "data": {"custom_id": custom_id, "component_type": 2},
+        "attachment_size_limit": 8 * 2**20,
+        "locale": "ko",
+    }
+
+
+# scenarios
+
+Event = Dict[str, Any]
+
+
+def voice_storm(args: argparse.Namespace) -> List[Event]:
+    """Every member joins the generator, gets moved into a fresh channel and leaves `dwell` seconds later."""
+    events = []
+    t = 0.0
+    for _ in range(args.hops):
+        for user_id in range(FIRST_MEMBER_ID, FIRST_MEMBER_ID + args.members):
+            events.append({"t": t, "op": "VOICE_STATE_UPDATE", "d": voice_state_payload(user_id, config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID)})
+            events.append({"t": t + args.dwell, "op": "VOICE_STATE_UPDATE", "d": voice_state_payload(user_id, None)})
+            t += 1 / args.rate
+        t += args.dwell
+    return sorted(events, key=lambda event: event["t"])
+
+
+def join_raid(args: argparse.Namespace) -> List[Event]:
+    events = []
+    t = 0.0
+    for _ in range(args.hops):
+        for user_id in range(FIRST_MEMBER_ID, FIRST_MEMBER_ID + args.members):
+            events.append({"t": t, "op": "GUILD_MEMBER_ADD", "d": {**member_payload(user_id), "guild_id": str(GUILD_ID)}})
+            t += 1 / args.rate
+        for user_id in range(FIRST_MEMBER_ID, FIRST_MEMBER_ID + args.members):
+            events.append({"t": t, "op": "GUILD_MEMBER_REMOVE", "d": {"user": user_payload(user_id), "guild_id": str(GUILD_ID)}})
+            t += 1 / args.rate
+    return events
+
+
+def button_spam(args: argparse.Namespace) -> List[Event]:
+    """Each member clicks `hops` random role buttons, the same seed gives the same stream."""
+    rng = random.Random(0)
+    interaction_ids = itertools.count(1)
+    events = []
+    for index in range(args.members * args.hops):
+        user_id = FIRST_MEMBER_ID + index % args.members
+        custom_id = f"role_button:{rng.choice(sorted(RoleHandler.panel_role_ids))}"
+        events.append({"t": index / args.rate, "op": "INTERACTION_CREATE", "d": button_payload(next(interaction_ids), user_id, custom_id)})
+    return events
+
+
+SCENARIOS: Dict[str, Callable[[argparse.Namespace], List[Event]]] = {
+    "voice-storm": voice_storm,
+    "join-raid": join_raid,
+    "button-spam": button_spam,
+}
+
+
+# stub REST layer
+
+class StubDiscord:
+    """Answers REST routes from an in-memory copy of the guild and echoes the matching gateway events."""
+
+    ROUTES = [
+        ("POST", "/guilds/{guild_id}/channels", "create_channel"),
+        ("PATCH", "/channels/{channel_id}", "edit_channel"),
+        ("DELETE", "/channels/{channel_id}", "delete_channel"),
+        ("GET", "/channels/{channel_id}", "get_channel"),
+        ("PATCH", "/guilds/{guild_id}/members/{user_id}", "edit_member"),
+        ("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", "no_content"),
+        ("GET", "/guilds/{guild_id}/roles", "get_roles"),
+        ("POST", "/channels/{channel_id}/messages", "create_message"),
+        ("PATCH", "/channels/{channel_id}/messages/{message_id}", "edit_message"),
+        ("DELETE", "/channels/{channel_id}/messages/{message_id}", "delete_message"),
+        ("GET", "/channels/{channel_id}/messages", "history"),
+        ("POST", "/interactions/{webhook_id}/{webhook_token}/callback", "interaction_callback"),
+        ("POST", "/webhooks/{webhook_id}/{webhook_token}", "create_message"),
+    ]
+
+    def __init__(self, latency: float, jitter: float, rate_limit: int, rate_limit_window: float, gateway_delay: float):
+        self.latency = latency
+        self.jitter = jitter
+        # requests per major parameter and route within the window, 0 disables the simulated 429s
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.gateway_delay = gateway_delay
+
+        self.state: Optional[Any] = None
+        self.channels: Dict[int, dict] = {}
+        # channel id -> message id -> message, what the history route answers from
+        self.messages: Dict[int, Dict[int, dict]] = collections.defaultdict(dict)
+        self.ids = itertools.count(10**6)
+        self.rng = random.Random(0)
+
+        self.routes = [(method, re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/?]+)", path) + r"(\?.*)?$"), handler) for method, path, handler in self.ROUTES]
+        self.buckets: Dict[str, Deque[float]] = collections.defaultdict(collections.deque)
+
+        self.requests = 0
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.by_route: collections.Counter = collections.Counter()
+        self.last_activity = time.perf_counter()
+
+    def attach(self, state, guild: dict):
+        self.state = state
+        self.channels = {int(channel["id"]): channel for channel in guild["channels"]}
+
+    async def _throttle(self, bucket: str):
+        if not self.rate_limit:
+            return
+
+        window = self.buckets[bucket]
+        now = time.perf_counter()
+        while window and window[0] <= now - self.rate_limit_window:
+            window.popleft()
+
+        if len(window) >= self.rate_limit:
+            # the library would get a 429 and sleep for retry_after before retrying
+            self.rate_limited += 1
+            await asyncio.sleep(window[0] + self.rate_limit_window - now)
+        window.append(time.perf_counter())
+
+    async def request(self, route: Route, *, json: Any = None, payload: Any = None, params: Any = None, **kwargs) -> Any:
+        path = route.url[len(Route.BASE):]
+        for method, pattern, handler in self.routes:
+            match = pattern.match(path) if method == route.method else None
+            if match:
+                break
+        else:
+            handler, match = "unhandled", None
+
+        key = f"{route.method} {route.path}"
+        self.requests += 1
+        self.in_flight += 1
+        self.by_route[key] += 1
+        try:
+            await self._throttle(f"{key} {route.major_parameters}")
+            await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+            params = {name: int(value) for name, value in match.groupdict().items() if value.isdigit()} if match else {}
+            return getattr(self, handler)(json if json is not None else payload or {}, **params)
+        finally:
+            self.in_flight -= 1
+            self.last_activity = time.perf_counter()
+
+    async def webhook_request(self, route: Route, session=None, **kwargs) -> Any:
+        return await self.request(route, **kwargs)
+
+    def echo(self, op: str, data: dict):
+        self.state._get_client().loop.call_later(self.gateway_delay, self.state.parsers[op], data)
+
+    # handlers
+
+    def unhandled(self, body: Any, **params) -> Any:
+        return None
+
+    def no_content(self, body: Any, **params) -> Any:
+        return None
+
+    def get_channel(self, body: Any, channel_id: int, **params) -> dict:
+        return self.channels[channel_id]
+
+    def get_roles(self, body: Any, **params) -> List[dict]:
+        return guild_payload()["roles"]
+
+    def history(self, body: Any, channel_id: int, **params) -> List[dict]:
+        # newest first, like the real route
+        return sorted(self.messages[channel_id].values(), key=lambda message: int(message["id"]), reverse=True)[:100]
+
+    def interaction_callback(self, body: Any, webhook_id: int, **params) -> dict:
+        return {"interaction": {"id": str(webhook_id), "type": 3}}
+
+    def create_channel(self, body: dict, guild_id: int) -> dict:
+        channel = channel_payload(next(self.ids), body.get("type", 2), body["name"], body.get("parent_id"), body.get("permission_overwrites", []))
+        self.channels[int(channel["id"])] = channel
+        self.echo("CHANNEL_CREATE", channel)
+        return channel
+
+    def edit_channel(self, body: dict, channel_id: int) -> dict:
+        channel = self.channels[channel_id] = {**self.channels[channel_id], **body}
+        self.echo("CHANNEL_UPDATE", channel)
+        return channel
+
+    def delete_channel(self, body: Any, channel_id: int) -> dict:
+        channel = self.channels.pop(channel_id)
+        self.messages.pop(channel_id, None)
+        self.echo("CHANNEL_DELETE", channel)
+        return channel
+
+    def edit_member(self, body: dict, guild_id: int, user_id: int) -> dict:
+        if body.get("channel_id"):
+            member = self.state._get_guild(guild_id).get_member(user_id)
+            if member is None or member.voice is None:
+                raise discord.HTTPException(types.SimpleNamespace(status=400, reason="Bad Request"), "Target user is not connected to voice.")
+        if "channel_id" in body:
+            self.echo("VOICE_STATE_UPDATE", voice_state_payload(user_id, body["channel_id"]))
+        return {**member_payload(user_id, body.get("roles", [])), "guild_id": str(guild_id)}
+
+    def create_message(self, body: dict, channel_id: int = 0, **params) -> dict:
+        message = self.message_payload(next(self.ids), body, channel_id)
+        if channel_id:
+            self.messages[channel_id][int(message["id"])] = message
+        return message
+
+    def edit_message(self, body: dict, channel_id: int, message_id: int) -> dict:
+        message = self.messages[channel_id][message_id] = self.message_payload(message_id, body, channel_id)
+        return message
+
+    def delete_message(self, body: Any, channel_id: int, message_id: int) -> None:
+        self.messages[channel_id].pop(message_id, None)
+
+    def message_payload(self, message_id: int, body: dict, channel_id: int) -> dict:
+        return {
+            "id": str(message_id),
+            "channel_id": str(channel_id or config.ROLE_ASSIGNMENT_CHANNEL_ID),
+            "author": user_payload(BOT_ID),
+            "content": body.get("content") or "",
+            "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": None,
+            "type": 0,
+            "flags": 0,
+        }
+
+
+# harness
+
+class ListenerStats:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = collections.defaultdict(list)
+        self.errors: collections.Counter = collections.Counter()
+        self.in_flight = 0
+
+    def wrap(self, name: str, coro) -> Any:
+        async def timed():
+            self.in_flight += 1
+            started_at = time.perf_counter()
+            try:
+                return await coro
+            except Exception:
+                self.errors[name] += 1
+                raise
+            finally:
+                self.samples[name].append(time.perf_counter() - started_at)
+                self.in_flight -= 1
+        return timed()
+
+
+class Harness:
+    def __init__(self, stub: StubDiscord):
+        self.stub = stub
+        self.stats = ListenerStats()
+        self.bot: Optional[Bot] = None
+
+    async def start(self):
+        # short timers so a replay does not wait out the production delays
+        config.VOICE_CHANNEL_DELETE_DELAY = 0.1
+        config.VOICE_LOG_FLUSH_INTERVAL = 0.1
+
+        bot = self.bot = Bot()
+        await bot._async_setup_hook()
+        bot.http.request = self.stub.request
+        adapter = async_context.get()
+        adapter.request = self.stub.webhook_request
+
+        state = bot._connection
+        state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID))
+        state.application_id = APPLICATION_ID
+
+        # listener latency, as seen by the dispatcher
+        run_event = bot._run_event
+        bot._run_event = lambda coro, event_name, *args, **kwargs: run_event(
+            lambda *a, **k: self.stats.wrap(getattr(coro, "__qualname__", event_name), coro(*a, **k)), event_name, *args, **kwargs
+        )
+
+        # button callbacks run outside the dispatcher
+        scheduled_task = discord.ui.View._scheduled_task
+        stats = self.stats
+
+        def view_task(view, item, interaction):
+            return stats.wrap(f"{type(item).__name__}.callback", scheduled_task(view, item, interaction))
+
+        # and report their exceptions to View.on_error instead of raising
+        view_on_error = discord.ui.View.on_error
+
+        async def view_error(view, interaction, error, item):
+            stats.errors[f"{type(item).__name__}.callback"] += 1
+            await view_on_error(view, interaction, error, item)
+
+        discord.ui.View._scheduled_task = view_task
+        discord.ui.View.on_error = view_error
+
+        await bot.store.open()
+        await asyncio.gather(*(bot.load_extension(extension) for extension in bot.initial_extension))
+
+        guild = guild_payload()
+        self.stub.attach(state, guild)
+        state._add_guild_from_data(guild)
+        bot._ready.set()
+        await bot.bootstrap.run(started_at=time.perf_counter())
+        await self.settle(0.5, 30.0)
+
+    async def settle(self, quiet: float, deadline: float):
+        """Wait until no listener or request has been running for `quiet` seconds."""
+        started_at = time.perf_counter()
+        while time.perf_counter() - started_at < deadline:
+            await asyncio.sleep(quiet / 5)
+            busy = self.stats.in_flight or self.stub.in_flight
+            if not busy and time.perf_counter() - self.stub.last_activity >= quiet:
+                return
+
+    async def replay(self, events: List[Event], speed: float):
+        state = self.bot._connection
+        started_at = time.perf_counter()
+        for event in events:
+            delay = event["t"] / speed - (time.perf_counter() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            data = event["d"]
+            if event["op"] == "INTERACTION_CREATE":
+                # the ack latency is measured from the snowflake time of the interaction
+                data = {**data, "id": str(discord.utils.time_snowflake(discord.utils.utcnow()))}
+            state.parsers[event["op"]](data)
+            # yield to the listeners like the gateway reader does between frames
+            await asyncio.sleep(0)
+
+
+def report(harness: Harness, events: int, seconds: float, peak: int, requests_before: int):
+    stats = harness.stats
+    stub = harness.stub
+    requests = stub.requests - requests_before
+
+    print(f"\n{events} events in {seconds:.2f}s, {requests} REST calls ({requests / max(events, 1):.2f}/event), {stub.rate_limited} rate limited, peak {peak / 2**20:.1f} MiB")
+
+    print(f"\n{'listener':<50} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, samples in sorted(stats.samples.items()):
+        samples = sorted(samples)
+        print(
+            f"{name[:50]:<50} {len(samples):>6} {stats.errors[name]:>6} "
+            f"{percentile(samples, 0.5) * 1000:>8.1f} {percentile(samples, 0.95) * 1000:>8.1f} "
+            f"{percentile(samples, 0.99) * 1000:>8.1f} {samples[-1] * 1000:>8.1f}"
+        )
+
+    acks = {name: stats for name, stats in get_interaction_stats().items() if stats["ack"]["count"]}
+    if acks:
+        print(f"\n{'fast_ack callback':<50} {'count':>6} {'ack p95':>8} {'work p95':>8} {'late':>6} {'failed':>6}")
+        for name, stats in acks.items():
+            print(
+                f"{name[-50:]:<50} {stats['ack']['count']:>6} {stats['ack']['p95'] * 1000:>8.1f} "
+                f"{stats['side_effects']['p95'] * 1000:>8.1f} {stats['over_budget']:>6} {stats['failed']:>6}"
+            )
+
+    print(f"\n{'route':<60} {'calls':>6}")
+    for route, count in stub.by_route.most_common():
+        print(f"{route:<60} {count:>6}")
+
+
+async def run(args) -> None:
+    if args.replay:
+        with open(args.replay) as file:
+            events = [json.loads(line) for line in file if line.strip()]
+    else:
+        events = SCENARIOS[args.scenario](args)
+
+    if args.record:
+        with open(args.record, "w") as file:
+            file.writelines(json.dumps(event) + "\n" for event in events)
+
+    stub = StubDiscord(args.latency, args.jitter, args.rate_limit, args.rate_limit_window, args.gateway_delay)
+    harness = Harness(stub)
+    await harness.start()
+
+    # the bootstrap traffic (panels, pool refill) is not part of the measurement
+    harness.stats.samples.clear()
+    harness.stats.errors.clear()
+    stub.by_route.clear()
+    stub.rate_limited = 0
+    requests_before = stub.requests
+
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    await harness.replay(events, args.speed)
+    await harness.settle(args.settle, args.deadline)
+    seconds = time.perf_counter() - started_at
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    report(harness, len(events), seconds, peak, requests_before)
+    await harness.bot.close()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", nargs="?", choices=sorted(SCENARIOS), default="voice-storm")
+    parser.add_argument("--replay", help="JSON lines event stream to replay instead of a scenario")
+    parser.add_argument("--record", help="write the event stream to this file")
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--hops", type=int, default=3, help="rounds per member")
+    parser.add_argument("--rate", type=float, default=200.0, help="events per second")
+    parser.add_argument("--dwell", type=float, default=5.0, help="seconds a member stays in voice, voice-storm only")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--latency", type=float, default=0.08, help="mean REST latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-limit", type=int, default=5, help="requests per route bucket and window, 0 disables")
+    parser.add_argument("--rate-limit-window", type=float, default=1.0)
+    parser.add_argument("--gateway-delay", type=float, default=0.02, help="delay of the gateway events echoed by REST calls")
+    parser.add_argument("--settle", type=float, default=1.0, help="quiet seconds that end a run")
+    parser.add_argument("--deadline", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
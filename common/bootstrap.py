@@ -0,0 +1,128 @@
+import asyncio
+import discord
+import logging
+import time
+from discord.ext import commands
+from typing import Dict, List, NamedTuple, Optional, Set, Union
+import utils
+
+
+log = logging.getLogger(__name__)
+
+
+class Channel(NamedTuple):
+    id: int
+
+
+class Role(NamedTuple):
+    id: int
+    # the role is looked up in the guild of this channel
+    via: int
+
+
+Dependency = Union[Channel, Role]
+
+
+class Registry:
+    """Objects resolved from the config ids, shared by every cog."""
+
+    def __init__(self):
+        self.channels: Dict[int, discord.abc.GuildChannel] = {}
+        self.roles: Dict[int, discord.Role] = {}
+
+    def channel(self, channel_id: int) -> Optional[discord.abc.GuildChannel]:
+        return self.channels.get(channel_id)
+
+    def role(self, role_id: int) -> Optional[discord.Role]:
+        return self.roles.get(role_id)
+
+    def store(self, dependency: Dependency, obj):
+        objects = self.channels if isinstance(dependency, Channel) else self.roles
+        if obj is None:
+            objects.pop(dependency.id, None)
+        else:
+            objects[dependency.id] = obj
+
+
+class Bootstrap:
+    """Resolves every id the cogs depend on concurrently, once per READY.
+
+    A cog takes part by implementing:
+        def bootstrap_requires(self) -> List[Dependency]
+        async def on_bootstrap_ready(self, registry: Registry)
+
+    `on_bootstrap_ready` is awaited as soon as that cog's own dependencies are
+    resolved, without waiting for the other cogs. A cog is skipped when one of
+    them is missing, unless it sets `bootstrap_partial = True` and handles the
+    missing ones itself, as cogs serving several guilds do.
+    """
+
+    def __init__(self, bot: commands.Bot, local_only: bool = False):
+        self.bot = bot
+        # Sharded workers only serve guilds in their own cache, never fetch through REST
+        self.local_only = local_only
+        self.registry = Registry()
+        self._tasks: Dict[Dependency, asyncio.Task] = {}
+
+        # names of the cogs whose on_bootstrap_ready has completed
+        self.started: Set[str] = set()
+
+        self.runs = 0
+        self.last_duration: Optional[float] = None
+
+    async def _resolve_channel(self, dependency: Channel):
+        if self.local_only:
+            return self.bot.get_channel(dependency.id)
+        return await utils.get_channel_by_id(self.bot, dependency.id)
+
+    async def _resolve_role(self, dependency: Role):
+        channel = await self._resolve(Channel(dependency.via))
+        if channel is None:
+            return None
+        return await utils.get_role_by_guild(channel.guild, dependency.id)
+
+    async def _resolve(self, dependency: Dependency):
+        # a feature the guild config turned off, not worth a REST call
+        if not dependency.id:
+            return None
+        task = self._tasks.get(dependency)
+        if task is None:
+            resolver = self._resolve_channel if isinstance(dependency, Channel) else self._resolve_role
+            task = self._tasks[dependency] = asyncio.create_task(resolver(dependency))
+
+        obj = await task
+        self.registry.store(dependency, obj)
+        return obj
+
+    async def _start_cog(self, cog: commands.Cog):
+        self.started.discard(cog.qualified_name)
+        dependencies: List[Dependency] = cog.bootstrap_requires()
+        resolved = await asyncio.gather(*(self._resolve(dependency) for dependency in dependencies))
+
+        missing = [dependency for dependency, obj in zip(dependencies, resolved) if obj is None]
+        if missing and getattr(cog, "bootstrap_partial", False):
+            log.warning("%s is started without unresolved dependencies: %s", cog.qualified_name, missing)
+        elif missing:
+            log.warning("%s is not started, unresolved dependencies: %s", cog.qualified_name, missing)
+            return
+
+        await cog.on_bootstrap_ready(self.registry)
+        self.started.add(cog.qualified_name)
+
+    async def start(self, cog: commands.Cog):
+        """Start a cog added after READY, such as one of a reloaded extension."""
+        await self._start_cog(cog)
+
+    async def run(self, started_at: float):
+        """Start every cog, `started_at` is the perf_counter() the measured duration counts from."""
+        self._tasks.clear()
+
+        cogs = [cog for cog in self.bot.cogs.values() if hasattr(cog, "bootstrap_requires")]
+        results = await asyncio.gather(*(self._start_cog(cog) for cog in cogs), return_exceptions=True)
+        for cog, result in zip(cogs, results):
+            if isinstance(result, Exception):
+                log.error("Failed to start %s", cog.qualified_name, exc_info=result)
+
+        self.runs += 1
+        self.last_duration = time.perf_counter() - started_at
+        return self.last_duration
@@ -1,3 +1,7 @@
+# The guild every id below belongs to, see common/guild_config.py. Discord gives the first
+# channel of a new guild the guild's own id, here that is MAIN_CHAT_CHANNEL_ID.
+GUILD_ID = 1021322193067573248
+
 AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID = 1090625787595608125
 ERROR_LOGGING_CHANNEL_ID = 1090654269620879461
 ROLE_ASSIGNMENT_CHANNEL_ID = 1090979484452266065
@@ -35,3 +39,47 @@ RUST_ROLE_ID = 1090651553460920350
 
 SERVER_ICON_URL = "https://avatars.githubusercontent.com/u/129297608?s=96&v=4"
 SERVER_AUTHENTICATION_ROLE_ID = 1021325093424595084
+
+# Keep one activity message per voice channel and edit it instead of sending an embed per join/leave
+VOICE_LOG_COALESCE = True
+VOICE_LOG_FLUSH_INTERVAL = 5.0
+VOICE_LOG_MAX_LENGTH = 3500
+
+# Hidden voice channels kept ready in the generator category, see common/voice_pool.py
+VOICE_CHANNEL_POOL_NAME = "대기 중인 통화방"
+# Claimed channels are named after their owner, "<nick> 님의 통화방"
+VOICE_CHANNEL_NAME_SUFFIX = " 님의 통화방"
+VOICE_CHANNEL_POOL_SIZE = 2
+VOICE_CHANNEL_POOL_MAX_SIZE = 5
+VOICE_CHANNEL_POOL_REFILL = "eager"
+
+# Grace period before an empty auto-created voice channel is released, see common/deferred.py
+VOICE_CHANNEL_DELETE_DELAY = 3.0
+VOICE_CHANNEL_DELETE_CONCURRENCY = 2
+
+# Repeated errors are summarized once per window, see common/error_aggregator.py
+ERROR_SUMMARY_WINDOW = 60.0
+ERROR_MAX_REPORTS_PER_WINDOW = 10
+
+# Closed voice sessions are aggregated in memory and written to the state store once per interval
+VOICE_STATS_FLUSH_INTERVAL = 60.0
+
+# Buttons and modals are deferred right away, a pending notice is sent when their work takes longer than this
+INTERACTION_FOLLOWUP_BUDGET = 2.5
+
+# SIGTERM drains pending sends and channel deletions for at most this long, the rest is journaled.
+# Below the 10 seconds launcher.py and most container runtimes wait before killing the process.
+SHUTDOWN_DEADLINE = 8.0
+
+# Member counts on the role panels. Counting needs every member cached, so this loads Cogs/role_count_handler.py,
+# whose member listeners turn on chunking at startup (see common/intents.py). False keeps the smaller member
+# cache and posts the panels without counts.
+ROLE_COUNTS = False
+
+# The member counts on the role panels are edited at most once per interval
+ROLE_COUNT_REFRESH_INTERVAL = 30.0
+
+# Empty voice channels left behind while the bot was down are released on READY and once per interval,
+# at most VOICE_SWEEP_MAX_RELEASES per pass
+VOICE_SWEEP_INTERVAL = 600.0
+VOICE_SWEEP_MAX_RELEASES = 25
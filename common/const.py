@@ -3,3 +3,33 @@ import os
 
 PREFIX = "!"
 TOKEN = os.environ.get("TOKEN")
+# "minimal" derives intents from the loaded cogs, "all" falls back to discord.Intents.all()
+INTENTS_PROFILE = os.environ.get("INTENTS_PROFILE", "minimal")
+
+# Used by launcher.py, SHARD_COUNT=0 asks Discord for the recommended count
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "0"))
+SHARD_PROCESSES = int(os.environ.get("SHARD_PROCESSES", "1"))
+
+# Hash of the last synced command tree, the sync is skipped while it matches
+COMMAND_TREE_HASH_PATH = os.environ.get("COMMAND_TREE_HASH_PATH", ".command_tree_hash.json")
+FORCE_TREE_SYNC = os.environ.get("FORCE_TREE_SYNC", "") == "1"
+
+# SQLite database for state that has to survive restarts, see common/store.py
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", "modoco.db")
+
+# Prometheus endpoint on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables all instrumentation
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Per-guild channel and role ids, see common/guild_config.py, polled for changes every GUILD_CONFIG_WATCH_INTERVAL seconds
+GUILD_CONFIG_PATH = os.environ.get("GUILD_CONFIG_PATH", "guilds.json")
+GUILD_CONFIG_WATCH_INTERVAL = float(os.environ.get("GUILD_CONFIG_WATCH_INTERVAL", "5"))
+
+# Reload extensions from Cogs/ when their file changes, for development, 0 disables the watcher
+EXTENSION_WATCH_INTERVAL = float(os.environ.get("EXTENSION_WATCH_INTERVAL", "0"))
+
+# JSON log file, rotated at LOG_MAX_BYTES, see common/structured_logging.py
+LOG_PATH = os.environ.get("LOG_PATH", "logs/modoco.log")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
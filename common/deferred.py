@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+log = logging.getLogger(__name__)
+
+
+class DeferredScheduler:
+    """Single heap-based timer keeping at most one pending action per key.
+
+    Scheduling a key again resets its grace period and cancelling it drops the
+    action. Due actions run with bounded concurrency.
+    """
+
+    def __init__(self, max_concurrency: int = 2):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # key -> (due, generation, action)
+        self._entries: Dict[Hashable, Tuple[float, int, Callable[[], Awaitable[None]]]] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._generation = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        # running action -> its key
+        self._running: Dict[asyncio.Task, Hashable] = {}
+
+        self.scheduled = 0
+        self.cancelled = 0
+        self.executed = 0
+        self.failed = 0
+
+    def schedule(self, key: Hashable, delay: float, action: Callable[[], Awaitable[None]]):
+        if key in self._entries:
+            self.cancelled += 1
+
+        due = time.monotonic() + delay
+        generation = next(self._generation)
+        self._entries[key] = (due, generation, action)
+        heapq.heappush(self._heap, (due, generation, key))
+        self.scheduled += 1
+
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        # The heap entry is left behind and skipped once its generation no longer matches
+        if self._entries.pop(key, None) is None:
+            return False
+
+        self.cancelled += 1
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def active_keys(self) -> Set[Hashable]:
+        """Keys whose action is pending or running."""
+        return {*self._entries, *self._running.values()}
+
+    def pending(self) -> Dict[Hashable, float]:
+        """Seconds left until each pending action runs."""
+        now = time.monotonic()
+        return {key: max(0.0, due - now) for key, (due, _, _) in self._entries.items()}
+
+    async def _run(self):
+        while self._entries:
+            self._wakeup.clear()
+            due, generation, key = self._heap[0]
+
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != generation:
+                heapq.heappop(self._heap)
+                continue
+
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._entries[key]
+            self._start(key, entry[2])
+
+        self._heap.clear()
+
+    def _start(self, key: Hashable, action: Callable[[], Awaitable[None]]):
+        task = asyncio.create_task(self._execute(key, action))
+        self._running[task] = key
+        task.add_done_callback(lambda task: self._running.pop(task, None))
+
+    async def _execute(self, key: Hashable, action: Callable[[], Awaitable[None]]):
+        async with self._semaphore:
+            try:
+                await action()
+            except Exception:
+                self.failed += 1
+                log.exception("Deferred action for %s failed", key)
+            else:
+                self.executed += 1
+
+    async def drain(self, timeout: float) -> List[Hashable]:
+        """Run every pending action now, returns the keys still unfinished after `timeout`."""
+        entries, self._entries = self._entries, {}
+        self._heap.clear()
+        self._wakeup.set()
+        for key, (_, _, action) in entries.items():
+            self._start(key, action)
+
+        if self._running:
+            await asyncio.wait(list(self._running), timeout=timeout)
+        return list(self._running.values())
+
+    async def close(self):
+        if self._runner:
+            self._runner.cancel()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*filter(None, [self._runner, *self._running]), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._entries),
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "executed": self.executed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,145 @@
+import discord
+import os
+import sysconfig
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Fingerprint(NamedTuple):
+    type: str
+    file: Optional[str]
+    line: Optional[int]
+    event: str
+
+
+class ErrorGroup:
+    def __init__(self, fingerprint: Fingerprint, error: Exception):
+        self.fingerprint = fingerprint
+        self.message = str(error)
+        self.first_traceback = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        self.first_seen = time.time()
+        self.total = 0
+        # occurrences since the last report
+        self.unreported = 0
+        # (second, count) buckets inside the sliding window
+        self.buckets: Deque[List[int]] = deque()
+
+    def add(self, now: float):
+        second = int(now)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += 1
+        else:
+            self.buckets.append([second, 1])
+        self.total += 1
+        self.unreported += 1
+
+    def count(self, now: float, window: float) -> int:
+        horizon = now - window
+        while self.buckets and self.buckets[0][0] < horizon:
+            self.buckets.popleft()
+        return sum(count for _, count in self.buckets)
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# also excluded when a virtualenv lives inside the repo
+LIBRARY_PATHS = tuple({os.path.dirname(os.path.abspath(discord.__file__)), sysconfig.get_paths()["purelib"], sysconfig.get_paths()["stdlib"]})
+
+
+def _is_repo_frame(frame: traceback.FrameSummary) -> bool:
+    filename = os.path.abspath(frame.filename)
+    return filename.startswith(REPO_ROOT + os.sep) and not filename.startswith(LIBRARY_PATHS) and "site-packages" not in filename
+
+
+def fingerprint(event: str, error: Exception) -> Fingerprint:
+    frames = traceback.extract_tb(error.__traceback__) if error.__traceback__ else []
+    # The innermost frame of this repo is the call site. The innermost frame overall would be
+    # the raise in discord/http.py for every HTTPException, whatever call failed.
+    frame = next((frame for frame in reversed(frames) if _is_repo_frame(frame)), frames[-1] if frames else None)
+    return Fingerprint(
+        type=type(error).__name__,
+        file=frame.filename if frame else None,
+        line=frame.lineno if frame else None,
+        event=event,
+    )
+
+
+class ErrorAggregator:
+    """Groups errors by fingerprint and decides what is worth a report.
+
+    The first occurrence of a fingerprint inside the window is reported right
+    away, repeats are only counted and show up in the periodic summary.
+    `max_reports_per_window` caps reports of every kind so error reporting
+    can never become the largest API consumer.
+    """
+
+    def __init__(self, window: float = 60.0, max_reports_per_window: int = 10, max_groups: int = 500):
+        self.window = window
+        self.max_reports_per_window = max_reports_per_window
+        self.max_groups = max_groups
+
+        self.groups: Dict[Fingerprint, ErrorGroup] = {}
+        self._reports: Deque[float] = deque()
+
+        self.recorded = 0
+        self.suppressed = 0
+
+    def _can_report(self, now: float) -> bool:
+        while self._reports and self._reports[0] < now - self.window:
+            self._reports.popleft()
+        return len(self._reports) < self.max_reports_per_window
+
+    def _reported(self, group: ErrorGroup, now: float):
+        self._reports.append(now)
+        group.unreported = 0
+
+    def record(self, event: str, error: Exception) -> Optional[ErrorGroup]:
+        """Count the error, returns its group when it should be reported immediately."""
+        now = time.time()
+        key = fingerprint(event, error)
+        self.recorded += 1
+
+        group = self.groups.get(key)
+        is_new = group is None or group.count(now, self.window) == 0
+        if group is None:
+            if len(self.groups) >= self.max_groups:
+                self.prune(now)
+            group = self.groups[key] = ErrorGroup(key, error)
+        group.add(now)
+
+        if is_new and self._can_report(now):
+            self._reported(group, now)
+            return group
+
+        self.suppressed += 1
+        return None
+
+    def summarize(self) -> Tuple[List[Tuple[ErrorGroup, int]], int]:
+        """Groups with unreported occurrences, hottest first, within the report budget.
+
+        Returns the groups to report with their count in the window, and how many
+        groups were left out because the budget ran out.
+        """
+        now = time.time()
+        pending = sorted(
+            (group for group in self.groups.values() if group.unreported),
+            key=lambda group: group.count(now, self.window),
+            reverse=True,
+        )
+
+        summary: List[Tuple[ErrorGroup, int]] = []
+        for group in pending:
+            if not self._can_report(now):
+                break
+            summary.append((group, group.count(now, self.window)))
+            self._reported(group, now)
+
+        return summary, len(pending) - len(summary)
+
+    def prune(self, now: Optional[float] = None):
+        """Forget groups that are quiet and fully reported."""
+        now = now or time.time()
+        for key, group in list(self.groups.items()):
+            if not group.unreported and group.count(now, self.window) == 0:
+                del self.groups[key]
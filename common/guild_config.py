@@ -0,0 +1,190 @@
+"""Per-guild configuration, loaded from a JSON file and swapped atomically on reload.
+
+    {
+        "guilds": [
+            {
+                "guild_id": 1021322193067573248,
+                "generator_channel_id": 1090625787595608125,
+                "role_conflict_groups": [[1021322700179898368, 1021322732664803328]]
+            }
+        ]
+    }
+
+Channel and role ids only exist in one guild, so every guild needs its own
+entry and there is no entry that applies to any guild. The entry of
+config.GUILD_ID, the guild the ids of common/config.py belong to, falls back to
+them for the ids it leaves out; any other guild gets 0 for them, which turns
+the feature off. Without the file, only config.GUILD_ID is served, with the
+values of common/config.py, which is how the bot ran before.
+"""
+import asyncio
+import json
+import logging
+import os
+from types import MappingProxyType
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional
+from common import config
+
+
+log = logging.getLogger(__name__)
+
+
+class GuildConfig(NamedTuple):
+    guild_id: int
+    # 0 where the guild has no such channel or role
+    generator_channel_id: int
+    role_assignment_channel_id: int
+    self_description_channel_id: int
+    main_chat_channel_id: int
+    welcome_channel_id: int
+    goodbye_channel_id: int
+    default_role_id: int
+    authentication_role_id: int
+    # role id -> the other roles of its mutually exclusive group
+    role_conflicts: Mapping[int, FrozenSet[int]] = MappingProxyType({})
+
+    def conflicts(self, role_id: int) -> FrozenSet[int]:
+        return self.role_conflicts.get(role_id, frozenset())
+
+
+DEFAULTS = {
+    "generator_channel_id": config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID,
+    "role_assignment_channel_id": config.ROLE_ASSIGNMENT_CHANNEL_ID,
+    "self_description_channel_id": config.SELF_DESCRIPTION_CHANNEL_ID,
+    "main_chat_channel_id": config.MAIN_CHAT_CHANNEL_ID,
+    "welcome_channel_id": config.WELCOME_CHANNEL_ID,
+    "goodbye_channel_id": config.GOODBYE_CHANNEL_ID,
+    "default_role_id": config.DEFULT_ROLE_ID,
+    "authentication_role_id": config.SERVER_AUTHENTICATION_ROLE_ID,
+}
+
+
+def _parse_id(value, key: str) -> int:
+    # ids may be written as numbers or as strings, the way Discord's API returns them
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    raise ValueError(f"{key} must be an id, got {value!r}")
+
+
+def parse_guild_config(data: dict) -> GuildConfig:
+    """Raises ValueError naming the offending key for anything but a well-formed entry."""
+    if not isinstance(data, dict):
+        raise ValueError(f"Every entry of \"guilds\" must be an object, got {data!r}")
+    if "guild_id" not in data:
+        raise ValueError("Every entry of \"guilds\" needs a guild_id")
+    unknown = set(data) - set(DEFAULTS) - {"guild_id", "role_conflict_groups"}
+    if unknown:
+        raise ValueError(f"Unknown guild config keys: {', '.join(sorted(unknown))}")
+
+    groups = data.get("role_conflict_groups", [])
+    if not isinstance(groups, list) or not all(isinstance(group, list) for group in groups):
+        raise ValueError(f"role_conflict_groups must be a list of lists of role ids, got {groups!r}")
+
+    role_conflicts: Dict[int, FrozenSet[int]] = {}
+    for group in groups:
+        role_ids = frozenset(_parse_id(role_id, "role_conflict_groups") for role_id in group)
+        for role_id in role_ids:
+            role_conflicts[role_id] = role_conflicts.get(role_id, frozenset()) | (role_ids - {role_id})
+
+    guild_id = _parse_id(data["guild_id"], "guild_id")
+    # the ids of common/config.py are only valid in their own guild
+    defaults = DEFAULTS if guild_id == config.GUILD_ID else dict.fromkeys(DEFAULTS, 0)
+    values = {name: _parse_id(data.get(name, default), name) for name, default in defaults.items()}
+    return GuildConfig(guild_id=guild_id, role_conflicts=MappingProxyType(role_conflicts), **values)
+
+
+class GuildConfigSnapshot:
+    """Immutable view of every guild config with the indexes the event handlers look up."""
+
+    def __init__(self, guilds: Iterable[GuildConfig]):
+        self.by_guild: Mapping[int, GuildConfig] = MappingProxyType({guild.guild_id: guild for guild in guilds})
+
+    def get(self, guild_id: int) -> Optional[GuildConfig]:
+        return self.by_guild.get(guild_id)
+
+    def all(self) -> List[GuildConfig]:
+        return list(self.by_guild.values())
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, GuildConfigSnapshot) and self.by_guild == other.by_guild
+
+
+def load_snapshot(path: str) -> GuildConfigSnapshot:
+    if not os.path.exists(path):
+        return GuildConfigSnapshot([parse_guild_config({"guild_id": config.GUILD_ID})])
+
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+
+    if not isinstance(data, dict) or not isinstance(data.get("guilds", []), list):
+        raise ValueError("The guild config must be an object with a \"guilds\" list")
+    if "default" in data:
+        raise ValueError("\"default\" is not supported, the channel and role ids of a guild need an entry with its guild_id")
+    return GuildConfigSnapshot(parse_guild_config(guild) for guild in data.get("guilds", []))
+
+
+class GuildConfigRegistry:
+    """Holds the current snapshot, readers never see a half-applied reload."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.snapshot = load_snapshot(path)
+        self._mtime = self._modified_at()
+        self._watcher: Optional[asyncio.Task] = None
+
+        self.reloads = 0
+
+    def _modified_at(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def get(self, guild_id: int) -> Optional[GuildConfig]:
+        return self.snapshot.get(guild_id)
+
+    def all(self) -> List[GuildConfig]:
+        return self.snapshot.all()
+
+    def reload(self) -> bool:
+        """Swap in the file's current content, returns whether it changed.
+
+        An invalid file raises and leaves the current snapshot in place.
+        """
+        self._mtime = self._modified_at()
+        snapshot = load_snapshot(self.path)
+        if snapshot == self.snapshot:
+            return False
+
+        self.snapshot = snapshot
+        self.reloads += 1
+        return True
+
+    def watch(self, interval: float, on_change: Callable[[], Awaitable[None]]):
+        self._watcher = asyncio.create_task(self._watch(interval, on_change))
+
+    async def _watch(self, interval: float, on_change: Callable[[], Awaitable[None]]):
+        while True:
+            await asyncio.sleep(interval)
+            if self._modified_at() == self._mtime:
+                continue
+
+            # Nothing may end the loop, hot reload would stay off until the next restart
+            try:
+                changed = self.reload()
+            except Exception:
+                log.exception("Ignoring invalid guild config %s", self.path)
+                continue
+
+            if changed:
+                log.info("Reloaded guild config from %s", self.path)
+                try:
+                    await on_change()
+                except Exception:
+                    log.exception("Failed to apply the reloaded guild config")
+
+    def close(self):
+        if self._watcher:
+            self._watcher.cancel()
@@ -0,0 +1,133 @@
+"""Reload an extension in place, handing the state of its cogs to the new instances.
+
+A cog lists the attributes that carry over:
+
+    handoff_attributes = ("pools", "deletions")
+
+They are taken from the old cog before it is removed and set on the new one
+right after `__init__`, before `cog_load`. While the hand-off is pending the
+old cog's `cog_unload` must leave those objects running, see `handing_off`.
+A cog whose state was handed over is not bootstrapped again, so panels are
+not reconciled and ids are not resolved a second time. Any other cog of the
+extension is started as soon as it is added.
+
+If the new `setup` fails, discord.py restores the previous module and the
+previous cogs get the same state back.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from discord.ext import commands
+from typing import Dict, List, NamedTuple, Optional, Set
+from common import const
+from common.tree_sync import sync_if_changed
+
+
+log = logging.getLogger(__name__)
+
+
+class ReloadResult(NamedTuple):
+    extension: str
+    # unload, import, setup and bootstrap, without the command tree sync
+    seconds: float
+    handed_off: List[str]
+    synced: bool
+
+
+def _belongs_to(cog: commands.Cog, extension: str) -> bool:
+    return cog.__module__ == extension or cog.__module__.startswith(extension + ".")
+
+
+class ExtensionReloader:
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # cog name -> attributes of the cog being replaced
+        self.handoff: Dict[str, dict] = {}
+        self._lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+
+        self.reloads = 0
+        self.failures = 0
+
+    def handing_off(self, cog: commands.Cog) -> bool:
+        return cog.qualified_name in self.handoff
+
+    def restore(self, cog: commands.Cog):
+        for name, value in self.handoff.get(cog.qualified_name, {}).items():
+            setattr(cog, name, value)
+
+    def _cogs(self, extension: str) -> List[commands.Cog]:
+        return [cog for cog in self.bot.cogs.values() if _belongs_to(cog, extension)]
+
+    async def _start(self, extension: str, bootstrapped: Set[str]):
+        for cog in self._cogs(extension):
+            if not hasattr(cog, "bootstrap_requires"):
+                continue
+            if cog.qualified_name in bootstrapped:
+                self.bot.bootstrap.started.add(cog.qualified_name)
+            elif self.bot.is_ready():
+                await self.bot.bootstrap.start(cog)
+
+    async def reload(self, extension: str) -> ReloadResult:
+        """Raises the discord.py extension error when the new version could not be loaded."""
+        async with self._lock:
+            started_at = time.perf_counter()
+            old_cogs = self._cogs(extension)
+            self.handoff = {
+                cog.qualified_name: {name: getattr(cog, name) for name in cog.handoff_attributes}
+                for cog in old_cogs
+                if getattr(cog, "handoff_attributes", ())
+            }
+            handed_off = list(self.handoff)
+            # only cogs that were running before can skip the bootstrap
+            bootstrapped = {name for name in handed_off if name in self.bot.bootstrap.started}
+            self.bot.bootstrap.started.difference_update(cog.qualified_name for cog in old_cogs)
+
+            try:
+                await self.bot.reload_extension(extension)
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self.handoff = {}
+                await self._start(extension, bootstrapped)
+
+            seconds = time.perf_counter() - started_at
+            self.reloads += 1
+
+        # only needed when a command was added, removed or changed its signature
+        synced = await sync_if_changed(self.bot, const.COMMAND_TREE_HASH_PATH)
+        log.info("Reloaded %s in %.3fs, state handed off by %s", extension, seconds, handed_off or "no cog")
+        return ReloadResult(extension, seconds, handed_off, synced)
+
+    def _modified_at(self) -> Dict[str, float]:
+        mtimes = {}
+        for extension in self.bot.extensions:
+            path = getattr(sys.modules.get(extension), "__file__", None)
+            if path and os.path.exists(path):
+                mtimes[extension] = os.stat(path).st_mtime
+        return mtimes
+
+    def watch(self, interval: float):
+        """Reload every extension whose source file changes, for development."""
+        self._watcher = asyncio.create_task(self._watch(interval))
+
+    async def _watch(self, interval: float):
+        mtimes = self._modified_at()
+        while True:
+            await asyncio.sleep(interval)
+            current = self._modified_at()
+            for extension, mtime in current.items():
+                if mtimes.get(extension, mtime) == mtime:
+                    continue
+                try:
+                    await self.reload(extension)
+                except Exception:
+                    log.exception("Reloading %s failed, the previous version stays loaded", extension)
+            mtimes = current
+
+    def close(self):
+        if self._watcher:
+            self._watcher.cancel()
@@ -0,0 +1,83 @@
+import discord
+import importlib
+from discord.ext import commands
+from typing import Dict, Iterable, NamedTuple, Set, Tuple
+
+
+class IntentsProfile(NamedTuple):
+    intents: discord.Intents
+    member_cache_flags: discord.MemberCacheFlags
+    chunk_guilds_at_startup: bool
+
+
+# listener -> (intents it needs, member cache flags it needs, needs every member chunked at READY)
+EVENT_REQUIREMENTS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...], bool]] = {
+    "on_ready": ((), (), False),
+    "on_error": ((), (), False),
+    "on_command_error": ((), (), False),
+    "on_app_command_error": ((), (), False),
+    "on_view_error": ((), (), False),
+    "on_modal_error": ((), (), False),
+    "on_guild_channel_create": ((), (), False),
+    "on_guild_channel_update": ((), (), False),
+    "on_guild_channel_delete": ((), (), False),
+    "on_voice_state_update": (("voice_states",), ("voice",), False),
+    "on_member_join": (("members",), (), False),
+    "on_raw_member_remove": (("members",), (), False),
+    # on_member_remove and on_member_update only fire for cached members
+    "on_member_remove": (("members",), ("joined",), True),
+    "on_member_update": (("members",), ("joined",), True),
+    "on_presence_update": (("members", "presences"), ("joined",), True),
+    "on_message": (("guild_messages", "message_content"), (), False),
+}
+
+
+def collect_listeners(extensions: Iterable[str]) -> Tuple[Set[str], bool]:
+    """Listener names registered by the cogs of `extensions`, and whether any cog has prefix commands."""
+    listeners: Set[str] = set()
+    has_prefix_commands = False
+
+    for extension in extensions:
+        module = importlib.import_module(extension)
+        for obj in vars(module).values():
+            if isinstance(obj, type) and issubclass(obj, commands.Cog) and obj is not commands.Cog:
+                listeners.update(name for name, _ in obj.__cog_listeners__)
+                has_prefix_commands |= bool(obj.__cog_commands__)
+
+    return listeners, has_prefix_commands
+
+
+def compute_profile(listeners: Iterable[str], has_prefix_commands: bool = False) -> IntentsProfile:
+    """The smallest intents, member cache and chunking policy covering `listeners`.
+
+    Events that are dispatched by the bot itself (such as the voice router's
+    `on_managed_join`) need nothing from the gateway and are ignored.
+    """
+    intents = discord.Intents.none()
+    # guilds is required for the channel, role and voice state caches every cog relies on
+    intents.guilds = True
+
+    member_cache_flags = discord.MemberCacheFlags.none()
+    chunk_guilds_at_startup = False
+
+    for listener in listeners:
+        required_intents, required_cache, chunk = EVENT_REQUIREMENTS.get(listener, ((), (), False))
+        for name in required_intents:
+            setattr(intents, name, True)
+        for name in required_cache:
+            setattr(member_cache_flags, name, True)
+        chunk_guilds_at_startup |= chunk
+
+    if has_prefix_commands:
+        intents.guild_messages = True
+        intents.message_content = True
+
+    # members in voice stay cached so channel.members keeps working
+    if intents.voice_states:
+        member_cache_flags.voice = True
+
+    return IntentsProfile(intents, member_cache_flags, chunk_guilds_at_startup)
+
+
+def profile_for_extensions(extensions: Iterable[str]) -> IntentsProfile:
+    return compute_profile(*collect_listeners(extensions))
@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import discord
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from common import config
+from common.structured_logging import bind_event, event_context
+from common.metrics import LatencyStats
+
+
+ERROR_MESSAGE = "🕳️ There is an error."
+PENDING_MESSAGE = "⏳ 처리 중이에요. 완료되면 다시 알려드릴게요."
+
+Followup = Optional[Union[str, Dict[str, Any]]]
+Callback = Callable[[Any, discord.Interaction], Awaitable[Followup]]
+
+
+class AckStats:
+    def __init__(self):
+        # interaction creation to acknowledgement, what Discord's 3 second deadline measures
+        self.ack = LatencyStats()
+        # acknowledgement to the end of the side effects
+        self.side_effects = LatencyStats()
+        self.over_budget = 0
+        self.failed = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "ack": self.ack.to_dict(),
+            "side_effects": self.side_effects.to_dict(),
+            "over_budget": self.over_budget,
+            "failed": self.failed,
+        }
+
+
+interaction_stats: Dict[str, AckStats] = {}
+
+
+def get_interaction_stats() -> Dict[str, dict]:
+    return {name: stats.to_dict() for name, stats in interaction_stats.items()}
+
+
+async def _send_followup(interaction: discord.Interaction, followup: Followup, ephemeral: bool):
+    if followup is None:
+        return
+    kwargs = {"content": followup} if isinstance(followup, str) else followup
+    await interaction.followup.send(ephemeral=ephemeral, **kwargs)
+
+
+def fast_ack(ephemeral: bool = True, thinking: bool = True, budget: Optional[float] = None):
+    """Defer the interaction before the callback runs, then answer with a follow-up.
+
+    The decorated button callback or modal `on_submit` does its REST work after
+    the acknowledgement and returns the follow-up, a message or a dict of
+    `followup.send` arguments, or None to send nothing. When the work outlives
+    `budget` the member gets a pending notice, and the follow-up once it is done.
+    """
+    def decorator(callback: Callback) -> Callable[[Any, discord.Interaction], Awaitable[None]]:
+        name = callback.__qualname__
+        stats = interaction_stats.setdefault(name, AckStats())
+
+        async def handle(self, interaction: discord.Interaction):
+            metrics = getattr(interaction.client, "metrics", None)
+            labels = (("callback", name),)
+
+            if not interaction.response.is_done():
+                await interaction.response.defer(ephemeral=ephemeral, thinking=thinking)
+            ack = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+            stats.ack.record(ack)
+            if metrics:
+                metrics.interaction_ack_seconds.observe(labels, ack)
+
+            started_at = time.perf_counter()
+            # the side effects are never cancelled by the budget, only the follow-up is split
+            task = asyncio.ensure_future(callback(self, interaction))
+            try:
+                done, _ = await asyncio.wait({task}, timeout=budget or config.INTERACTION_FOLLOWUP_BUDGET)
+                if not done:
+                    stats.over_budget += 1
+                    await interaction.followup.send(PENDING_MESSAGE, ephemeral=ephemeral)
+                followup = await task
+            except Exception:
+                stats.failed += 1
+                with contextlib.suppress(discord.HTTPException):
+                    await interaction.followup.send(ERROR_MESSAGE, ephemeral=ephemeral)
+                raise
+            finally:
+                seconds = time.perf_counter() - started_at
+                stats.side_effects.record(seconds)
+                if metrics:
+                    metrics.interaction_side_effect_seconds.observe(labels, seconds)
+
+            await _send_followup(interaction, followup, ephemeral)
+
+        @functools.wraps(callback)
+        async def wrapper(self, interaction: discord.Interaction):
+            # Records logged by the callback carry the interaction's guild, channel and member
+            token = bind_event(name, (interaction,))
+            metrics = getattr(interaction.client, "metrics", None)
+            try:
+                if metrics:
+                    await metrics.time_callback(name, handle(self, interaction))
+                else:
+                    await handle(self, interaction)
+            finally:
+                event_context.reset(token)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,303 @@
+"""Local IPC between the shard launcher and its worker processes.
+
+Messages are JSON objects, one per line, over a localhost TCP socket.
+
+worker -> coordinator
+    {"op": "hello", "worker": 0, "shards": [0, 1]}
+    {"op": "health", "shards": {"0": {...}}}
+    {"op": "query", "id": 1, "name": "guild_count"}      fan out to every worker
+    {"op": "broadcast", "name": "reload_config", "data": null}
+    {"op": "reply", "id": 7, "data": ...}                 answer to a coordinator query
+
+coordinator -> worker
+    {"op": "query", "id": 7, "name": "guild_count"}
+    {"op": "broadcast", "name": "reload_config", "data": null}
+    {"op": "reply", "id": 1, "data": [...]}              one entry per worker
+
+A worker that loses the coordinator reconnects with backoff. Until then its
+queries and broadcasts raise ConnectionError instead of waiting for a reply
+that cannot come.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+
+log = logging.getLogger(__name__)
+
+QueryHandler = Callable[[], Awaitable[Any]]
+BroadcastHandler = Callable[[str, Any], None]
+
+
+async def _write(writer: asyncio.StreamWriter, payload: dict):
+    writer.write(json.dumps(payload).encode() + b"\n")
+    await writer.drain()
+
+
+class _WorkerConnection:
+    def __init__(self, worker: int, shards: List[int], writer: asyncio.StreamWriter):
+        self.worker = worker
+        self.shards = shards
+        self.writer = writer
+        self.health: Dict[str, dict] = {}
+        self.last_seen = time.monotonic()
+        # ids of the queries this worker has not answered yet
+        self.queries: Set[int] = set()
+
+
+class IPCCoordinator:
+    """Runs in the launcher process, relays queries and broadcasts between workers."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, query_timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.query_timeout = query_timeout
+
+        self.workers: Dict[int, _WorkerConnection] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ids = itertools.count(1)
+        self._replies: Dict[int, asyncio.Future] = {}
+        self._handlers: Set[asyncio.Task] = set()
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+        for connection in list(self.workers.values()):
+            connection.writer.close()
+        # Let the connection handlers see EOF instead of being cancelled at loop shutdown
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection: Optional[_WorkerConnection] = None
+        self._handlers.add(asyncio.current_task())
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message.get("op")
+
+                if op == "hello":
+                    connection = _WorkerConnection(message["worker"], message["shards"], writer)
+                    self.workers[connection.worker] = connection
+                    log.info("Worker %s connected with shards %s", connection.worker, connection.shards)
+                    continue
+
+                if connection is None:
+                    continue
+                connection.last_seen = time.monotonic()
+
+                if op == "health":
+                    connection.health = message["shards"]
+                elif op == "reply":
+                    future = self._replies.pop(message["id"], None)
+                    if future and not future.done():
+                        future.set_result(message.get("data"))
+                elif op == "query":
+                    relay = asyncio.create_task(self._relay_query(connection, message))
+                    self._handlers.add(relay)
+                    relay.add_done_callback(self._relayed)
+                elif op == "broadcast":
+                    await self.broadcast(message["name"], message.get("data"))
+        except (ConnectionError, json.JSONDecodeError):
+            log.exception("Lost worker connection")
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            if connection:
+                # the answers will never come, do not wait for the timeout
+                for query_id in connection.queries:
+                    future = self._replies.get(query_id)
+                    if future and not future.done():
+                        future.set_exception(ConnectionError(f"Worker {connection.worker} disconnected"))
+            if connection and self.workers.get(connection.worker) is connection:
+                del self.workers[connection.worker]
+                log.warning("Worker %s disconnected", connection.worker)
+
+    def _relayed(self, task: asyncio.Task):
+        self._handlers.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Relaying an IPC query failed", exc_info=task.exception())
+
+    async def _relay_query(self, connection: _WorkerConnection, message: dict):
+        data = await self.query(message["name"])
+        # the asking worker may be gone by now
+        with contextlib.suppress(ConnectionError):
+            await _write(connection.writer, {"op": "reply", "id": message["id"], "data": data})
+
+    async def _ask(self, connection: _WorkerConnection, name: str) -> Any:
+        query_id = next(self._ids)
+        future = self._replies[query_id] = asyncio.get_running_loop().create_future()
+        connection.queries.add(query_id)
+        try:
+            await _write(connection.writer, {"op": "query", "id": query_id, "name": name})
+            return await asyncio.wait_for(future, self.query_timeout)
+        finally:
+            # a timed out or failed query must not stay behind
+            self._replies.pop(query_id, None)
+            connection.queries.discard(query_id)
+
+    async def query(self, name: str) -> List[Any]:
+        """Ask every worker, returns one answer per worker that replied in time."""
+        replies = await asyncio.gather(*(self._ask(connection, name) for connection in list(self.workers.values())), return_exceptions=True)
+        return [reply for reply in replies if not isinstance(reply, Exception)]
+
+    async def broadcast(self, name: str, data: Any = None):
+        for connection in list(self.workers.values()):
+            await _write(connection.writer, {"op": "broadcast", "name": name, "data": data})
+
+    def health(self) -> Dict[str, dict]:
+        """Latest health report per shard, across every worker."""
+        now = time.monotonic()
+        report = {}
+        for connection in self.workers.values():
+            for shard_id, shard in connection.health.items():
+                report[shard_id] = {**shard, "worker": connection.worker, "last_seen": now - connection.last_seen}
+        return report
+
+
+class IPCClient:
+    """Runs inside a worker process next to the bot."""
+
+    def __init__(self, worker: int, shards: List[int], host: str, port: int, health: Callable[[], Dict[str, dict]], heartbeat: float = 10.0, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.worker = worker
+        self.shards = shards
+        self.host = host
+        self.port = port
+        self.health = health
+        self.heartbeat = heartbeat
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.query_handlers: Dict[str, QueryHandler] = {}
+        self.broadcast_handlers: List[BroadcastHandler] = []
+
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tasks: List[asyncio.Task] = []
+        # the loop only keeps weak references to tasks, a running answer must not be collected
+        self._answers: Set[asyncio.Task] = set()
+        self._ids = itertools.count(1)
+        self._replies: Dict[int, asyncio.Future] = {}
+
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self):
+        """Raises when the coordinator is not reachable, later disconnects are retried in the background."""
+        reader = await self._connect()
+        self._tasks = [
+            asyncio.create_task(self._run(reader)),
+            asyncio.create_task(self._report_health()),
+        ]
+
+    async def close(self):
+        tasks = [*self._tasks, *self._answers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
+
+    async def _connect(self) -> asyncio.StreamReader:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        await _write(writer, {"op": "hello", "worker": self.worker, "shards": self.shards})
+        self._writer = writer
+        return reader
+
+    async def _run(self, reader: asyncio.StreamReader):
+        while True:
+            try:
+                await self._read(reader)
+                log.warning("IPC coordinator closed the connection")
+            except (ConnectionError, json.JSONDecodeError):
+                log.exception("Lost the IPC coordinator connection")
+            self._disconnected()
+            reader = await self._reconnect()
+
+    def _disconnected(self):
+        if self._writer:
+            self._writer.close()
+        self._writer = None
+        replies, self._replies = self._replies, {}
+        for future in replies.values():
+            if not future.done():
+                future.set_exception(ConnectionError("IPC coordinator connection lost"))
+
+    async def _reconnect(self) -> asyncio.StreamReader:
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                reader = await self._connect()
+            except OSError as error:
+                log.warning("Reconnecting to the IPC coordinator failed, retrying in %.0fs: %s", delay, error)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            self.reconnects += 1
+            log.info("Reconnected to the IPC coordinator")
+            return reader
+
+    def _require_connection(self) -> asyncio.StreamWriter:
+        if not self.connected:
+            raise ConnectionError("Not connected to the IPC coordinator")
+        return self._writer
+
+    async def _read(self, reader: asyncio.StreamReader):
+        async for line in reader:
+            message = json.loads(line)
+            op = message.get("op")
+
+            if op == "query":
+                answer = asyncio.create_task(self._answer(message))
+                self._answers.add(answer)
+                answer.add_done_callback(self._answered)
+            elif op == "reply":
+                future = self._replies.pop(message["id"], None)
+                if future and not future.done():
+                    future.set_result(message.get("data"))
+            elif op == "broadcast":
+                for handler in self.broadcast_handlers:
+                    handler(message["name"], message.get("data"))
+
+    def _answered(self, task: asyncio.Task):
+        self._answers.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Answering an IPC query failed", exc_info=task.exception())
+
+    async def _answer(self, message: dict):
+        handler = self.query_handlers.get(message["name"])
+        data = await handler() if handler else None
+        # a query from before a reconnect is not answered, the coordinator has given up on it
+        with contextlib.suppress(ConnectionError):
+            await _write(self._require_connection(), {"op": "reply", "id": message["id"], "data": data})
+
+    async def _report_health(self):
+        while True:
+            if self.connected:
+                with contextlib.suppress(ConnectionError):
+                    await _write(self._writer, {"op": "health", "shards": self.health()})
+            await asyncio.sleep(self.heartbeat)
+
+    async def query(self, name: str, timeout: float = 10.0) -> List[Any]:
+        """Answers from every worker, including this one."""
+        writer = self._require_connection()
+        query_id = next(self._ids)
+        future = self._replies[query_id] = asyncio.get_running_loop().create_future()
+        try:
+            await _write(writer, {"op": "query", "id": query_id, "name": name})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._replies.pop(query_id, None)
+
+    async def broadcast(self, name: str, data: Any = None):
+        """Delivered to every worker, including this one."""
+        await _write(self._require_connection(), {"op": "broadcast", "name": name, "data": data})
@@ -0,0 +1,230 @@
+"""Listener latency, REST call and event loop metrics in the Prometheus text format.
+
+Nothing here is installed unless METRICS_PORT is set, the disabled bot runs
+the library's dispatch and HTTP code untouched.
+
+    modoco_listener_seconds{listener}            histogram, every Cog listener
+    modoco_listener_errors_total{listener}
+    modoco_callback_seconds{callback}            histogram, fast_ack callbacks and Paginator pages
+    modoco_callback_errors_total{callback}
+    modoco_interaction_ack_seconds{callback}     histogram, common/interaction.py fast_ack callbacks
+    modoco_interaction_side_effect_seconds{callback}
+    modoco_http_requests_total{method, route, status}
+    modoco_gateway_latency_seconds{shard}
+    modoco_event_loop_lag_seconds
+    modoco_sender_*, modoco_resolver_*           registered by main.py from the existing stats()
+"""
+import aiohttp
+import asyncio
+import bisect
+import discord
+import logging
+import math
+import re
+import statistics
+import time
+from aiohttp import web
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+log = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# snowflakes and webhook tokens make every URL unique, fold them back into route templates
+SNOWFLAKE = re.compile(r"/\d{15,21}(?=/|$)")
+INTERACTION_TOKEN = re.compile(r"^(/(?:interactions|webhooks)/\{id\})/[^/]+")
+
+
+def route_of(path: str) -> str:
+    path = path.split("/api/v10", 1)[-1]
+    path = SNOWFLAKE.sub("/{id}", path)
+    return INTERACTION_TOKEN.sub(r"\1/{token}", path)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class LatencyStats:
+    """The last `window` samples for the stats commands, kept with or without METRICS_PORT."""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        if not self.samples:
+            return {"count": self.count}
+
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg": statistics.fmean(samples),
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max": samples[-1],
+        }
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        self.values[labels] += amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [count per bucket + overflow, sum]
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Labels, seconds: float):
+        value = self.values.get(labels)
+        if value is None:
+            value = self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        value[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        value[1][0] += seconds
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {total[0]}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Metrics:
+    def __init__(self, loop_lag_interval: float = 1.0):
+        self.listener_seconds = Histogram("modoco_listener_seconds", "Cog listener run time.")
+        self.listener_errors = Counter("modoco_listener_errors_total", "Cog listener exceptions.")
+        self.callback_seconds = Histogram("modoco_callback_seconds", "UI item and modal callback run time.")
+        self.callback_errors = Counter("modoco_callback_errors_total", "UI item and modal callback exceptions.")
+        self.interaction_ack_seconds = Histogram("modoco_interaction_ack_seconds", "Interaction creation to acknowledgement.")
+        self.interaction_side_effect_seconds = Histogram("modoco_interaction_side_effect_seconds", "Acknowledgement to the end of the side effects.")
+        self.http_requests = Counter("modoco_http_requests_total", "Discord REST responses, including the 429s the library retries.")
+
+        self.loop_lag_interval = loop_lag_interval
+        self.loop_lag = 0.0
+        self.gauges: List[Callable[[], Dict[str, float]]] = []
+
+        self._bot: Optional[discord.Client] = None
+        self._tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Passed to the client as `http_trace`, counts every response of the shared REST session."""
+        async def on_request_end(session, context, params: aiohttp.TraceRequestEndParams):
+            self.http_requests.inc((("method", params.method), ("route", route_of(params.url.path)), ("status", str(params.response.status))))
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    async def _timed(self, histogram: Histogram, errors: Counter, labels: Labels, coro):
+        started_at = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            errors.inc(labels)
+            raise
+        finally:
+            histogram.observe(labels, time.perf_counter() - started_at)
+
+    def attach(self, bot: discord.Client):
+        self._bot = bot
+
+    def time_listener(self, name: str, coro) -> Awaitable:
+        """Called by the bot's _run_event around every Cog listener, see main.py."""
+        return self._timed(self.listener_seconds, self.listener_errors, (("listener", name),), coro)
+
+    def time_callback(self, name: str, coro) -> Awaitable:
+        """Called by fast_ack and the Paginator around their callbacks, nothing in discord.py is patched."""
+        return self._timed(self.callback_seconds, self.callback_errors, (("callback", name),), coro)
+
+    async def _measure_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.loop_lag_interval)
+            self.loop_lag = max(0.0, loop.time() - started_at - self.loop_lag_interval)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (
+            self.listener_seconds,
+            self.listener_errors,
+            self.callback_seconds,
+            self.callback_errors,
+            self.interaction_ack_seconds,
+            self.interaction_side_effect_seconds,
+            self.http_requests,
+        ):
+            lines.extend(metric.render())
+
+        lines.append("# TYPE modoco_gateway_latency_seconds gauge")
+        latencies = getattr(self._bot, "latencies", None) or [(self._bot.shard_id or 0, self._bot.latency)]
+        for shard_id, latency in latencies:
+            if not (math.isinf(latency) or math.isnan(latency)):
+                lines.append(f'modoco_gateway_latency_seconds{{shard="{shard_id}"}} {latency}')
+
+        lines.append("# TYPE modoco_event_loop_lag_seconds gauge")
+        lines.append(f"modoco_event_loop_lag_seconds {self.loop_lag}")
+
+        for gauge in self.gauges:
+            for name, value in gauge().items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self, host: str, port: int):
+        self._tasks.append(asyncio.create_task(self._measure_loop_lag()))
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        log.info("Serving metrics on http://%s:%s/metrics", host, port)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
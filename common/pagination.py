@@ -0,0 +1,41 @@
+import discord
+from typing import Awaitable, Callable
+
+
+class Paginator(discord.ui.View):
+    """Previous/next buttons over pages that are rendered only when shown."""
+
+    def __init__(self, owner_id: int, page_count: int, render: Callable[[int], Awaitable[discord.Embed]], timeout: float = 180.0):
+        super().__init__(timeout=timeout)
+        self.owner_id = owner_id
+        self.page_count = page_count
+        self.render = render
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        metrics = getattr(interaction.client, "metrics", None)
+        if metrics:
+            await metrics.time_callback("Paginator.show", self._show(interaction, page))
+        else:
+            await self._show(interaction, page)
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = max(0, min(page, self.page_count - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=await self.render(self.page), view=self)
+
+    @discord.ui.button(label="이전", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="다음", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
@@ -0,0 +1,138 @@
+import discord
+import hashlib
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Panel(NamedTuple):
+    key: str
+    embed: discord.Embed
+    view: discord.ui.View
+
+
+# panel key -> (message id, content hash)
+PanelState = Dict[str, Tuple[int, str]]
+
+
+def _embed_signature(embed: Optional[discord.Embed]):
+    if embed is None:
+        return None
+
+    return {
+        "title": embed.title,
+        "description": embed.description,
+        "color": embed.color.value if embed.color else None,
+        "footer": embed.footer.text,
+        "fields": [(field.name, field.value, field.inline) for field in embed.fields],
+    }
+
+
+def _button_signature(button) -> Tuple:
+    return (
+        button.custom_id,
+        button.label,
+        str(button.emoji) if button.emoji else None,
+        button.style.value,
+    )
+
+
+def _hash(signature) -> str:
+    return hashlib.sha256(json.dumps(signature, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+
+def panel_hash(panel: Panel) -> str:
+    return _hash({
+        "embed": _embed_signature(panel.embed),
+        "buttons": [_button_signature(item) for item in panel.view.children],
+    })
+
+
+def message_hash(message: discord.Message) -> str:
+    buttons = [
+        _button_signature(component)
+        for row in message.components
+        for component in getattr(row, "children", [])
+    ]
+    return _hash({
+        "embed": _embed_signature(message.embeds[0] if message.embeds else None),
+        "buttons": buttons,
+    })
+
+
+def _message_custom_ids(message: discord.Message) -> set:
+    return {
+        component.custom_id
+        for row in message.components
+        for component in getattr(row, "children", [])
+        if getattr(component, "custom_id", None)
+    }
+
+
+def _panel_custom_ids(panel: Panel) -> set:
+    return {item.custom_id for item in panel.view.children if getattr(item, "custom_id", None)}
+
+
+async def _scan_panels(channel: discord.TextChannel, panels: List[Panel], history_limit: int) -> Tuple[Dict[str, discord.Message], List[discord.Message]]:
+    matched: Dict[str, discord.Message] = {}
+    stale: List[discord.Message] = []
+
+    async for message in channel.history(limit=history_limit, oldest_first=True):
+        if message.author.id != channel.guild.me.id:
+            continue
+
+        custom_ids = _message_custom_ids(message)
+        panel = next((panel for panel in panels if panel.key not in matched and custom_ids & _panel_custom_ids(panel)), None)
+        if panel is None:
+            stale.append(message)
+        else:
+            matched[panel.key] = message
+
+    return matched, stale
+
+
+async def reconcile_panels(channel: discord.TextChannel, panels: List[Panel], known: Optional[PanelState] = None, history_limit: int = 50) -> PanelState:
+    """Bring the panel messages in `channel` up to date, editing only panels whose content changed.
+
+    `known` is the state returned by the previous call, or loaded from the state store after a
+    restart. When every panel is known, no history is fetched and an unchanged panel costs no
+    API call at all.
+    """
+    known = dict(known or {})
+    # Anything posted or deleted at the bottom of the channel since makes the known state suspect
+    if known and channel.last_message_id and channel.last_message_id != max(message_id for message_id, _ in known.values()):
+        known = {}
+    hashes = {panel.key: panel_hash(panel) for panel in panels}
+
+    if not all(panel.key in known for panel in panels):
+        matched, stale = await _scan_panels(channel, panels, history_limit)
+
+        # Panels must keep their order, otherwise fall back to reposting everything
+        ordered = [matched[panel.key].id for panel in panels if panel.key in matched]
+        if len(matched) != len(panels) or ordered != sorted(ordered):
+            for message in [*matched.values(), *stale]:
+                await message.delete()
+
+            known = {}
+            for panel in panels:
+                message = await channel.send(embed=panel.embed, view=panel.view)
+                known[panel.key] = (message.id, hashes[panel.key])
+            return known
+
+        for message in stale:
+            await message.delete()
+
+        known = {key: (message.id, message_hash(message)) for key, message in matched.items()}
+
+    for panel in panels:
+        message_id, current_hash = known[panel.key]
+        if current_hash == hashes[panel.key]:
+            continue
+
+        try:
+            await channel.get_partial_message(message_id).edit(embed=panel.embed, view=panel.view)
+        except discord.NotFound:
+            # The panel was deleted behind our back, rediscover from the channel
+            return await reconcile_panels(channel, panels, None, history_limit)
+        known[panel.key] = (message_id, hashes[panel.key])
+
+    return known
@@ -0,0 +1,74 @@
+import discord
+from typing import Dict, Iterable, Set
+
+
+class RoleCounter:
+    """Members per tracked role, built once from the member cache and then kept current per event.
+
+    The holders of each role are kept as sets, so applying the same change twice
+    (the button callback and the member update that follows it) counts once.
+    """
+
+    def __init__(self, role_ids: Iterable[int]):
+        self.role_ids = frozenset(role_ids)
+        # guild id -> role id -> ids of the members holding it
+        self.holders: Dict[int, Dict[int, Set[int]]] = {}
+
+        self.updates = 0
+
+    def build(self, guild: discord.Guild):
+        """One pass over the member cache, the guild must be chunked."""
+        holders: Dict[int, Set[int]] = {role_id: set() for role_id in self.role_ids}
+        for member in guild.members:
+            for role_id in self.role_ids.intersection(role.id for role in member.roles):
+                holders[role_id].add(member.id)
+        self.holders[guild.id] = holders
+
+    def is_tracked(self, guild_id: int) -> bool:
+        return guild_id in self.holders
+
+    def update(self, guild_id: int, user_id: int, role_ids: Iterable[int]) -> bool:
+        """Set the tracked roles of a member, returns whether a count changed."""
+        holders = self.holders.get(guild_id)
+        if holders is None:
+            return False
+
+        held = self.role_ids.intersection(role_ids)
+        changed = False
+        for role_id, members in holders.items():
+            if role_id in held:
+                if user_id not in members:
+                    members.add(user_id)
+                    changed = True
+            elif user_id in members:
+                members.discard(user_id)
+                changed = True
+
+        self.updates += changed
+        return changed
+
+    def apply_change(self, guild_id: int, user_id: int, before: Set[int], after: Set[int]) -> bool:
+        """Apply a member update, only the tracked roles that were added or removed are touched."""
+        holders = self.holders.get(guild_id)
+        if holders is None:
+            return False
+
+        changed = False
+        for role_id in self.role_ids.intersection(before ^ after):
+            members = holders[role_id]
+            if role_id in after:
+                if user_id not in members:
+                    members.add(user_id)
+                    changed = True
+            elif user_id in members:
+                members.discard(user_id)
+                changed = True
+
+        self.updates += changed
+        return changed
+
+    def remove(self, guild_id: int, user_id: int) -> bool:
+        return self.update(guild_id, user_id, ())
+
+    def counts(self, guild_id: int) -> Dict[int, int]:
+        return {role_id: len(members) for role_id, members in self.holders.get(guild_id, {}).items()}
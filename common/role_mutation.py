@@ -0,0 +1,127 @@
+import asyncio
+import discord
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+log = logging.getLogger(__name__)
+
+
+class _RoleMutation:
+    def __init__(self):
+        self.add: Set[int] = set()
+        self.remove: Set[int] = set()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def merge(self, add: Iterable[int], remove: Iterable[int]):
+        # The latest intent for a role wins
+        for role_id in remove:
+            self.add.discard(role_id)
+            self.remove.add(role_id)
+        for role_id in add:
+            self.remove.discard(role_id)
+            self.add.add(role_id)
+
+    def apply_to(self, role_ids: Set[int]) -> Set[int]:
+        return (role_ids - self.remove) | self.add
+
+
+class RoleMutationQueue:
+    """Per-member queue that coalesces role add/remove intents into a single member.edit(roles=...)."""
+
+    def __init__(self, window: float = 0.5):
+        self.window = window
+
+        self._pending: Dict[Tuple[int, int], _RoleMutation] = {}
+        self._applying: Dict[Tuple[int, int], _RoleMutation] = {}
+        self._locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+        # roles returned by the last edit, the base of the next batch while more clicks are queued.
+        # Without the member cache the interaction member of a click made during that edit is stale.
+        self._applied: Dict[Tuple[int, int], List[discord.Role]] = {}
+        # the loop only keeps weak references to tasks, a pending flush must not be collected
+        self._flushes: Set[asyncio.Task] = set()
+
+        self.submitted = 0
+        self.applied = 0
+
+    def projected_role_ids(self, member: discord.Member) -> Set[int]:
+        """Role ids the member will hold once every queued mutation is applied."""
+        key = (member.guild.id, member.id)
+        role_ids = {role.id for role in self._current_roles(key, member)}
+        for mutations in (self._applying, self._pending):
+            mutation = mutations.get(key)
+            if mutation is not None:
+                role_ids = mutation.apply_to(role_ids)
+        return role_ids
+
+    def _current_roles(self, key: Tuple[int, int], member: discord.Member) -> List[discord.Role]:
+        applied = self._applied.get(key)
+        if applied is not None:
+            return applied
+        # Refresh the member, the gateway may have updated it since the click
+        return (member.guild.get_member(member.id) or member).roles
+
+    def submit(self, member: discord.Member, add: Iterable[int] = (), remove: Iterable[int] = ()) -> asyncio.Future:
+        """Queue a mutation, the returned future resolves to the member's final roles."""
+        key = (member.guild.id, member.id)
+        self.submitted += 1
+
+        mutation = self._pending.get(key)
+        if mutation is None:
+            mutation = self._pending[key] = _RoleMutation()
+            task = asyncio.create_task(self._flush(key, member))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushed)
+
+        mutation.merge(add, remove)
+        # Every click awaits the same batch, one cancelled caller must not cancel it for the others
+        return asyncio.shield(mutation.future)
+
+    def _flushed(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Role mutation flush failed", exc_info=task.exception())
+
+    async def _flush(self, key: Tuple[int, int], member: discord.Member):
+        await asyncio.sleep(self.window)
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            mutation = self._pending.pop(key)
+            self._applying[key] = mutation
+            try:
+                roles = await self._apply(key, member, mutation)
+            except Exception as e:
+                self._applied.pop(key, None)
+                mutation.future.set_exception(e)
+                # Nobody may be waiting on the future anymore, silence "never retrieved"
+                mutation.future.exception()
+            else:
+                self._applied[key] = roles
+                mutation.future.set_result(roles)
+            finally:
+                del self._applying[key]
+
+        if key not in self._pending and not lock.locked():
+            self._locks.pop(key, None)
+            self._applied.pop(key, None)
+
+    async def _apply(self, key: Tuple[int, int], member: discord.Member, mutation: _RoleMutation) -> List[discord.Role]:
+        current_roles = self._current_roles(key, member)
+        current_ids = {role.id for role in current_roles if not role.is_default()}
+        target_ids = mutation.apply_to(current_ids)
+        if target_ids == current_ids:
+            return current_roles
+
+        roles: List[discord.Role] = []
+        for role_id in target_ids:
+            role = member.guild.get_role(role_id)
+            if role is not None:
+                roles.append(role)
+
+        self.applied += 1
+        updated: Optional[discord.Member] = await member.edit(roles=roles)
+        if updated is not None:
+            return updated.roles
+
+        return [member.guild.default_role, *sorted(roles)]
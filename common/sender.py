@@ -0,0 +1,267 @@
+import asyncio
+import base64
+import discord
+import enum
+import heapq
+import io
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+log = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    INTERACTION = 0
+    ERROR = 1
+    DEFAULT = 2
+    LOG = 3
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "channel_id", "factory", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, priority: Priority, seq: int, channel_id: int, factory: Optional[Callable[[], Awaitable[Any]]], kwargs: Optional[dict]):
+        self.priority = priority
+        self.seq = seq
+        self.channel_id = channel_id
+        self.factory = factory
+        self.kwargs = kwargs
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def mergeable(self) -> bool:
+        # Only plain embed-only sends can be folded into one message
+        return self.kwargs is not None and set(self.kwargs) <= {"embeds"} and len(self.kwargs["embeds"]) < 10
+
+
+# send() arguments that survive a restart through the shutdown journal
+JOURNAL_KWARGS = {"content", "embeds", "file"}
+
+
+def _dump_kwargs(kwargs: dict) -> dict:
+    entry = {}
+    if "content" in kwargs:
+        entry["content"] = kwargs["content"]
+    if "embeds" in kwargs:
+        entry["embeds"] = [embed.to_dict() for embed in kwargs["embeds"]]
+    if "file" in kwargs:
+        file: discord.File = kwargs["file"]
+        file.reset()
+        entry["files"] = [[file.filename, base64.b64encode(file.fp.read()).decode()]]
+    return entry
+
+
+def _load_kwargs(entry: dict) -> dict:
+    kwargs = {}
+    if "content" in entry:
+        kwargs["content"] = entry["content"]
+    if "embeds" in entry:
+        kwargs["embeds"] = [discord.Embed.from_dict(embed) for embed in entry["embeds"]]
+    if "files" in entry:
+        kwargs["files"] = [discord.File(io.BytesIO(base64.b64decode(data)), filename=filename) for filename, data in entry["files"]]
+    return kwargs
+
+
+class _WaitStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, waited: float):
+        self.count += 1
+        self.total += waited
+        self.max = max(self.max, waited)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class MessageScheduler:
+    """Prioritized outbound message queue with one worker per channel.
+
+    Cogs submit sends instead of awaiting them, so listeners never block on
+    rate-limit backoff. Low-priority traffic is merged or dropped when a
+    channel queue is full.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_channel_queue: int = 50, max_total_queue: int = 1000):
+        self.max_channel_queue = max_channel_queue
+        self.max_total_queue = max_total_queue
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues: Dict[int, List[_Job]] = {}
+        self._channels: Dict[int, discord.abc.Messageable] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._seq = itertools.count()
+        self._size = 0
+
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+        self.dropped = 0
+        self.wait_stats: Dict[Priority, _WaitStats] = {priority: _WaitStats() for priority in Priority}
+
+    def send(self, channel: discord.abc.Messageable, *, priority: Priority = Priority.DEFAULT, **kwargs) -> asyncio.Future:
+        """Queue `channel.send(**kwargs)`, the returned future resolves to the sent message."""
+        if "embed" in kwargs:
+            kwargs["embeds"] = [kwargs.pop("embed")]
+
+        self._channels[channel.id] = channel
+        return self._enqueue(channel.id, priority, None, kwargs)
+
+    def submit(self, channel_id: int, factory: Callable[[], Awaitable[Any]], *, priority: Priority = Priority.DEFAULT) -> asyncio.Future:
+        """Queue an arbitrary channel-bound request such as a message edit."""
+        return self._enqueue(channel_id, priority, factory, None)
+
+    def _enqueue(self, channel_id: int, priority: Priority, factory, kwargs) -> asyncio.Future:
+        queue = self._queues.setdefault(channel_id, [])
+        job = _Job(priority, next(self._seq), channel_id, factory, kwargs)
+
+        if priority >= Priority.LOG:
+            merged = self._merge(queue, job)
+            if merged is not None:
+                return merged
+
+            if len(queue) >= self.max_channel_queue or self._size >= self.max_total_queue:
+                if not self._drop_lowest(queue, job):
+                    self.dropped += 1
+                    job.future.set_result(None)
+                    if not queue and channel_id not in self._workers:
+                        # a channel whose first job was dropped must not leave an empty queue behind
+                        self._queues.pop(channel_id, None)
+                        self._channels.pop(channel_id, None)
+                    return job.future
+
+        heapq.heappush(queue, job)
+        self._size += 1
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._work(channel_id))
+
+        return job.future
+
+    def _merge(self, queue: List[_Job], job: _Job) -> Optional[asyncio.Future]:
+        if not job.mergeable:
+            return None
+
+        for queued in queue:
+            if queued.priority == job.priority and queued.mergeable and len(queued.kwargs["embeds"]) + len(job.kwargs["embeds"]) <= 10:
+                queued.kwargs["embeds"].extend(job.kwargs["embeds"])
+                self.merged += 1
+                return queued.future
+
+        return None
+
+    def _drop_lowest(self, queue: List[_Job], job: _Job) -> bool:
+        """Make room for `job` by dropping the newest queued job of a lower priority."""
+        victims = [queued for queued in queue if queued.priority > job.priority]
+        if not victims:
+            return False
+
+        victim = max(victims)
+        queue.remove(victim)
+        heapq.heapify(queue)
+        self._size -= 1
+        self.dropped += 1
+        victim.future.set_result(None)
+        return True
+
+    async def _work(self, channel_id: int):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                job = heapq.heappop(queue)
+                self._size -= 1
+
+                async with self._semaphore:
+                    self.wait_stats[job.priority].record(time.monotonic() - job.enqueued_at)
+                    await self._run(job)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                self._queues.pop(channel_id, None)
+                self._channels.pop(channel_id, None)
+
+    async def _run(self, job: _Job):
+        try:
+            if job.factory is not None:
+                result = await job.factory()
+            else:
+                result = await self._channels[job.channel_id].send(**job.kwargs)
+        except discord.NotFound:
+            # The channel is gone, e.g. an auto-created voice channel was deleted
+            log.debug("Dropped message for missing channel %s", job.channel_id)
+            result = None
+        except Exception as e:
+            self.failed += 1
+            log.exception("Failed to deliver message to channel %s", job.channel_id)
+            if not job.future.done():
+                job.future.set_exception(e)
+                # Most callers never await the future, silence "never retrieved"
+                job.future.exception()
+            return
+        else:
+            self.sent += 1
+
+        # A caller awaiting the future directly cancels it when the caller itself is cancelled
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def send_entry(self, channel: discord.abc.Messageable, entry: dict) -> asyncio.Future:
+        """Queue a send read back from the shutdown journal, see `pending_sends`."""
+        return self.send(channel, priority=Priority(entry["priority"]), **_load_kwargs(entry))
+
+    def pending_sends(self) -> List[dict]:
+        """Queued sends that have not started, as JSON entries for the shutdown journal.
+
+        Requests queued with `submit`, such as edits, are closures and are not included.
+        """
+        entries = []
+        for channel_id, queue in self._queues.items():
+            guild = getattr(self._channels.get(channel_id), "guild", None)
+            if guild is None:
+                continue
+            for job in sorted(queue):
+                if job.kwargs is not None and set(job.kwargs) <= JOURNAL_KWARGS:
+                    entries.append({"channel_id": channel_id, "guild_id": guild.id, "priority": int(job.priority), **_dump_kwargs(job.kwargs)})
+        return entries
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until every queued job is delivered, returns False when `timeout` ran out first."""
+        deadline = time.monotonic() + timeout
+        while self._workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.wait(list(self._workers.values()), timeout=remaining)
+        return True
+
+    async def close(self):
+        for worker in list(self._workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._size,
+            "channels": {channel_id: len(queue) for channel_id, queue in self._queues.items() if queue},
+            "sent": self.sent,
+            "failed": self.failed,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "wait": {priority.name.lower(): stats.to_dict() for priority, stats in self.wait_stats.items()},
+        }
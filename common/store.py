@@ -0,0 +1,373 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+log = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS voice_channels (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    owner_id INTEGER,
+    created_at REAL NOT NULL,
+    pooled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS voice_channels_guild ON voice_channels (guild_id);
+
+CREATE TABLE IF NOT EXISTS panel_messages (
+    channel_id INTEGER NOT NULL,
+    panel_key TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (channel_id, panel_key)
+);
+
+CREATE TABLE IF NOT EXISTS voice_daily (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    sessions INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS voice_totals (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    sessions INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS voice_totals_leaderboard ON voice_totals (guild_id, seconds DESC);
+
+CREATE TABLE IF NOT EXISTS introductions (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    short_description TEXT NOT NULL,
+    github_url TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (guild_id, user_id)
+);
+
+-- work left unfinished by the last shutdown, replayed and removed on the next start
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_kind ON journal (kind, guild_id);
+
+-- external content index over introductions, kept in sync by the triggers below
+CREATE VIRTUAL TABLE IF NOT EXISTS introductions_fts USING fts5(
+    name, short_description, github_url,
+    content='introductions', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS introductions_ai AFTER INSERT ON introductions BEGIN
+    INSERT INTO introductions_fts (rowid, name, short_description, github_url)
+    VALUES (new.id, new.name, new.short_description, new.github_url);
+END;
+CREATE TRIGGER IF NOT EXISTS introductions_ad AFTER DELETE ON introductions BEGIN
+    INSERT INTO introductions_fts (introductions_fts, rowid, name, short_description, github_url)
+    VALUES ('delete', old.id, old.name, old.short_description, old.github_url);
+END;
+CREATE TRIGGER IF NOT EXISTS introductions_au AFTER UPDATE ON introductions BEGIN
+    INSERT INTO introductions_fts (introductions_fts, rowid, name, short_description, github_url)
+    VALUES ('delete', old.id, old.name, old.short_description, old.github_url);
+    INSERT INTO introductions_fts (rowid, name, short_description, github_url)
+    VALUES (new.id, new.name, new.short_description, new.github_url);
+END;
+"""
+
+
+class VoiceChannelRecord(NamedTuple):
+    channel_id: int
+    guild_id: int
+    owner_id: Optional[int]
+    created_at: float
+    pooled: bool
+
+
+class VoiceTotal(NamedTuple):
+    user_id: int
+    seconds: float
+    sessions: int
+
+
+class Introduction(NamedTuple):
+    user_id: int
+    name: str
+    short_description: str
+    github_url: str
+    updated_at: float
+    # short_description with the matched terms in bold, empty outside of a search
+    snippet: str = ""
+
+
+# what the unicode61 tokenizer keeps of a word, everything else separates tokens
+FTS_TOKEN = re.compile(r"[^\W_]+")
+
+
+def fts_query(text: str) -> str:
+    """Every word of `text` as a quoted prefix term, so user input never reaches the FTS5 syntax.
+
+    Only letters and digits are kept, quotes, operators and control characters
+    such as NUL (which ends the query string inside FTS5) never get through.
+    """
+    return " ".join(f'"{token}"*' for token in FTS_TOKEN.findall(text))
+
+
+class StateStore:
+    """SQLite state in WAL mode behind an in-memory read-through cache.
+
+    Every database call runs on one dedicated thread. Writes are queued and
+    committed in batches by a writer task, so callers never wait on disk.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, max_batch: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-store")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._writes: List[Tuple[str, tuple]] = []
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+        self._voice_channels: Dict[int, VoiceChannelRecord] = {}
+        self._loaded_guilds: set = set()
+        self._panels: Dict[int, Dict[str, Tuple[int, str]]] = {}
+
+        self.batches = 0
+        self.written = 0
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run `fn(connection)` on the database thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, self._connection)
+
+    async def open(self):
+        def connect(_):
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            return connection
+
+        self._connection = await self.run(connect)
+        self._panels = await self.run(self._load_panels)
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        if self._writer:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+        await self.flush()
+        if self._connection:
+            await self.run(lambda connection: connection.close())
+        self._executor.shutdown(wait=True)
+
+    def write(self, sql: str, params: tuple = ()):
+        self._writes.append((sql, params))
+        if len(self._writes) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _write_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                log.exception("Failed to write state batch")
+
+    async def flush(self):
+        if not self._writes or self._connection is None:
+            return
+
+        batch, self._writes = self._writes, []
+
+        def commit(connection: sqlite3.Connection):
+            with connection:
+                for sql, params in batch:
+                    connection.execute(sql, params)
+
+        await self.run(commit)
+        self.batches += 1
+        self.written += len(batch)
+
+    # voice channels
+
+    async def load_voice_channels(self, guild_id: int) -> Dict[int, VoiceChannelRecord]:
+        """Every voice channel the bot created in the guild, one indexed query after a restart."""
+        if guild_id not in self._loaded_guilds:
+            rows = await self.run(lambda connection: connection.execute(
+                "SELECT channel_id, guild_id, owner_id, created_at, pooled FROM voice_channels WHERE guild_id = ?",
+                (guild_id,),
+            ).fetchall())
+            for row in rows:
+                record = VoiceChannelRecord(row[0], row[1], row[2], row[3], bool(row[4]))
+                self._voice_channels.setdefault(record.channel_id, record)
+            self._loaded_guilds.add(guild_id)
+
+        return {channel_id: record for channel_id, record in self._voice_channels.items() if record.guild_id == guild_id}
+
+    def voice_channel(self, channel_id: int) -> Optional[VoiceChannelRecord]:
+        return self._voice_channels.get(channel_id)
+
+    def save_voice_channel(self, channel_id: int, guild_id: int, owner_id: Optional[int], pooled: bool = False):
+        previous = self._voice_channels.get(channel_id)
+        created_at = previous.created_at if previous else time.time()
+        self._voice_channels[channel_id] = VoiceChannelRecord(channel_id, guild_id, owner_id, created_at, pooled)
+        self.write(
+            "INSERT INTO voice_channels (channel_id, guild_id, owner_id, created_at, pooled) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (channel_id) DO UPDATE SET owner_id = excluded.owner_id, pooled = excluded.pooled",
+            (channel_id, guild_id, owner_id, created_at, int(pooled)),
+        )
+
+    def delete_voice_channel(self, channel_id: int):
+        self._voice_channels.pop(channel_id, None)
+        self.write("DELETE FROM voice_channels WHERE channel_id = ?", (channel_id,))
+
+    # panel messages
+
+    @staticmethod
+    def _load_panels(connection: sqlite3.Connection) -> Dict[int, Dict[str, Tuple[int, str]]]:
+        panels: Dict[int, Dict[str, Tuple[int, str]]] = {}
+        for channel_id, panel_key, message_id, content_hash in connection.execute(
+            "SELECT channel_id, panel_key, message_id, content_hash FROM panel_messages"
+        ):
+            panels.setdefault(channel_id, {})[panel_key] = (message_id, content_hash)
+        return panels
+
+    def panel_state(self, channel_id: int) -> Dict[str, Tuple[int, str]]:
+        return dict(self._panels.get(channel_id, {}))
+
+    def save_panel_state(self, channel_id: int, state: Dict[str, Tuple[int, str]]):
+        if self._panels.get(channel_id) == state:
+            return
+
+        self._panels[channel_id] = dict(state)
+        self.write("DELETE FROM panel_messages WHERE channel_id = ?", (channel_id,))
+        for panel_key, (message_id, content_hash) in state.items():
+            self.write(
+                "INSERT INTO panel_messages (channel_id, panel_key, message_id, content_hash) VALUES (?, ?, ?, ?)",
+                (channel_id, panel_key, message_id, content_hash),
+            )
+
+    # voice time
+
+    def add_voice_time(self, guild_id: int, user_id: int, day: str, seconds: float, sessions: int):
+        """Add to the day and the running total of a member, both pre-aggregated for the stats command."""
+        self.write(
+            "INSERT INTO voice_daily (guild_id, user_id, day, seconds, sessions) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, user_id, day) DO UPDATE SET seconds = seconds + excluded.seconds, sessions = sessions + excluded.sessions",
+            (guild_id, user_id, day, seconds, sessions),
+        )
+        self.write(
+            "INSERT INTO voice_totals (guild_id, user_id, seconds, sessions) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, user_id) DO UPDATE SET seconds = seconds + excluded.seconds, sessions = sessions + excluded.sessions",
+            (guild_id, user_id, seconds, sessions),
+        )
+
+    async def voice_total(self, guild_id: int, user_id: int, since: Optional[str] = None) -> VoiceTotal:
+        """All-time total of a member, or the sum of the days from `since` (YYYY-MM-DD) on."""
+        if since is None:
+            sql = "SELECT seconds, sessions FROM voice_totals WHERE guild_id = ? AND user_id = ?"
+            params: tuple = (guild_id, user_id)
+        else:
+            sql = "SELECT SUM(seconds), SUM(sessions) FROM voice_daily WHERE guild_id = ? AND user_id = ? AND day >= ?"
+            params = (guild_id, user_id, since)
+
+        row = await self.run(lambda connection: connection.execute(sql, params).fetchone())
+        return VoiceTotal(user_id, (row and row[0]) or 0.0, (row and row[1]) or 0)
+
+    async def voice_leaderboard(self, guild_id: int, limit: int = 10) -> List[VoiceTotal]:
+        rows = await self.run(lambda connection: connection.execute(
+            "SELECT user_id, seconds, sessions FROM voice_totals WHERE guild_id = ? ORDER BY seconds DESC LIMIT ?",
+            (guild_id, limit),
+        ).fetchall())
+        return [VoiceTotal(*row) for row in rows]
+
+    # introductions
+
+    def save_introduction(self, guild_id: int, user_id: int, name: str, short_description: str, github_url: str):
+        """Replace the member's previous introduction, the search index follows through the triggers."""
+        self.write(
+            "INSERT INTO introductions (guild_id, user_id, name, short_description, github_url, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, user_id) DO UPDATE SET name = excluded.name, short_description = excluded.short_description, "
+            "github_url = excluded.github_url, updated_at = excluded.updated_at",
+            (guild_id, user_id, name, short_description, github_url, time.time()),
+        )
+
+    async def introduction(self, guild_id: int, user_id: int) -> Optional[Introduction]:
+        await self.flush()
+        row = await self.run(lambda connection: connection.execute(
+            "SELECT user_id, name, short_description, github_url, updated_at FROM introductions WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id),
+        ).fetchone())
+        return Introduction(*row) if row else None
+
+    async def search_introductions(self, guild_id: int, text: str, limit: int = 5, offset: int = 0) -> Tuple[List[Introduction], int]:
+        """One page of introductions matching every word of `text`, best match first, and the total match count."""
+        query = fts_query(text)
+        if not query:
+            return [], 0
+
+        def search(connection: sqlite3.Connection):
+            rows = connection.execute(
+                "SELECT i.user_id, i.name, i.short_description, i.github_url, i.updated_at, "
+                "snippet(introductions_fts, 1, '**', '**', '…', 16) "
+                "FROM introductions_fts JOIN introductions i ON i.id = introductions_fts.rowid "
+                "WHERE introductions_fts MATCH ? AND i.guild_id = ? ORDER BY rank LIMIT ? OFFSET ?",
+                (query, guild_id, limit, offset),
+            ).fetchall()
+            total = connection.execute(
+                "SELECT COUNT(*) FROM introductions_fts JOIN introductions i ON i.id = introductions_fts.rowid "
+                "WHERE introductions_fts MATCH ? AND i.guild_id = ?",
+                (query, guild_id),
+            ).fetchone()[0]
+            return rows, total
+
+        await self.flush()
+        rows, total = await self.run(search)
+        return [Introduction(*row) for row in rows], total
+
+    # shutdown journal
+
+    def journal(self, kind: str, guild_id: int, payload: dict):
+        self.write(
+            "INSERT INTO journal (kind, guild_id, payload, created_at) VALUES (?, ?, ?, ?)",
+            (kind, guild_id, json.dumps(payload), time.time()),
+        )
+
+    async def take_journal(self, kind: str, guild_ids: Iterable[int]) -> List[dict]:
+        """Remove and return the journaled entries of `kind` for `guild_ids`, oldest first."""
+        guild_ids = list(guild_ids)
+        if not guild_ids:
+            return []
+
+        def take(connection: sqlite3.Connection) -> List[dict]:
+            placeholders = ", ".join("?" * len(guild_ids))
+            with connection:
+                rows = connection.execute(
+                    f"SELECT id, payload FROM journal WHERE kind = ? AND guild_id IN ({placeholders}) ORDER BY id",
+                    (kind, *guild_ids),
+                ).fetchall()
+                connection.executemany("DELETE FROM journal WHERE id = ?", [(row_id,) for row_id, _ in rows])
+            return [json.loads(payload) for _, payload in rows]
+
+        return await self.run(take)
@@ -0,0 +1,205 @@
+"""JSON logs written off the event loop, with the guild, channel and member of the event.
+
+    setup_logging(const.LOG_PATH, const.LOG_LEVEL)
+
+The root logger only gets a QueueHandler, formatting and file I/O happen on
+the QueueListener's thread. The sinks behind it:
+
+    rotating file    every record as one JSON object per line, always
+    stderr           the same records as plain text
+    DiscordSink      ERROR and above, handed back to the event loop for the
+                     error logging channel, best effort and dropped while
+                     nothing is attached, see Cogs/error_handler.py
+
+Every record carries the correlation fields of the listener or interaction
+that logged it, taken from `bind_event` or passed with `extra=`:
+
+    guild_id, channel_id, member_id, event, latency (seconds since the event started)
+"""
+import asyncio
+import contextvars
+import datetime
+import discord
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional
+
+
+CORRELATION_FIELDS = ("guild_id", "channel_id", "member_id", "event", "latency")
+
+
+class EventContext(NamedTuple):
+    event: str
+    guild_id: Optional[int]
+    channel_id: Optional[int]
+    member_id: Optional[int]
+    started_at: float
+
+
+event_context: contextvars.ContextVar[Optional[EventContext]] = contextvars.ContextVar("event_context", default=None)
+
+
+def _ids(obj: Any) -> Dict[str, int]:
+    if isinstance(obj, discord.Interaction):
+        return {"guild_id": obj.guild_id, "channel_id": obj.channel_id, "member_id": obj.user.id}
+    if isinstance(obj, discord.Member):
+        return {"guild_id": obj.guild.id, "member_id": obj.id}
+    if isinstance(obj, discord.Message):
+        return {"guild_id": obj.guild and obj.guild.id, "channel_id": obj.channel.id, "member_id": obj.author.id}
+    if isinstance(obj, (discord.abc.GuildChannel, discord.Thread)):
+        return {"guild_id": obj.guild.id, "channel_id": obj.id}
+    if isinstance(obj, discord.VoiceState) and obj.channel:
+        return {"guild_id": obj.channel.guild.id, "channel_id": obj.channel.id}
+    if isinstance(obj, discord.Guild):
+        return {"guild_id": obj.id}
+    if isinstance(obj, discord.RawMemberRemoveEvent):
+        return {"guild_id": obj.guild_id, "member_id": obj.user.id}
+    return {}
+
+
+def bind_event(event: str, args: Iterable[Any] = ()) -> contextvars.Token:
+    """Set the correlation fields for the current task, the first argument that has an id wins."""
+    ids: Dict[str, int] = {}
+    for arg in args:
+        for name, value in _ids(arg).items():
+            if value is not None:
+                ids.setdefault(name, value)
+    return event_context.set(EventContext(event, ids.get("guild_id"), ids.get("channel_id"), ids.get("member_id"), time.perf_counter()))
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound event onto the record, runs on the logging task before the record is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = event_context.get()
+        if context is not None:
+            for name in ("guild_id", "channel_id", "member_id", "event"):
+                if getattr(record, name, None) is None:
+                    setattr(record, name, getattr(context, name))
+            if getattr(record, "latency", None) is None:
+                record.latency = round(time.perf_counter() - context.started_at, 6)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, static: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        # added to every record, e.g. the shard worker
+        self.static = static or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **self.static,
+        }
+        for name in CORRELATION_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in this process, so unlike the stock prepare() the record keeps
+        # its args and exc_info for the sinks, only the message is rendered on the caller's side
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class DiscordSink(logging.Handler):
+    """Hands records to a callback on the event loop, drops them while none is attached.
+
+    The callback must not block and must not log at ERROR itself for records it
+    fails to deliver, or every failure produces the next one.
+    """
+
+    def __init__(self, level: int = logging.ERROR):
+        super().__init__(level)
+        self._target: Optional[tuple] = None
+
+        self.dropped = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop, deliver: Callable[[logging.LogRecord], None]):
+        self._target = (loop, deliver)
+
+    def detach(self):
+        self._target = None
+
+    def emit(self, record: logging.LogRecord):
+        # already reported by whoever logged it
+        if getattr(record, "reported", False):
+            return
+        target = self._target
+        if target is None:
+            self.dropped += 1
+            return
+
+        loop, deliver = target
+        try:
+            loop.call_soon_threadsafe(deliver, record)
+        except RuntimeError:
+            # the loop is closed, the file sink still has the record
+            self.dropped += 1
+
+
+class LogPipeline:
+    def __init__(self, listener: logging.handlers.QueueListener, handler: logging.Handler, discord_sink: DiscordSink):
+        self.listener = listener
+        self.handler = handler
+        self.discord = discord_sink
+
+    def stop(self):
+        """Flush the queue and detach from the root logger."""
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+
+
+_pipeline: Optional[LogPipeline] = None
+
+
+def get_pipeline() -> Optional[LogPipeline]:
+    return _pipeline
+
+
+def setup_logging(path: str, level: str = "INFO", max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5, prefix: str = "", **static) -> LogPipeline:
+    """Route every logger through the queue, call once per process before the bot starts."""
+    global _pipeline
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter(static))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(f"%(asctime)s {prefix}%(levelname)s %(name)s: %(message)s"))
+    discord_sink = DiscordSink()
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = LocalQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, discord_sink, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener.start()
+    _pipeline = LogPipeline(listener, handler, discord_sink)
+    return _pipeline
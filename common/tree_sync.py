@@ -0,0 +1,44 @@
+import discord
+import hashlib
+import json
+import os
+import tempfile
+from discord import app_commands
+
+
+def tree_hash(tree: app_commands.CommandTree) -> str:
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def _load_hashes(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+async def sync_if_changed(client: discord.Client, path: str, force: bool = False) -> bool:
+    """Sync the global command tree only when it differs from the last synced one.
+
+    The hash is stored per application id in `path`, returns whether a sync happened.
+    """
+    key = str(client.application_id)
+    current = tree_hash(client.tree)
+
+    hashes = _load_hashes(path)
+    if not force and hashes.get(key) == current:
+        return False
+
+    await client.tree.sync()
+
+    hashes[key] = current
+    # a temp file of its own, another process may be writing the hashes at the same time
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path) or ".", prefix=os.path.basename(path), suffix=".tmp", delete=False) as file:
+        json.dump(hashes, file)
+    os.replace(file.name, path)
+    return True
@@ -0,0 +1,201 @@
+import asyncio
+import contextlib
+import discord
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+from common.store import StateStore
+
+
+log = logging.getLogger(__name__)
+
+
+class VoiceChannelPool:
+    """Hidden, pre-created voice channels that are claimed instead of created on join.
+
+    refill policy:
+        "eager": top the pool back up to `size` right after a claim
+        "lazy": only released channels go back into the pool
+
+    A channel is recycled when only the bot posted in its chat, those activity
+    messages are deleted first so the next owner never sees the previous session.
+    One where members chatted is deleted instead. Either way
+    `dispatch("managed_release", channel)` tells the cogs the session is over.
+    """
+
+    def __init__(self, category: discord.CategoryChannel, name: str, size: int = 2, max_size: int = 5, refill: str = "eager", store: Optional[StateStore] = None, dispatch: Optional[Callable[..., None]] = None, max_recycled_messages: int = 5):
+        self.category = category
+        self.store = store
+        self.dispatch = dispatch
+        self.name = name
+        self.size = size
+        self.max_size = max(size, max_size)
+        self.refill_policy = refill
+        # more activity messages than this are cheaper to drop with the channel
+        self.max_recycled_messages = max_recycled_messages
+
+        self.channels: Deque[discord.VoiceChannel] = deque()
+        # releases waiting on their edit, counted against max_size
+        self._releasing = 0
+        self._refill_lock = asyncio.Lock()
+        self._refill_task: Optional[asyncio.Task] = None
+
+        self.claimed = 0
+        self.created = 0
+        self.released = 0
+        self.deleted = 0
+
+    def hidden_overwrites(self) -> Dict[discord.abc.Snowflake, discord.PermissionOverwrite]:
+        guild = self.category.guild
+        return {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False, connect=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, connect=True, manage_channels=True, move_members=True),
+        }
+
+    async def adopt(self):
+        """Take back idle pool channels left over from a previous run."""
+        records = await self.store.load_voice_channels(self.category.guild.id) if self.store else {}
+        known = {channel.id for channel in self.channels}
+
+        for channel in self.category.voice_channels:
+            if channel.members or channel.id in known:
+                continue
+
+            record = records.get(channel.id)
+            # channels pooled before the state store existed are recognised by name
+            if (record and record.pooled) or (record is None and channel.name == self.name):
+                self.channels.append(channel)
+                self._save(channel, None)
+
+        # forget channels that were deleted while the bot was offline
+        existing = {channel.id for channel in self.category.guild.channels}
+        for channel_id in records.keys() - existing:
+            self.store.delete_voice_channel(channel_id)
+
+    def _save(self, channel: discord.VoiceChannel, owner_id: Optional[int]):
+        if self.store:
+            self.store.save_voice_channel(channel.id, channel.guild.id, owner_id, pooled=owner_id is None)
+
+    def is_pooled(self, channel: discord.abc.GuildChannel) -> bool:
+        return any(pooled.id == channel.id for pooled in self.channels)
+
+    async def _create(self, name: str, overwrites: dict, owner_id: Optional[int] = None) -> discord.VoiceChannel:
+        self.created += 1
+        channel = await self.category.guild.create_voice_channel(name=name, category=self.category, overwrites=overwrites)
+        self._save(channel, owner_id)
+        return channel
+
+    async def claim(self, name: str, overwrites: dict, owner_id: int) -> discord.VoiceChannel:
+        channel = None
+        while self.channels and channel is None:
+            pooled = self.channels.popleft()
+            try:
+                # rename and apply overwrites in a single PATCH
+                channel = await pooled.edit(name=name, overwrites=overwrites)
+            except discord.NotFound:
+                # deleted by someone else while it was idle
+                self.forget(pooled)
+                continue
+
+        if channel is None:
+            channel = await self._create(name, overwrites, owner_id)
+        else:
+            self.claimed += 1
+            self._save(channel, owner_id)
+
+        if self.refill_policy == "eager":
+            self.schedule_refill()
+
+        return channel
+
+    async def _bot_messages(self, channel: discord.VoiceChannel) -> Optional[List[discord.Message]]:
+        """The chat of the channel when only the bot posted in it, None once a member did.
+
+        The bot's own messages in a voice chat are the activity log of the session.
+        """
+        messages: List[discord.Message] = []
+        try:
+            async for message in channel.history(limit=self.max_recycled_messages + 1):
+                if message.author.id != channel.guild.me.id:
+                    return None
+                messages.append(message)
+        except discord.Forbidden:
+            return None
+        return messages if len(messages) <= self.max_recycled_messages else None
+
+    async def release(self, channel: discord.VoiceChannel) -> bool:
+        """Put an empty channel back into the pool, or delete it when the pool is full or members chatted in it.
+
+        The activity messages of the bot are deleted before the channel goes back
+        into the pool. Returns False without changing the channel when someone
+        joined in the meantime.
+        """
+        if channel.members:
+            return False
+        if len(self.channels) + self._releasing >= self.max_size:
+            return await self._delete(channel)
+
+        # the slot is held from the history check until the channel is back in the pool
+        self._releasing += 1
+        try:
+            bot_messages = await self._bot_messages(channel)
+            if channel.members:
+                return False
+            if bot_messages is None:
+                return await self._delete(channel)
+
+            for message in bot_messages:
+                # deleted by a moderator in the meantime
+                with contextlib.suppress(discord.NotFound):
+                    await message.delete()
+            await channel.edit(name=self.name, overwrites=self.hidden_overwrites())
+        finally:
+            self._releasing -= 1
+        self.released += 1
+        self.channels.append(channel)
+        self._save(channel, None)
+        self._released(channel)
+        return True
+
+    async def _delete(self, channel: discord.VoiceChannel) -> bool:
+        self.deleted += 1
+        await channel.delete()
+        self.forget(channel)
+        self._released(channel)
+        return True
+
+    def _released(self, channel: discord.VoiceChannel):
+        if self.dispatch:
+            self.dispatch("managed_release", channel)
+
+    def forget(self, channel: discord.abc.GuildChannel):
+        """Drop a deleted channel from the pool and the state store."""
+        self.channels = deque(pooled for pooled in self.channels if pooled.id != channel.id)
+        if self.store:
+            self.store.delete_voice_channel(channel.id)
+
+    def schedule_refill(self):
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self.refill())
+
+    async def refill(self):
+        async with self._refill_lock:
+            while len(self.channels) < self.size:
+                try:
+                    self.channels.append(await self._create(self.name, self.hidden_overwrites(), None))
+                except discord.HTTPException:
+                    log.exception("Failed to refill the voice channel pool")
+                    return
+
+    def close(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self.channels),
+            "claimed": self.claimed,
+            "created": self.created,
+            "released": self.released,
+            "deleted": self.deleted,
+        }
@@ -0,0 +1,81 @@
+import datetime
+import time
+from typing import Dict, List, Optional, Tuple
+from common.store import StateStore
+
+
+def day_of(timestamp: float) -> str:
+    return datetime.date.fromtimestamp(timestamp).isoformat()
+
+
+def split_by_day(started_at: float, ended_at: float) -> List[Tuple[str, float]]:
+    """(day, seconds) for every local day the interval touches."""
+    parts = []
+    while started_at < ended_at:
+        next_day = datetime.date.fromtimestamp(started_at) + datetime.timedelta(days=1)
+        midnight = datetime.datetime.combine(next_day, datetime.time()).timestamp()
+        until = min(midnight, ended_at)
+        parts.append((day_of(started_at), until - started_at))
+        started_at = until
+    return parts
+
+
+class VoiceSessionTracker:
+    """Open voice sessions in memory, closed sessions aggregated per member and day until flushed.
+
+    A burst of joins and leaves only touches two dicts, the database sees one
+    upsert per member and day per flush.
+    """
+
+    def __init__(self):
+        # (guild_id, user_id) -> session start, epoch seconds
+        self.sessions: Dict[Tuple[int, int], float] = {}
+        # (guild_id, user_id, day) -> [seconds, sessions]
+        self.pending: Dict[Tuple[int, int, str], List[float]] = {}
+
+        self.opened = 0
+        self.closed = 0
+        self.flushed = 0
+
+    def open(self, guild_id: int, user_id: int, now: Optional[float] = None):
+        if (guild_id, user_id) not in self.sessions:
+            self.sessions[guild_id, user_id] = now or time.time()
+            self.opened += 1
+
+    def close(self, guild_id: int, user_id: int, now: Optional[float] = None):
+        started_at = self.sessions.pop((guild_id, user_id), None)
+        if started_at is None:
+            return
+
+        self.closed += 1
+        for index, (day, seconds) in enumerate(split_by_day(started_at, now or time.time())):
+            aggregate = self.pending.setdefault((guild_id, user_id, day), [0.0, 0])
+            aggregate[0] += seconds
+            # the session counts on the day it started
+            aggregate[1] += index == 0
+
+    def close_all(self, now: Optional[float] = None):
+        now = now or time.time()
+        for guild_id, user_id in list(self.sessions):
+            self.close(guild_id, user_id, now)
+
+    def elapsed(self, guild_id: int, user_id: int, now: Optional[float] = None) -> float:
+        """Seconds of the member's session in progress, not flushed yet."""
+        started_at = self.sessions.get((guild_id, user_id))
+        return (now or time.time()) - started_at if started_at else 0.0
+
+    def flush(self, store: StateStore) -> int:
+        pending, self.pending = self.pending, {}
+        for (guild_id, user_id, day), (seconds, sessions) in pending.items():
+            store.add_voice_time(guild_id, user_id, day, seconds, int(sessions))
+        self.flushed += len(pending)
+        return len(pending)
+
+    def stats(self) -> dict:
+        return {
+            "open": len(self.sessions),
+            "pending": len(self.pending),
+            "opened": self.opened,
+            "closed": self.closed,
+            "flushed": self.flushed,
+        }
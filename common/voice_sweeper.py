@@ -0,0 +1,123 @@
+import asyncio
+import discord
+import logging
+import time
+from typing import Collection, Dict, List, Optional
+from common.store import VoiceChannelRecord
+from common.voice_pool import VoiceChannelPool
+
+
+log = logging.getLogger(__name__)
+
+
+class SweepReport:
+    """Every voice channel of a generator category, by what the sweep made of it."""
+
+    def __init__(self, guild_id: int, dry_run: bool):
+        self.guild_id = guild_id
+        self.dry_run = dry_run
+
+        # created by the bot, in use or about to be
+        self.occupied: List[discord.VoiceChannel] = []
+        self.pooled: List[discord.VoiceChannel] = []
+        self.pending: List[discord.VoiceChannel] = []
+        self.claiming: List[discord.VoiceChannel] = []
+        # created by the bot, empty and nobody on the way in
+        self.orphaned: List[discord.VoiceChannel] = []
+        # not created by the bot, never touched
+        self.foreign: List[discord.VoiceChannel] = []
+
+        self.released = 0
+        # orphans over the per-pass limit, left for the next pass
+        self.deferred = 0
+        self.api_calls = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "dry_run": self.dry_run,
+            **{name: len(getattr(self, name)) for name in ("occupied", "pooled", "pending", "claiming", "orphaned", "foreign")},
+            "released": self.released,
+            "deferred": self.deferred,
+            "api_calls": self.api_calls,
+            "seconds": self.seconds,
+        }
+
+
+def classify(generator: discord.VoiceChannel, pool: VoiceChannelPool, records: Dict[int, VoiceChannelRecord], pending: Collection[int], dry_run: bool, adopt_unrecorded: bool = False, generated_suffix: Optional[str] = None) -> SweepReport:
+    """One pass over the cached category, no API call.
+
+    With `adopt_unrecorded`, a channel without a record that is empty and named
+    like a generated channel (ending in `generated_suffix`) is counted as
+    orphaned instead of foreign, it was created before the state store existed.
+    """
+    report = SweepReport(generator.guild.id, dry_run)
+    for channel in generator.category.voice_channels:
+        if channel.id == generator.id:
+            continue
+
+        record = records.get(channel.id)
+        if record is None:
+            if adopt_unrecorded and _is_unrecorded_orphan(channel, pending, generated_suffix):
+                report.orphaned.append(channel)
+            else:
+                report.foreign.append(channel)
+        elif channel.members:
+            report.occupied.append(channel)
+        elif record.pooled or pool.is_pooled(channel):
+            # a pooled record outside the pool is being claimed right now
+            report.pooled.append(channel)
+        elif channel.id in pending:
+            report.pending.append(channel)
+        elif _owner_is_joining(channel.guild, record.owner_id, generator.id):
+            report.claiming.append(channel)
+        else:
+            report.orphaned.append(channel)
+    return report
+
+
+def _is_unrecorded_orphan(channel: discord.VoiceChannel, pending: Collection[int], generated_suffix: Optional[str]) -> bool:
+    return bool(generated_suffix) and not channel.members and channel.id not in pending and channel.name.endswith(generated_suffix)
+
+
+def _owner_is_joining(guild: discord.Guild, owner_id: int, generator_id: int) -> bool:
+    # the channel was created for the owner, who waits in the generator until the move
+    owner = guild.get_member(owner_id)
+    return bool(owner and owner.voice and owner.voice.channel and owner.voice.channel.id == generator_id)
+
+
+async def sweep(generator: discord.VoiceChannel, pool: VoiceChannelPool, records: Dict[int, VoiceChannelRecord], pending: Collection[int], dry_run: bool = False, max_releases: int = 25, concurrency: int = 2, adopt_unrecorded: bool = False, generated_suffix: Optional[str] = None) -> SweepReport:
+    """Release the orphaned channels of the generator's category back into the pool.
+
+    At most `max_releases` orphans are released per pass and at most
+    `concurrency` at a time, so a large backlog is spread over several passes
+    instead of running into the channel rate limit.
+    """
+    started_at = time.perf_counter()
+    report = classify(generator, pool, records, pending, dry_run, adopt_unrecorded, generated_suffix)
+
+    if not dry_run:
+        orphans = report.orphaned[:max_releases]
+        report.deferred = len(report.orphaned) - len(orphans)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def release(channel: discord.VoiceChannel):
+            async with semaphore:
+                try:
+                    released = await pool.release(channel)
+                except discord.HTTPException as error:
+                    report.api_calls += 1
+                    if isinstance(error, discord.NotFound):
+                        # deleted since the scan
+                        pool.forget(channel)
+                    else:
+                        log.warning("Failed to release orphaned voice channel %s: %s", channel.id, error)
+                    return
+
+                report.api_calls += released
+                report.released += released
+
+        await asyncio.gather(*(release(channel) for channel in orphans))
+
+    report.seconds = time.perf_counter() - started_at
+    return report
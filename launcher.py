@@ -0,0 +1,180 @@
+"""Run the bot as several shard processes coordinated over local IPC.
+
+    python launcher.py --shards 8 --processes 4
+    python launcher.py --shards 8 --processes 4 --stub    # no Discord connection
+
+Each process runs a ShardedBot with a contiguous range of shard ids. The
+launcher hosts the IPC coordinator (common/ipc.py), restarts processes that
+exit and logs per-shard health.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import signal
+from typing import Dict, List
+
+from common import const
+from common.ipc import IPCClient, IPCCoordinator
+from common.structured_logging import setup_logging
+
+
+log = logging.getLogger("launcher")
+
+HEALTH_INTERVAL = 30.0
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    processes = max(1, min(processes, shard_count))
+    per_process, remainder = divmod(shard_count, processes)
+
+    ranges, start = [], 0
+    for index in range(processes):
+        size = per_process + (1 if index < remainder else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class StubGateway:
+    """Stands in for the Discord gateway so the launcher and IPC can be exercised locally."""
+
+    def __init__(self, shard_ids: List[int]):
+        self.shard_ids = shard_ids
+        self.guilds = {shard_id: random.randint(1, 50) for shard_id in shard_ids}
+
+    def shard_health(self) -> Dict[str, dict]:
+        return {
+            str(shard_id): {"latency": random.uniform(0.03, 0.12), "closed": False, "guilds": self.guilds[shard_id]}
+            for shard_id in self.shard_ids
+        }
+
+    async def guild_count(self) -> int:
+        return sum(self.guilds.values())
+
+    def on_broadcast(self, name: str, data):
+        log.info("Shards %s received broadcast %s", self.shard_ids, name)
+
+
+async def run_worker(worker: int, shard_ids: List[int], shard_count: int, port: int, stub: bool):
+    if stub:
+        gateway = StubGateway(shard_ids)
+        ipc = IPCClient(worker, shard_ids, "127.0.0.1", port, gateway.shard_health, heartbeat=5.0)
+        ipc.query_handlers["guild_count"] = gateway.guild_count
+        ipc.broadcast_handlers.append(gateway.on_broadcast)
+        await ipc.start()
+        await asyncio.Event().wait()
+        return
+
+    # Imported here so the launcher process itself never loads the cogs
+    from main import ShardedBot
+
+    bot = ShardedBot(shard_ids=shard_ids, shard_count=shard_count)
+    bot.ipc = IPCClient(worker, shard_ids, "127.0.0.1", port, bot.shard_health)
+    async with bot:
+        await bot.start(const.TOKEN)
+
+
+def process_log_path(name: str) -> str:
+    # a rotating file can only have one writer, every process gets its own
+    root, ext = os.path.splitext(const.LOG_PATH)
+    return f"{root}.{name}{ext}"
+
+
+def worker_main(worker: int, shard_ids: List[int], shard_count: int, port: int, stub: bool):
+    pipeline = setup_logging(process_log_path(f"worker{worker}"), const.LOG_LEVEL, const.LOG_MAX_BYTES, const.LOG_BACKUP_COUNT, prefix=f"[worker {worker}] ", worker=worker)
+    # The launcher decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(run_worker(worker, shard_ids, shard_count, port, stub))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+
+
+async def recommended_shard_count() -> int:
+    import discord
+
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(const.TOKEN)
+        _, shard_count = await http.get_bot_gateway()
+        return shard_count
+    finally:
+        await http.close()
+
+
+async def launch(shard_count: int, processes: int, stub: bool):
+    if shard_count <= 0:
+        shard_count = processes if stub else await recommended_shard_count()
+
+    coordinator = IPCCoordinator()
+    port = await coordinator.start()
+    log.info("IPC coordinator listening on 127.0.0.1:%s", port)
+
+    context = multiprocessing.get_context("spawn")
+    ranges = split_shards(shard_count, processes)
+
+    def start(worker: int) -> multiprocessing.Process:
+        process = context.Process(
+            target=worker_main,
+            args=(worker, ranges[worker], shard_count, port, stub),
+            name=f"shard-worker-{worker}",
+            daemon=True,
+        )
+        process.start()
+        log.info("Started worker %s (pid %s) with shards %s", worker, process.pid, ranges[worker])
+        return process
+
+    workers = {worker: start(worker) for worker in range(len(ranges))}
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    try:
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=HEALTH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if stopping.is_set():
+                break
+
+            for worker, process in list(workers.items()):
+                if not process.is_alive():
+                    log.warning("Worker %s exited with %s, restarting", worker, process.exitcode)
+                    workers[worker] = start(worker)
+
+            guild_counts = await coordinator.query("guild_count")
+            log.info("Guilds across %s worker(s): %s", len(guild_counts), sum(count or 0 for count in guild_counts))
+            for shard_id, shard in sorted(coordinator.health().items(), key=lambda item: int(item[0])):
+                log.info("shard %s: %s", shard_id, shard)
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join(timeout=10)
+        await coordinator.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=const.SHARD_COUNT, help="total shard count, 0 for Discord's recommendation")
+    parser.add_argument("--processes", type=int, default=const.SHARD_PROCESSES)
+    parser.add_argument("--stub", action="store_true", help="use a stub gateway instead of connecting to Discord")
+    args = parser.parse_args()
+
+    pipeline = setup_logging(process_log_path("launcher"), const.LOG_LEVEL, const.LOG_MAX_BYTES, const.LOG_BACKUP_COUNT, prefix="[launcher] ")
+    try:
+        asyncio.run(launch(args.shards, args.processes, args.stub))
+    finally:
+        pipeline.stop()
+
+
+if __name__ == "__main__":
+    main()
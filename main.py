@@ -1,38 +1,276 @@
+import time
+STARTED_AT = time.perf_counter()
+
+import asyncio
+import contextlib
 import discord
+import functools
+import logging
+import math
+import signal
 from discord.ext import commands
-from common import const
+from typing import Dict, Optional
+from common import config, const
+from common.bootstrap import Bootstrap
+from common.guild_config import GuildConfigRegistry
+from common.hot_reload import ExtensionReloader
+from common.intents import IntentsProfile, profile_for_extensions
+from common.ipc import IPCClient
+from common.metrics import Metrics
+from common.sender import MessageScheduler
+from common.store import StateStore
+from common.structured_logging import bind_event, event_context, setup_logging
+from common.tree_sync import sync_if_changed
+import utils
 
 
-class Bot(commands.Bot):
-    def __init__(self):
-        super().__init__(
-            command_prefix=const.PREFIX,
-            intents=discord.Intents.all(),
-            sync_command=True,
-        )
+log = logging.getLogger("bot")
+
 
+class BotBase:
+    """Setup shared by the single-process Bot and the ShardedBot used by launcher.py."""
+
+    def __init__(self, **options):
         self.initial_extension = [
             "Cogs.error_handler",
+            "Cogs.admin_handler",
+            "Cogs.voice_state_router",
             "Cogs.voice_channel_handler",
             "Cogs.voice_channel_log_handler",
+            "Cogs.voice_stats_handler",
             "Cogs.role_handler",
             "Cogs.channel_entry_handler",
             "Cogs.self_description_handler",
         ]
+        # Its member listeners are what makes the bot chunk every guild at startup
+        if config.ROLE_COUNTS:
+            self.initial_extension.append("Cogs.role_count_handler")
+
+        if const.INTENTS_PROFILE == "all":
+            profile = IntentsProfile(discord.Intents.all(), discord.MemberCacheFlags.all(), True)
+        else:
+            # Only what the loaded cogs listen to, see common/intents.py
+            profile = profile_for_extensions(self.initial_extension)
+
+        # Set once close() starts, gateway events are no longer dispatched to the cogs
+        self.draining = False
+        self._shutdown: Optional[asyncio.Future] = None
+
+        # Without METRICS_PORT nothing is instrumented, see common/metrics.py
+        self.metrics: Optional[Metrics] = Metrics() if const.METRICS_PORT else None
+
+        super().__init__(
+            command_prefix=const.PREFIX,
+            intents=profile.intents,
+            member_cache_flags=profile.member_cache_flags,
+            chunk_guilds_at_startup=profile.chunk_guilds_at_startup,
+            sync_command=True,
+            http_trace=self.metrics.trace_config() if self.metrics else None,
+            **options,
+        )
+
+        self.sender = MessageScheduler()
+        self.store = StateStore(const.STATE_DB_PATH)
+        # Loaded before the extensions, their bootstrap_requires reads it
+        self.guild_config = GuildConfigRegistry(const.GUILD_CONFIG_PATH)
+        self.bootstrap = Bootstrap(self, local_only=isinstance(self, commands.AutoShardedBot))
+        self.reloader = ExtensionReloader(self)
+        # Set by launcher.py when running as one of several shard processes
+        self.ipc: Optional[IPCClient] = None
+
+        # seconds spent in each startup phase, logged on the first READY
+        self.startup_timings: Dict[str, float] = {"import": time.perf_counter() - STARTED_AT}
+        self.setup_finished_at: Optional[float] = None
 
     async def setup_hook(self):
-        for ext in self.initial_extension:
-            await self.load_extension(ext)
+        await self.store.open()
+
+        # A container stop sends SIGTERM, drain like on Ctrl+C instead of dying mid-request
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.begin_shutdown)
+
+        if self.metrics:
+            self.metrics.attach(self)
+            self.metrics.gauges.append(self.metrics_gauges)
+            # one port per shard process
+            await self.metrics.start(const.METRICS_HOST, const.METRICS_PORT + (self.ipc.worker if self.ipc else 0))
+
+        started_at = time.perf_counter()
+        # The extensions do not depend on each other, their setup can run concurrently
+        await asyncio.gather(*(self.load_extension(ext) for ext in self.initial_extension))
+        self.startup_timings["extension_load"] = time.perf_counter() - started_at
+
+        # The command tree is global, with several shard processes only worker 0 syncs it
+        if not self.ipc or self.ipc.worker == 0:
+            started_at = time.perf_counter()
+            synced = await sync_if_changed(self, const.COMMAND_TREE_HASH_PATH, force=const.FORCE_TREE_SYNC)
+            self.startup_timings["tree_sync"] = time.perf_counter() - started_at
+            log.info("Command tree %s", "synced" if synced else "unchanged, sync skipped")
+
+        if self.ipc:
+            self.ipc.query_handlers["guild_count"] = self.ipc_guild_count
+            self.ipc.broadcast_handlers.append(self.ipc_broadcast)
+            await self.ipc.start()
+
+        self.guild_config.watch(const.GUILD_CONFIG_WATCH_INTERVAL, self.apply_guild_config)
+        if const.EXTENSION_WATCH_INTERVAL:
+            self.reloader.watch(const.EXTENSION_WATCH_INTERVAL)
+        self.setup_finished_at = time.perf_counter()
+
+    def metrics_gauges(self) -> Dict[str, float]:
+        sender = self.sender.stats()
+        gauges = {f"modoco_sender_{name}": sender[name] for name in ("depth", "sent", "failed", "merged", "dropped")}
+        gauges.update({f"modoco_resolver_{name}": value for name, value in utils.get_resolver_stats().items()})
+        return gauges
 
-        await bot.tree.sync()
+    async def add_cog(self, cog: commands.Cog, /, **kwargs):
+        # A cog of a reloaded extension gets its predecessor's state before cog_load runs
+        self.reloader.restore(cog)
+        await super().add_cog(cog, **kwargs)
+
+    async def reload_guild_config(self) -> bool:
+        """Reload the guild config file now, raises if it is invalid."""
+        changed = self.guild_config.reload()
+        if changed:
+            await self.apply_guild_config()
+        return changed
+
+    async def apply_guild_config(self):
+        log.info("Applying guild config for %d guild(s)", len(self.guild_config.all()))
+        self.dispatch("guild_config_reload")
+        # Resolve the new ids and let every cog pick them up through on_bootstrap_ready
+        if self.is_ready():
+            await self.bootstrap.run(started_at=time.perf_counter())
+
+    async def ipc_guild_count(self) -> int:
+        return len(self.guilds)
+
+    def ipc_broadcast(self, name: str, data):
+        # Cogs react with @commands.Cog.listener() async def on_ipc_broadcast(self, name, data)
+        self.dispatch("ipc_broadcast", name, data)
+
+    async def _run_event(self, coro, event_name: str, *args, **kwargs):
+        # Records logged by the listener carry its event, guild, channel and member
+        token = bind_event(event_name, args)
+        if self.metrics:
+            coro = functools.partial(self._timed_listener, getattr(coro, "__qualname__", event_name), coro)
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            event_context.reset(token)
+
+    def _timed_listener(self, name: str, listener, *args, **kwargs):
+        return self.metrics.time_listener(name, listener(*args, **kwargs))
+
+    def dispatch(self, event_name: str, /, *args, **kwargs):
+        # No new work is started while draining for shutdown
+        if self.draining:
+            return
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def drain(self, timeout: float):
+        """Finish the deferred work within `timeout` and journal what is left, see replay_journal()."""
+        started_at = time.perf_counter()
+
+        # Cogs implementing `async def cog_drain(self, timeout)` push their buffered work out,
+        # the sender delivers concurrently
+        cogs = [cog for cog in self.cogs.values() if hasattr(cog, "cog_drain")]
+        results = await asyncio.gather(*(cog.cog_drain(timeout) for cog in cogs), return_exceptions=True)
+        for cog, result in zip(cogs, results):
+            if isinstance(result, Exception):
+                log.error("Failed to drain %s", cog.qualified_name, exc_info=result)
+
+        drained = await self.sender.drain(max(0.0, timeout - (time.perf_counter() - started_at)))
+        entries = [] if drained else self.sender.pending_sends()
+        for entry in entries:
+            self.store.journal("send", entry["guild_id"], entry)
+
+        log.info("Drained in %.3fs, %d unsent message(s) journaled", time.perf_counter() - started_at, len(entries))
+
+    async def replay_journal(self):
+        """Queue the sends the previous process journaled on shutdown."""
+        entries = await self.store.take_journal("send", (guild.id for guild in self.guilds))
+        for entry in entries:
+            channel = self.get_channel(entry["channel_id"])
+            if channel is not None:
+                self.sender.send_entry(channel, entry)
+        if entries:
+            log.info("Replayed %d journaled message(s)", len(entries))
+
+    def begin_shutdown(self) -> asyncio.Future:
+        # SIGTERM and the end of Bot.run both close, the shutdown runs once.
+        # Kept on self, the loop only holds a weak reference to the task.
+        if self._shutdown is None:
+            self._shutdown = asyncio.ensure_future(self.shutdown())
+            self._shutdown.add_done_callback(self._shutdown_done)
+        return self._shutdown
+
+    def _shutdown_done(self, future: asyncio.Future):
+        # nobody awaits it when SIGTERM started it
+        if not future.cancelled() and future.exception() is not None:
+            log.error("Shutdown failed", exc_info=future.exception())
+
+    async def close(self):
+        await asyncio.shield(self.begin_shutdown())
+
+    async def shutdown(self):
+        self.draining = True
+        if self.ipc:
+            await self.ipc.close()
+        self.guild_config.close()
+        self.reloader.close()
+        if self.is_ready():
+            await self.drain(config.SHUTDOWN_DEADLINE)
+        await self.sender.close()
+        await super().close()
+        # after super().close() so cogs can still write their state from cog_unload
+        await self.store.close()
+        if self.metrics:
+            await self.metrics.close()
 
     async def on_ready(self):
-        print(f"DISCORD BOT : {self.user}")
-        print(
-            f"Discord Version : {discord.__version__}")
-        print(f"On ready")
+        first_ready = "ready" not in self.startup_timings
+        if first_ready:
+            self.startup_timings["ready"] = time.perf_counter() - self.setup_finished_at
+
+        # Resolve the config ids once for every cog and start each cog as soon as its own are ready
+        duration = await self.bootstrap.run(started_at=STARTED_AT if first_ready else time.perf_counter())
+        if first_ready:
+            # cold start to operational, the one number to watch for boot regressions
+            self.startup_timings["operational"] = duration
+            log.info("Startup breakdown: %s", " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in self.startup_timings.items()))
+            await self.replay_journal()
+        else:
+            log.info("Bootstrap after reconnect took %.3fs", duration)
+
+        log.info("Ready as %s, discord.py %s", self.user, discord.__version__)
+
+
+class Bot(BotBase, commands.Bot):
+    pass
+
+
+class ShardedBot(BotBase, commands.AutoShardedBot):
+    def shard_health(self) -> Dict[str, dict]:
+        guild_counts: Dict[int, int] = {}
+        for guild in self.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+
+        return {
+            str(shard_id): {
+                "latency": None if math.isinf(shard.latency) or math.isnan(shard.latency) else shard.latency,
+                "closed": shard.is_closed(),
+                "guilds": guild_counts.get(shard_id, 0),
+            }
+            for shard_id, shard in self.shards.items()
+        }
 
 
 if __name__ == '__main__':
-    bot = Bot()
-    bot.run(const.TOKEN)
+    pipeline = setup_logging(const.LOG_PATH, const.LOG_LEVEL, const.LOG_MAX_BYTES, const.LOG_BACKUP_COUNT)
+    try:
+        bot = Bot()
+        # the root logger is already set up, discord.py must not add its own handler
+        bot.run(const.TOKEN, log_handler=None)
+    finally:
+        pipeline.stop()
@@ -0,0 +1,124 @@
+import asyncio
+from common.deferred import DeferredScheduler
+
+
+def recorder(log: list, name, delay: float = 0.0):
+    async def action():
+        await asyncio.sleep(delay)
+        log.append(name)
+    return action
+
+
+def test_actions_run_in_due_order():
+    async def main():
+        ran = []
+        scheduler = DeferredScheduler()
+        scheduler.schedule("b", 0.02, recorder(ran, "b"))
+        scheduler.schedule("a", 0.01, recorder(ran, "a"))
+        await asyncio.sleep(0.05)
+
+        assert ran == ["a", "b"]
+        assert scheduler.stats()["executed"] == 2 and not scheduler.pending()
+
+    asyncio.run(main())
+
+
+def test_reschedule_replaces_the_pending_action():
+    async def main():
+        ran = []
+        scheduler = DeferredScheduler()
+        scheduler.schedule("key", 0.01, recorder(ran, "first"))
+        scheduler.schedule("key", 0.03, recorder(ran, "second"))
+
+        await asyncio.sleep(0.02)
+        # the stale heap entry of the first generation is skipped
+        assert ran == [] and scheduler.is_pending("key")
+        await asyncio.sleep(0.03)
+        assert ran == ["second"]
+        assert scheduler.cancelled == 1 and scheduler.executed == 1
+
+    asyncio.run(main())
+
+
+def test_cancel_drops_the_action():
+    async def main():
+        ran = []
+        scheduler = DeferredScheduler()
+        scheduler.schedule("key", 0.01, recorder(ran, "key"))
+
+        assert scheduler.cancel("key")
+        assert not scheduler.cancel("key")
+        await asyncio.sleep(0.03)
+        assert ran == [] and not scheduler.is_pending("key")
+
+    asyncio.run(main())
+
+
+def test_cancel_then_schedule_again_runs_once():
+    async def main():
+        ran = []
+        scheduler = DeferredScheduler()
+        scheduler.schedule("key", 0.01, recorder(ran, "old"))
+        scheduler.cancel("key")
+        scheduler.schedule("key", 0.01, recorder(ran, "new"))
+        await asyncio.sleep(0.03)
+
+        assert ran == ["new"]
+
+    asyncio.run(main())
+
+
+def test_concurrency_is_capped():
+    async def main():
+        running = 0
+        peak = 0
+
+        async def action():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        scheduler = DeferredScheduler(max_concurrency=2)
+        for key in range(6):
+            scheduler.schedule(key, 0, action)
+        assert await scheduler.drain(1.0) == []
+
+        assert peak == 2 and scheduler.executed == 6
+
+    asyncio.run(main())
+
+
+def test_failing_action_is_counted_and_the_rest_still_run():
+    async def main():
+        ran = []
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        scheduler = DeferredScheduler()
+        scheduler.schedule("bad", 0, failing)
+        scheduler.schedule("good", 0, recorder(ran, "good"))
+        await asyncio.sleep(0.02)
+
+        assert ran == ["good"] and scheduler.failed == 1
+
+    asyncio.run(main())
+
+
+def test_drain_runs_pending_actions_now_and_returns_the_unfinished_keys():
+    async def main():
+        ran = []
+        scheduler = DeferredScheduler(max_concurrency=1)
+        scheduler.schedule("fast", 60, recorder(ran, "fast"))
+        scheduler.schedule("slow", 60, recorder(ran, "slow", delay=1.0))
+
+        unfinished = await scheduler.drain(0.1)
+        assert ran == ["fast"]
+        assert unfinished == ["slow"]
+        assert scheduler.active_keys() == {"slow"} and not scheduler.pending()
+        await scheduler.close()
+        assert scheduler.active_keys() == set()
+
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+import os
+import sysconfig
+import time
+from common.error_aggregator import ErrorAggregator, fingerprint
+
+
+def raised(error: Exception) -> Exception:
+    try:
+        raise error
+    except Exception as caught:
+        return caught
+
+
+def raise_value_error(message: str) -> Exception:
+    return raised(ValueError(message))
+
+
+def raise_key_error(message: str) -> Exception:
+    return raised(KeyError(message))
+
+
+def test_fingerprint_ignores_the_message():
+    first = fingerprint("on_error", raise_value_error("member 1"))
+    second = fingerprint("on_error", raise_value_error("member 2"))
+
+    assert first == second
+    assert first.type == "ValueError" and first.line is not None
+
+
+def test_fingerprint_separates_type_location_and_event():
+    value_error = fingerprint("on_error", raise_value_error("x"))
+    assert fingerprint("on_error", raise_key_error("x")) != value_error
+    assert fingerprint("get_view_error", raise_value_error("x")) != value_error
+    # an error that was never raised has no frame
+    assert fingerprint("on_error", ValueError("x")).file is None
+
+
+def test_repeats_are_counted_not_reported():
+    aggregator = ErrorAggregator(window=60.0)
+
+    assert aggregator.record("on_error", raise_value_error("a")) is not None
+    for _ in range(4):
+        assert aggregator.record("on_error", raise_value_error("a")) is None
+
+    assert aggregator.recorded == 5 and aggregator.suppressed == 4
+    summary, skipped = aggregator.summarize()
+    assert [(group.fingerprint.type, count) for group, count in summary] == [("ValueError", 5)]
+    assert skipped == 0
+    # nothing new since the summary
+    assert aggregator.summarize() == ([], 0)
+
+
+def test_report_budget_caps_new_groups_and_summaries():
+    aggregator = ErrorAggregator(window=60.0, max_reports_per_window=2)
+
+    assert aggregator.record("a", raise_value_error("x")) is not None
+    assert aggregator.record("b", raise_value_error("x")) is not None
+    # a new fingerprint, but the budget is spent
+    assert aggregator.record("c", raise_value_error("x")) is None
+
+    summary, skipped = aggregator.summarize()
+    assert summary == [] and skipped == 1
+
+
+def test_summary_is_hottest_first_within_the_budget():
+    aggregator = ErrorAggregator(window=60.0, max_reports_per_window=3)
+    aggregator.record("a", raise_value_error("x"))
+    aggregator.record("b", raise_value_error("x"))
+    aggregator.record("a", raise_value_error("x"))
+    for _ in range(3):
+        aggregator.record("b", raise_value_error("x"))
+
+    # one report left in the window, it goes to the group with the most occurrences
+    summary, skipped = aggregator.summarize()
+    assert [(group.fingerprint.event, count) for group, count in summary] == [("b", 4)]
+    assert skipped == 1
+
+
+def test_prune_forgets_quiet_reported_groups():
+    aggregator = ErrorAggregator(window=0.05)
+    aggregator.record("a", raise_value_error("x"))
+    time.sleep(0.06)
+
+    aggregator.prune()
+    assert aggregator.groups == {}
+
+
+# stands in for discord/http.py, where every HTTPException is raised
+LIBRARY_RAISE = compile("def request():\n    raise ValueError('404 Not Found')\n", os.path.join(sysconfig.get_paths()["purelib"], "discord", "http.py"), "exec")
+library = {}
+exec(LIBRARY_RAISE, library)
+
+
+def fetch_channel() -> Exception:
+    try:
+        library["request"]()
+    except Exception as caught:
+        return caught
+
+
+def fetch_role() -> Exception:
+    try:
+        library["request"]()
+    except Exception as caught:
+        return caught
+
+
+def test_fingerprint_uses_the_call_site_in_the_repo():
+    channel = fingerprint("on_ready", fetch_channel())
+    role = fingerprint("on_ready", fetch_role())
+
+    assert channel != role
+    assert channel.file == __file__
+
+
+def test_fingerprint_falls_back_to_the_innermost_frame():
+    error = ValueError("x")
+    try:
+        library["request"]()
+    except ValueError as caught:
+        error = caught
+    # only the test's own frame is in the repo, drop it
+    error.__traceback__ = error.__traceback__.tb_next
+
+    assert fingerprint("on_ready", error).file.endswith(os.path.join("discord", "http.py"))
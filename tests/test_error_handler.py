@@ -0,0 +1,18 @@
+import asyncio
+from types import SimpleNamespace
+
+from Cogs.error_handler import ErrorHandler
+
+
+def test_traced_error_is_reported_once_and_not_raised_again():
+    bot = SimpleNamespace(tree=SimpleNamespace(error=lambda coro: coro))
+    handler = ErrorHandler(bot)
+    interaction = SimpleNamespace(guild_id=1, channel_id=2, user=SimpleNamespace(id=3))
+
+    try:
+        raise ValueError("boom")
+    except ValueError as error:
+        # raising again would hand it to Client.on_error, which logs and reports it a second time
+        asyncio.run(handler.trace_error("get_view_error", error, interaction))
+
+    assert len(handler.early_errors) == 1
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from common import config
+from common.guild_config import GuildConfigRegistry, load_snapshot
+
+
+OTHER_GUILD_ID = 42
+
+
+def write(tmp_path, data):
+    path = tmp_path / "guilds.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return str(path)
+
+
+def test_without_a_file_only_the_home_guild_is_served(tmp_path):
+    snapshot = load_snapshot(str(tmp_path / "missing.json"))
+
+    assert snapshot.get(config.GUILD_ID).generator_channel_id == config.AUTO_VOICE_CHANNEL_GENERATOR_CHANNEL_ID
+    assert snapshot.get(OTHER_GUILD_ID) is None
+    assert len(snapshot.all()) == 1
+
+
+def test_ids_of_the_home_guild_do_not_leak_into_other_guilds(tmp_path):
+    snapshot = load_snapshot(write(tmp_path, {"guilds": [
+        {"guild_id": config.GUILD_ID},
+        {"guild_id": OTHER_GUILD_ID, "generator_channel_id": 7},
+    ]}))
+
+    home = snapshot.get(config.GUILD_ID)
+    other = snapshot.get(OTHER_GUILD_ID)
+    assert home.welcome_channel_id == config.WELCOME_CHANNEL_ID
+    assert other.generator_channel_id == 7
+    assert other.welcome_channel_id == 0
+    assert other.default_role_id == 0
+
+
+def test_default_entry_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_snapshot(write(tmp_path, {"guilds": [], "default": {}}))
+
+
+def test_entry_without_guild_id_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_snapshot(write(tmp_path, {"guilds": [{"generator_channel_id": 7}]}))
+
+
+@pytest.mark.parametrize("guilds", [
+    [{"guild_id": OTHER_GUILD_ID, "welcome_channel_id": None}],
+    [{"guild_id": True}],
+    ["not an object"],
+    [{"guild_id": OTHER_GUILD_ID, "role_conflict_groups": [1, 2]}],
+    {"guild_id": OTHER_GUILD_ID},
+])
+def test_malformed_entries_raise_value_error(tmp_path, guilds):
+    with pytest.raises(ValueError):
+        load_snapshot(write(tmp_path, {"guilds": guilds}))
+
+
+def test_ids_may_be_strings(tmp_path):
+    snapshot = load_snapshot(write(tmp_path, {"guilds": [{"guild_id": str(OTHER_GUILD_ID), "welcome_channel_id": "7"}]}))
+
+    assert snapshot.get(OTHER_GUILD_ID).welcome_channel_id == 7
+
+
+def test_watcher_survives_a_failing_reload(tmp_path):
+    path = write(tmp_path, {"guilds": [{"guild_id": OTHER_GUILD_ID}]})
+    registry = GuildConfigRegistry(path)
+    applied = []
+
+    async def on_change():
+        applied.append(registry.get(OTHER_GUILD_ID).welcome_channel_id)
+
+    async def main():
+        registry.watch(0.01, on_change)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write('{"guilds": [{"guild_id": 42, "welcome_channel_id": null}]}')
+        os.utime(path, (1, 1))
+        await asyncio.sleep(0.05)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write('{"guilds": [{"guild_id": 42, "welcome_channel_id": 7}]}')
+        os.utime(path, (2, 2))
+        await asyncio.sleep(0.05)
+        registry.close()
+
+    asyncio.run(main())
+    assert applied == [7]
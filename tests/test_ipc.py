@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from common.ipc import IPCClient, IPCCoordinator
+
+
+async def start_worker(port: int, worker: int, guilds: int, **kwargs) -> IPCClient:
+    client = IPCClient(worker, [worker], "127.0.0.1", port, lambda: {str(worker): {"guilds": guilds}}, heartbeat=0.01, **kwargs)
+
+    async def guild_count():
+        return guilds
+
+    client.query_handlers["guild_count"] = guild_count
+    client.received = []
+    client.broadcast_handlers.append(lambda name, data: client.received.append((name, data)))
+    await client.start()
+    return client
+
+
+async def wait_for_workers(coordinator: IPCCoordinator, count: int):
+    while len(coordinator.workers) != count:
+        await asyncio.sleep(0.005)
+
+
+def test_query_and_broadcast_reach_every_worker():
+    async def main():
+        coordinator = IPCCoordinator(query_timeout=1.0)
+        port = await coordinator.start()
+        first = await start_worker(port, 0, 3)
+        second = await start_worker(port, 1, 4)
+        await wait_for_workers(coordinator, 2)
+
+        assert sorted(await first.query("guild_count")) == [3, 4]
+        assert sorted(await coordinator.query("guild_count")) == [3, 4]
+
+        await second.broadcast("reload_config", {"guild": 1})
+        await asyncio.sleep(0.05)
+        assert first.received == second.received == [("reload_config", {"guild": 1})]
+
+        assert set(coordinator.health()) == {"0", "1"}
+        assert coordinator._replies == {} and first._replies == {}
+
+        await first.close()
+        await second.close()
+        await coordinator.close()
+
+    asyncio.run(main())
+
+
+def test_timed_out_query_leaves_no_reply_behind():
+    async def main():
+        coordinator = IPCCoordinator(query_timeout=0.05)
+        port = await coordinator.start()
+        fast = await start_worker(port, 0, 3)
+        slow = await start_worker(port, 1, 4)
+
+        async def never():
+            await asyncio.sleep(10)
+
+        slow.query_handlers["guild_count"] = never
+        await wait_for_workers(coordinator, 2)
+
+        assert await coordinator.query("guild_count") == [3]
+        assert coordinator._replies == {}
+        assert all(not connection.queries for connection in coordinator.workers.values())
+
+        # the relayed query waits for the slow worker longer than this caller does
+        with pytest.raises(asyncio.TimeoutError):
+            await fast.query("guild_count", timeout=0.01)
+        assert fast._replies == {}
+
+        await fast.close()
+        await slow.close()
+        await coordinator.close()
+
+    asyncio.run(main())
+
+
+def test_disconnected_worker_fails_the_pending_query_at_once():
+    async def main():
+        coordinator = IPCCoordinator(query_timeout=5.0)
+        port = await coordinator.start()
+        worker = await start_worker(port, 0, 3)
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        worker.query_handlers["guild_count"] = hang
+        await wait_for_workers(coordinator, 1)
+
+        query = asyncio.create_task(coordinator.query("guild_count"))
+        await asyncio.sleep(0.05)
+        await worker.close()
+
+        assert await asyncio.wait_for(query, 1.0) == []
+        assert coordinator._replies == {}
+        await coordinator.close()
+
+    asyncio.run(main())
+
+
+def test_worker_reconnects_and_fails_fast_while_disconnected():
+    async def main():
+        coordinator = IPCCoordinator(query_timeout=1.0)
+        port = await coordinator.start()
+        worker = await start_worker(port, 0, 3, reconnect_delay=0.05)
+        await wait_for_workers(coordinator, 1)
+
+        await coordinator.close()
+        await asyncio.sleep(0.01)
+        assert not worker.connected
+        with pytest.raises(ConnectionError):
+            await worker.query("guild_count")
+        with pytest.raises(ConnectionError):
+            await worker.broadcast("reload_config")
+
+        coordinator = IPCCoordinator(port=port, query_timeout=1.0)
+        await coordinator.start()
+        await asyncio.wait_for(wait_for_workers(coordinator, 1), 2.0)
+
+        assert worker.reconnects == 1
+        assert await worker.query("guild_count") == [3]
+
+        await worker.close()
+        await coordinator.close()
+
+    asyncio.run(main())
+
+
+def test_failing_query_handler_is_logged_and_released(caplog):
+    async def main():
+        coordinator = IPCCoordinator(query_timeout=0.05)
+        port = await coordinator.start()
+        worker = await start_worker(port, 0, 3)
+
+        async def broken():
+            raise RuntimeError("handler bug")
+
+        worker.query_handlers["guild_count"] = broken
+        await wait_for_workers(coordinator, 1)
+
+        assert await coordinator.query("guild_count") == []
+        assert worker._answers == set()
+
+        await worker.close()
+        await coordinator.close()
+
+    asyncio.run(main())
+    assert any(record.exc_info and "handler bug" in str(record.exc_info[1]) for record in caplog.records)
@@ -0,0 +1,160 @@
+import asyncio
+import discord
+import pytest
+from utils import ResolverCache
+
+
+class FakeResponse:
+    status = 404
+    reason = "Not Found"
+
+
+def counting_fetch(value, calls, delay=0.0):
+    async def fetch():
+        calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+    return fetch
+
+
+def test_hit_after_first_fetch():
+    async def main():
+        cache = ResolverCache()
+        calls = []
+        assert await cache.resolve("a", counting_fetch(1, calls)) == 1
+        assert await cache.resolve("a", counting_fetch(2, calls)) == 1
+        assert calls == [1]
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    asyncio.run(main())
+
+
+def test_entries_expire_after_ttl():
+    async def main():
+        cache = ResolverCache(ttl=0.05)
+        calls = []
+        await cache.resolve("a", counting_fetch(1, calls))
+        await asyncio.sleep(0.1)
+        assert await cache.resolve("a", counting_fetch(2, calls)) == 2
+        assert calls == [1, 2]
+
+    asyncio.run(main())
+
+
+def test_least_recently_used_is_evicted():
+    async def main():
+        cache = ResolverCache(maxsize=2)
+        calls = []
+        await cache.resolve("a", counting_fetch("a", calls))
+        await cache.resolve("b", counting_fetch("b", calls))
+        # touching "a" makes "b" the oldest
+        await cache.resolve("a", counting_fetch("a", calls))
+        await cache.resolve("c", counting_fetch("c", calls))
+
+        assert cache.evictions == 1
+        await cache.resolve("a", counting_fetch("a", calls))
+        await cache.resolve("b", counting_fetch("b", calls))
+        assert calls == ["a", "b", "c", "b"]
+
+    asyncio.run(main())
+
+
+def test_not_found_is_cached_for_the_negative_ttl():
+    async def main():
+        cache = ResolverCache(ttl=60.0, negative_ttl=0.05)
+        calls = []
+
+        async def missing():
+            calls.append(None)
+            raise discord.NotFound(FakeResponse(), "Unknown Channel")
+
+        assert await cache.resolve("gone", missing) is None
+        assert await cache.resolve("gone", missing) is None
+        assert len(calls) == 1 and cache.negative_hits == 1
+
+        await asyncio.sleep(0.1)
+        assert await cache.resolve("gone", missing) is None
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_other_errors_are_not_cached():
+    async def main():
+        cache = ResolverCache()
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await cache.resolve("a", failing)
+        assert await cache.resolve("a", counting_fetch(1, [])) == 1
+
+    asyncio.run(main())
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def main():
+        cache = ResolverCache()
+        calls = []
+        results = await asyncio.gather(*(cache.resolve("a", counting_fetch(1, calls, delay=0.01)) for _ in range(10)))
+
+        assert results == [1] * 10
+        assert calls == [1]
+        assert cache.coalesced == 9
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(main())
+
+
+def test_waiters_see_the_fetch_error():
+    async def main():
+        cache = ResolverCache()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(cache.resolve("a", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(main())
+
+
+def test_waiters_fetch_again_when_the_fetching_caller_is_cancelled():
+    async def main():
+        cache = ResolverCache()
+        calls = []
+        owner = asyncio.create_task(cache.resolve("a", counting_fetch(1, calls, delay=0.05)))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.resolve("a", counting_fetch(2, calls, delay=0.01)))
+        await asyncio.sleep(0.01)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+        # the waiter was not cancelled itself, it becomes the next fetcher
+        assert await waiter == 2
+        assert calls == [1, 2]
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_fetch_running():
+    async def main():
+        cache = ResolverCache()
+        calls = []
+        owner = asyncio.create_task(cache.resolve("a", counting_fetch(1, calls, delay=0.02)))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.resolve("a", counting_fetch(2, calls)))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert await owner == 1
+        assert calls == [1]
+
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from common.intents import profile_for_extensions
+from common.role_counts import RoleCounter
+
+
+GUILD_ID = 1
+TRACKED = (10, 11, 12)
+
+
+def member(member_id: int, *role_ids: int):
+    return SimpleNamespace(id=member_id, roles=[SimpleNamespace(id=role_id) for role_id in role_ids])
+
+
+def built_counter(*members) -> RoleCounter:
+    counter = RoleCounter(TRACKED)
+    counter.build(SimpleNamespace(id=GUILD_ID, members=list(members)))
+    return counter
+
+
+def test_build_counts_only_tracked_roles():
+    counter = built_counter(member(1, 10, 99), member(2, 10, 11))
+
+    assert counter.counts(GUILD_ID) == {10: 2, 11: 1, 12: 0}
+
+
+def test_change_touches_only_the_changed_roles():
+    counter = built_counter(member(1, 10))
+
+    assert counter.apply_change(GUILD_ID, 1, {10}, {10, 12, 99})
+    assert counter.counts(GUILD_ID) == {10: 1, 11: 0, 12: 1}
+    # an untracked role alone changes no count
+    assert not counter.apply_change(GUILD_ID, 1, {10, 12, 99}, {10, 12})
+    assert counter.apply_change(GUILD_ID, 1, {10, 12}, {12})
+    assert counter.counts(GUILD_ID) == {10: 0, 11: 0, 12: 1}
+
+
+def test_change_after_the_button_update_counts_once():
+    counter = built_counter(member(1))
+
+    assert counter.update(GUILD_ID, 1, [11])
+    # the member update from the gateway that follows the callback
+    assert not counter.apply_change(GUILD_ID, 1, set(), {11})
+    assert counter.counts(GUILD_ID)[11] == 1
+
+
+def test_untracked_guild_is_ignored():
+    counter = RoleCounter(TRACKED)
+
+    assert not counter.apply_change(GUILD_ID, 1, set(), {10})
+    assert counter.counts(GUILD_ID) == {}
+
+
+def test_chunking_comes_only_with_the_role_count_listeners():
+    extensions = ["Cogs.role_handler", "Cogs.channel_entry_handler"]
+
+    assert not profile_for_extensions(extensions).chunk_guilds_at_startup
+    assert profile_for_extensions(extensions + ["Cogs.role_count_handler"]).chunk_guilds_at_startup
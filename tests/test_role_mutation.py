@@ -0,0 +1,162 @@
+import asyncio
+import gc
+from types import SimpleNamespace
+from common.role_mutation import RoleMutationQueue
+
+
+class FakeRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+
+    def is_default(self) -> bool:
+        return self.id == 0
+
+    def __lt__(self, other: "FakeRole") -> bool:
+        return self.id < other.id
+
+
+class FakeGuild:
+    def __init__(self, role_ids):
+        self.id = 1
+        self.roles = {role_id: FakeRole(role_id) for role_id in (0, *role_ids)}
+        self.default_role = self.roles[0]
+        self.members = {}
+
+    def get_role(self, role_id: int):
+        return self.roles.get(role_id)
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+
+class FakeMember:
+    def __init__(self, guild: FakeGuild, member_id: int, role_ids=()):
+        self.guild = guild
+        self.id = member_id
+        self.roles = [guild.default_role, *(guild.roles[role_id] for role_id in role_ids)]
+        self.edits = []
+        guild.members[member_id] = self
+
+    async def edit(self, roles):
+        await asyncio.sleep(0)
+        self.edits.append(sorted(role.id for role in roles))
+        self.roles = [self.guild.default_role, *roles]
+
+
+def role_ids(roles) -> set:
+    return {role.id for role in roles if not role.is_default()}
+
+
+def test_clicks_inside_the_window_become_one_edit():
+    async def main():
+        guild = FakeGuild([10, 11, 12])
+        member = FakeMember(guild, 5, [10])
+        queue = RoleMutationQueue(window=0.01)
+
+        pending = [
+            queue.submit(member, add=[11]),
+            queue.submit(member, add=[12], remove=[10]),
+            queue.submit(member, remove=[11]),
+        ]
+        assert queue.projected_role_ids(member) == {0, 12}
+
+        results = await asyncio.gather(*pending)
+        assert member.edits == [[12]]
+        assert queue.submitted == 3 and queue.applied == 1
+        assert all(role_ids(roles) == {12} for roles in results)
+
+    asyncio.run(main())
+
+
+def test_no_edit_when_the_clicks_cancel_out():
+    async def main():
+        guild = FakeGuild([10])
+        member = FakeMember(guild, 5)
+        queue = RoleMutationQueue(window=0.01)
+
+        queue.submit(member, add=[10])
+        roles = await queue.submit(member, remove=[10])
+        assert member.edits == []
+        assert role_ids(roles) == set()
+
+    asyncio.run(main())
+
+
+def test_click_during_an_edit_is_applied_on_top_of_it():
+    async def main():
+        guild = FakeGuild([10, 11])
+        member = FakeMember(guild, 5)
+        queue = RoleMutationQueue(window=0.01)
+
+        first = queue.submit(member, add=[10])
+        await asyncio.sleep(0.015)
+        second = queue.submit(member, add=[11])
+        await asyncio.gather(first, second)
+
+        assert member.edits == [[10], [10, 11]]
+        assert queue._locks == {}
+
+    asyncio.run(main())
+
+
+def test_edit_failure_reaches_every_caller():
+    async def main():
+        guild = FakeGuild([10])
+        member = FakeMember(guild, 5)
+
+        async def forbidden(roles):
+            raise PermissionError("missing permissions")
+
+        member.edit = forbidden
+        queue = RoleMutationQueue(window=0.01)
+        results = await asyncio.gather(queue.submit(member, add=[10]), queue.submit(member, add=[10]), return_exceptions=True)
+        assert all(isinstance(result, PermissionError) for result in results)
+
+    asyncio.run(main())
+
+
+def test_pending_flush_survives_garbage_collection():
+    async def main():
+        guild = FakeGuild([10])
+        member = FakeMember(guild, 5)
+        queue = RoleMutationQueue(window=0.01)
+
+        # nobody keeps the returned future, only the queue references the flush
+        queue.submit(member, add=[10])
+        gc.collect()
+        await asyncio.sleep(0.03)
+
+        assert member.edits == [[10]]
+        assert not queue._flushes
+
+    asyncio.run(main())
+
+
+def test_click_during_an_edit_builds_on_the_returned_roles_without_a_member_cache():
+    async def main():
+        guild = FakeGuild([10, 11])
+        # the interaction member of every click, never updated in place
+        member = FakeMember(guild, 5)
+        guild.members.clear()
+        edits = []
+
+        async def edit(roles):
+            await asyncio.sleep(0.01)
+            edits.append(sorted(role.id for role in roles))
+            return SimpleNamespace(roles=[guild.default_role, *roles])
+
+        member.edit = edit
+        queue = RoleMutationQueue(window=0.01)
+
+        first = queue.submit(member, add=[10])
+        await asyncio.sleep(0.015)
+        # clicked while the first edit is in flight, member.roles still lacks role 10
+        second = queue.submit(member, add=[11])
+        roles = await second
+        await first
+
+        assert edits == [[10], [10, 11]]
+        assert role_ids(roles) == {10, 11}
+        assert queue._applied == {}
+
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+import asyncio
+import discord
+from common.sender import MessageScheduler, Priority
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, log: list, delay: float = 0.0):
+        self.id = channel_id
+        self.log = log
+        self.delay = delay
+
+    async def send(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.log.append((self.id, kwargs))
+        return len(self.log)
+
+
+def embed(title: str) -> discord.Embed:
+    return discord.Embed(title=title)
+
+
+def test_higher_priorities_go_first():
+    async def main():
+        sent = []
+        channel = FakeChannel(1, sent)
+        scheduler = MessageScheduler()
+
+        scheduler.send(channel, content="log", priority=Priority.LOG)
+        scheduler.send(channel, content="default")
+        scheduler.send(channel, content="error", priority=Priority.ERROR)
+        scheduler.send(channel, content="interaction", priority=Priority.INTERACTION)
+        await scheduler.drain(1.0)
+
+        assert [kwargs["content"] for _, kwargs in sent] == ["interaction", "error", "default", "log"]
+        assert scheduler.stats()["depth"] == 0
+
+    asyncio.run(main())
+
+
+def test_log_embeds_are_merged_up_to_ten_per_message():
+    async def main():
+        sent = []
+        channel = FakeChannel(1, sent)
+        scheduler = MessageScheduler()
+
+        futures = [scheduler.send(channel, embed=embed(str(index)), priority=Priority.LOG) for index in range(12)]
+        await scheduler.drain(1.0)
+
+        assert [len(kwargs["embeds"]) for _, kwargs in sent] == [10, 2]
+        assert [embed.title for embed in sent[0][1]["embeds"]] == [str(index) for index in range(10)]
+        assert scheduler.merged == 10
+        # merged sends resolve to the message they ended up in
+        assert futures[0].result() == futures[9].result() == 1 and futures[10].result() == 2
+
+    asyncio.run(main())
+
+
+def test_only_plain_log_embeds_are_merged():
+    async def main():
+        sent = []
+        channel = FakeChannel(1, sent)
+        scheduler = MessageScheduler()
+
+        scheduler.send(channel, embed=embed("a"), priority=Priority.LOG)
+        scheduler.send(channel, embed=embed("b"), content="text", priority=Priority.LOG)
+        scheduler.send(channel, embed=embed("c"))
+        scheduler.send(channel, embed=embed("d"))
+        await scheduler.drain(1.0)
+
+        assert len(sent) == 4 and scheduler.merged == 0
+
+    asyncio.run(main())
+
+
+def test_full_queue_drops_new_log_jobs_but_keeps_higher_priorities():
+    async def main():
+        sent = []
+        channel = FakeChannel(1, sent)
+        scheduler = MessageScheduler(max_channel_queue=3)
+
+        logs = [scheduler.send(channel, content=f"log {index}", priority=Priority.LOG) for index in range(4)]
+        error = scheduler.send(channel, content="error", priority=Priority.ERROR)
+        await scheduler.drain(1.0)
+
+        assert [kwargs["content"] for _, kwargs in sent] == ["error", "log 0", "log 1", "log 2"]
+        assert logs[3].result() is None
+        assert error.result() is not None and scheduler.dropped == 1
+
+    asyncio.run(main())
+
+
+def test_log_job_is_dropped_when_nothing_lower_can_make_room():
+    async def main():
+        sent = []
+        channel = FakeChannel(1, sent)
+        scheduler = MessageScheduler(max_channel_queue=2)
+
+        scheduler.send(channel, content="a")
+        scheduler.send(channel, content="b")
+        dropped = scheduler.send(channel, content="log", priority=Priority.LOG)
+        assert dropped.done() and dropped.result() is None
+
+        # higher priorities are never dropped
+        scheduler.send(channel, content="c")
+        await scheduler.drain(1.0)
+        assert [kwargs["content"] for _, kwargs in sent] == ["a", "b", "c"]
+
+    asyncio.run(main())
+
+
+def test_dropped_log_job_for_a_new_channel_leaves_no_queue():
+    async def main():
+        sent = []
+        scheduler = MessageScheduler(max_total_queue=1)
+
+        scheduler.send(FakeChannel(1, sent, delay=0.01), content="a")
+        scheduler.send(FakeChannel(1, sent, delay=0.01), content="b")
+        dropped = scheduler.send(FakeChannel(2, sent), content="log", priority=Priority.LOG)
+
+        assert dropped.result() is None
+        assert 2 not in scheduler._queues and 2 not in scheduler._channels
+        await scheduler.drain(1.0)
+        assert scheduler._queues == {} and scheduler._channels == {}
+
+    asyncio.run(main())
+
+
+def test_drain_reports_a_timeout_and_pending_sends():
+    async def main():
+        sent = []
+        channel = FakeChannel(1, sent, delay=0.05)
+        channel.guild = type("Guild", (), {"id": 9})()
+        scheduler = MessageScheduler(max_concurrency=1)
+
+        for index in range(3):
+            scheduler.send(channel, content=str(index))
+        assert not await scheduler.drain(0.01)
+        assert [entry["content"] for entry in scheduler.pending_sends()] == ["1", "2"]
+        assert await scheduler.drain(1.0)
+        await scheduler.close()
+
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from common.store import StateStore, fts_query
+
+
+@pytest.mark.parametrize("text, query", [
+    ("rust", '"rust"*'),
+    ("Rust  github", '"Rust"* "github"*'),
+    ('"rust"', '"rust"*'),
+    ("rust*", '"rust"*'),
+    ("-rust", '"rust"*'),
+    ("rust OR go", '"rust"* "OR"* "go"*'),
+    ("NEAR(rust go)", '"NEAR"* "rust"* "go"*'),
+    ("name:rust", '"name"* "rust"*'),
+    ("러스트 개발자", '"러스트"* "개발자"*'),
+    ("", ""),
+    ("   ", ""),
+    ('" * - ^ : ( )', ""),
+    ("rust\x00go", '"rust"* "go"*'),
+])
+def test_fts_query_quotes_every_word(text, query):
+    assert fts_query(text) == query
+
+
+def search(tmp_path, introductions, queries):
+    async def main():
+        store = StateStore(str(tmp_path / "state.db"))
+        await store.open()
+        for user_id, name, description in introductions:
+            store.save_introduction(1, user_id, name, description, f"https://github.com/{name}")
+        try:
+            return [await store.search_introductions(1, query) for query in queries]
+        finally:
+            await store.close()
+
+    return asyncio.run(main())
+
+
+INTRODUCTIONS = [
+    (10, "alice", "Rust and Go backend developer"),
+    (11, "bob", "프론트엔드 개발자, React"),
+    (12, "carol", "Rust game developer"),
+]
+
+
+def test_search_matches_every_word_as_a_prefix(tmp_path):
+    (rust, _), (rust_game, total), (korean, _), (prefix, _) = search(tmp_path, INTRODUCTIONS, ["rust", "rust game", "개발자", "dev"])
+
+    assert {introduction.user_id for introduction in rust} == {10, 12}
+    assert [introduction.user_id for introduction in rust_game] == [12] and total == 1
+    assert [introduction.user_id for introduction in korean] == [11]
+    assert {introduction.user_id for introduction in prefix} == {10, 12}
+    assert "**Rust**" in rust_game[0].snippet
+
+
+@pytest.mark.parametrize("text", ['"', '"rust', "*", "-", "- rust", "OR", "rust OR", "AND NOT", "NEAR(", "name:", "^rust", "rust\x00", "\x00", "", "'"])
+def test_search_never_raises_on_fts_syntax(tmp_path, text):
+    [(introductions, total)] = search(tmp_path, INTRODUCTIONS, [text])
+    assert total == len(introductions)
+
+
+def test_operators_are_searched_as_words(tmp_path):
+    [(rust_or_react, _), (rust_minus_game, _)] = search(tmp_path, INTRODUCTIONS, ["rust OR react", "rust -game"])
+
+    # OR is a term like any other, nobody wrote it
+    assert rust_or_react == []
+    # and - does not exclude
+    assert [introduction.user_id for introduction in rust_minus_game] == [12]
+
+
+def test_search_is_scoped_to_the_guild(tmp_path):
+    async def main():
+        store = StateStore(str(tmp_path / "state.db"))
+        await store.open()
+        store.save_introduction(1, 10, "alice", "rust", "")
+        store.save_introduction(2, 20, "dave", "rust", "")
+        try:
+            return await store.search_introductions(2, "rust")
+        finally:
+            await store.close()
+
+    introductions, total = asyncio.run(main())
+    assert [introduction.user_id for introduction in introductions] == [20] and total == 1
@@ -0,0 +1,24 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+from common import tree_sync
+
+
+def test_concurrent_syncs_do_not_share_a_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tree_sync, "tree_hash", lambda tree: "hash")
+    path = str(tmp_path / "tree_hash.json")
+
+    async def sync():
+        await asyncio.sleep(0)
+
+    async def main():
+        # shard processes of the same application
+        clients = [SimpleNamespace(application_id=1, tree=SimpleNamespace(sync=sync)) for _ in range(4)]
+        return await asyncio.gather(*(tree_sync.sync_if_changed(client, path) for client in clients))
+
+    assert asyncio.run(main()) == [True] * 4
+    assert os.listdir(tmp_path) == ["tree_hash.json"]
+    with open(path, encoding="utf-8") as file:
+        assert json.load(file) == {"1": "hash"}
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+from common.voice_pool import VoiceChannelPool
+
+
+BOT_ID = 10
+
+
+class FakeUser:
+    # hashable, the pool uses the guild's roles and members as overwrite keys
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", author_id: int):
+        self.channel = channel
+        self.author = FakeUser(author_id)
+
+    async def delete(self):
+        self.channel.messages.remove(self)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild, *author_ids: int):
+        self.id = channel_id
+        self.guild = guild
+        self.members = []
+        self.messages = [FakeMessage(self, author_id) for author_id in author_ids]
+        self.history_calls = 0
+        self.deleted = False
+        self.name = "alice 님의 통화방"
+
+    async def history(self, limit: int):
+        self.history_calls += 1
+        for message in self.messages[:limit]:
+            yield message
+
+    async def delete(self):
+        self.deleted = True
+
+    async def edit(self, name, overwrites):
+        self.name = name
+        return self
+
+
+def make_pool(max_size: int = 5):
+    guild = SimpleNamespace(id=1, me=FakeUser(BOT_ID), default_role=FakeUser(1))
+    released = []
+    pool = VoiceChannelPool(SimpleNamespace(guild=guild), "대기 중인 통화방", size=0, max_size=max_size, dispatch=lambda event, channel: released.append(channel.id))
+    return pool, guild, released
+
+
+def test_channel_with_only_the_activity_log_is_recycled():
+    pool, guild, released = make_pool()
+    channel = FakeChannel(1, guild, BOT_ID, BOT_ID)
+
+    assert asyncio.run(pool.release(channel))
+
+    assert not channel.deleted
+    assert channel.messages == []
+    assert channel.name == pool.name
+    assert list(pool.channels) == [channel]
+    assert released == [1]
+
+
+def test_channel_where_members_chatted_is_deleted():
+    pool, guild, released = make_pool()
+    channel = FakeChannel(1, guild, BOT_ID, 1000)
+
+    assert asyncio.run(pool.release(channel))
+
+    assert channel.deleted
+    assert len(channel.messages) == 2
+    assert not pool.channels
+    assert released == [1]
+
+
+def test_full_pool_deletes_without_reading_the_chat():
+    pool, guild, _ = make_pool(max_size=0)
+    channel = FakeChannel(1, guild, BOT_ID)
+
+    assert asyncio.run(pool.release(channel))
+
+    assert channel.deleted
+    assert channel.history_calls == 0
+
+
+def test_occupied_channel_is_left_alone():
+    pool, guild, released = make_pool()
+    channel = FakeChannel(1, guild)
+    channel.members.append(object())
+
+    assert not asyncio.run(pool.release(channel))
+    assert not channel.deleted and released == []
@@ -0,0 +1,80 @@
+import datetime
+import time
+import pytest
+from common.voice_sessions import VoiceSessionTracker, split_by_day
+
+
+@pytest.fixture
+def local_time(monkeypatch):
+    def use(zone: str):
+        monkeypatch.setenv("TZ", zone)
+        time.tzset()
+
+    yield use
+    monkeypatch.undo()
+    time.tzset()
+
+
+def at(*args) -> float:
+    return datetime.datetime(*args).timestamp()
+
+
+def test_session_within_one_day(local_time):
+    local_time("Asia/Seoul")
+    assert split_by_day(at(2024, 3, 1, 10), at(2024, 3, 1, 12, 30)) == [("2024-03-01", 9000.0)]
+
+
+def test_session_across_midnight(local_time):
+    local_time("Asia/Seoul")
+    assert split_by_day(at(2024, 3, 1, 23, 30), at(2024, 3, 2, 0, 45)) == [
+        ("2024-03-01", 1800.0),
+        ("2024-03-02", 2700.0),
+    ]
+
+
+def test_session_over_several_days(local_time):
+    local_time("Asia/Seoul")
+    parts = split_by_day(at(2024, 2, 28, 22), at(2024, 3, 2, 1))
+    assert parts == [
+        ("2024-02-28", 7200.0),
+        ("2024-02-29", 86400.0),
+        ("2024-03-01", 86400.0),
+        ("2024-03-02", 3600.0),
+    ]
+
+
+def test_session_ending_exactly_at_midnight_stays_on_one_day(local_time):
+    local_time("Asia/Seoul")
+    assert split_by_day(at(2024, 3, 1, 23), at(2024, 3, 2)) == [("2024-03-01", 3600.0)]
+    # and one starting at midnight belongs to the new day
+    assert split_by_day(at(2024, 3, 2), at(2024, 3, 2, 0, 10)) == [("2024-03-02", 600.0)]
+
+
+def test_empty_or_reversed_interval(local_time):
+    local_time("Asia/Seoul")
+    assert split_by_day(at(2024, 3, 1, 10), at(2024, 3, 1, 10)) == []
+    assert split_by_day(at(2024, 3, 1, 10), at(2024, 3, 1, 9)) == []
+
+
+def test_daylight_saving_day_is_split_at_local_midnight(local_time):
+    local_time("Europe/Berlin")
+    # 2024-03-31 has only 23 hours in Berlin
+    parts = split_by_day(at(2024, 3, 30, 23), at(2024, 4, 1, 1))
+    assert parts == [
+        ("2024-03-30", 3600.0),
+        ("2024-03-31", 23 * 3600.0),
+        ("2024-04-01", 3600.0),
+    ]
+    assert sum(seconds for _, seconds in parts) == at(2024, 4, 1, 1) - at(2024, 3, 30, 23)
+
+
+def test_tracker_counts_the_session_on_its_first_day(local_time):
+    local_time("Asia/Seoul")
+    tracker = VoiceSessionTracker()
+    tracker.open(1, 2, now=at(2024, 3, 1, 23))
+    tracker.close(1, 2, now=at(2024, 3, 2, 1))
+
+    assert tracker.pending == {
+        (1, 2, "2024-03-01"): [3600.0, 1],
+        (1, 2, "2024-03-02"): [3600.0, 0],
+    }
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from common.store import VoiceChannelRecord
+from common.voice_sweeper import classify
+
+
+SUFFIX = " 님의 통화방"
+
+
+class FakePool:
+    def is_pooled(self, channel) -> bool:
+        return False
+
+
+def voice_channel(channel_id: int, name: str, members=()):
+    return SimpleNamespace(id=channel_id, name=name, members=list(members))
+
+
+def generator_with(*channels):
+    guild = SimpleNamespace(id=1, get_member=lambda member_id: None)
+    generator = SimpleNamespace(id=100, guild=guild)
+    generator.category = SimpleNamespace(voice_channels=[generator, *channels])
+    for channel in channels:
+        channel.guild = guild
+    return generator
+
+
+def classify_names(generator, records=None, pending=(), adopt_unrecorded=True):
+    report = classify(generator, FakePool(), records or {}, pending, dry_run=True, adopt_unrecorded=adopt_unrecorded, generated_suffix=SUFFIX)
+    return {name: [channel.id for channel in getattr(report, name)] for name in ("occupied", "pending", "orphaned", "foreign")}
+
+
+def test_empty_generated_channel_without_record_is_adopted():
+    generator = generator_with(voice_channel(1, f"alice{SUFFIX}"), voice_channel(2, "회의실"))
+
+    report = classify_names(generator)
+
+    assert report["orphaned"] == [1]
+    assert report["foreign"] == [2]
+
+
+def test_occupied_or_pending_unrecorded_channel_stays_foreign():
+    generator = generator_with(voice_channel(1, f"alice{SUFFIX}", members=[object()]), voice_channel(2, f"bob{SUFFIX}"))
+
+    report = classify_names(generator, pending=[2])
+
+    assert report["orphaned"] == []
+    assert report["foreign"] == [1, 2]
+
+
+def test_unrecorded_channels_are_foreign_once_adoption_is_over():
+    generator = generator_with(voice_channel(1, f"alice{SUFFIX}"), voice_channel(2, f"bob{SUFFIX}"))
+    records = {2: VoiceChannelRecord(2, 1, 7, 0.0, False)}
+
+    report = classify_names(generator, records, adopt_unrecorded=False)
+
+    assert report["foreign"] == [1]
+    assert report["orphaned"] == [2]
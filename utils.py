@@ -1,63 +1,177 @@
+import asyncio
+import time
 import discord
-from typing import Optional
-
-
-async def get_role_by_guild(guild: discord.Guild, role_id: int):
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class ResolverCache:
+    """TTL/LRU cache for REST lookups with negative caching and single-flight fetches."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def resolve(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+        # Another coroutine is already fetching this key, share its result
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            # Only the fetching coroutine was cancelled, this caller still wants the value
+            return await self.resolve(key, fetch)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                value = await fetch()
+            except (discord.NotFound, discord.Forbidden):
+                value = None
+            self._store(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting on the shared future, silence "never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+
+resolver = ResolverCache()
+
+
+def get_resolver_stats() -> Dict[str, int]:
+    return resolver.stats()
+
+
+async def _fetch_roles_by_id(guild: discord.Guild) -> Dict[int, discord.Role]:
+    return {role.id: role for role in await guild.fetch_roles()}
+
+
+async def get_role_by_guild(guild: discord.Guild, role_id: int) -> Optional[discord.Role]:
     # Get Cached Roles
-    role = guild.get_role(id)
+    role = guild.get_role(role_id)
+    if role != None:
+        resolver.hits += 1
+        return role
 
     # If the role is not cached, request directly to the Discord server
-    if role == None:
-        role = discord.utils.get(await guild.fetch_roles(), id=role_id)
+    # Every role of the guild comes back in one call, so cache the whole list per guild
+    roles = await resolver.resolve(("roles", guild.id), lambda: _fetch_roles_by_id(guild))
+    if roles == None:
+        return None
 
-    return role
+    return roles.get(role_id)
 
 
-async def get_role_by_guild_id(bot: discord.Client, guild_id: int, role_id: int):
+async def get_role_by_guild_id(bot: discord.Client, guild_id: int, role_id: int) -> Optional[discord.Role]:
     # Get Guild
     guild = await get_guild_by_id(bot, guild_id)
+    if guild == None:
+        return None
 
-    # Get Cached Roles
-    role = guild.get_role(id)
-
-    # If the role is not cached, request directly to the Discord server
-    if role == None:
-        role = discord.utils.get(await guild.fetch_roles(), id=role_id)
-
-    return role
+    return await get_role_by_guild(guild, role_id)
 
 
 async def get_channel_by_id(bot: discord.Client, channel_id: int) -> Optional[discord.abc.GuildChannel]:
     # Get Cached Channel
     channel: Optional[discord.abc.GuildChannel] = bot.get_channel(channel_id)
+    if channel != None:
+        resolver.hits += 1
+        return channel
 
     # If the channel is not cached, request directly to the Discord server
-    if channel == None:
-        channel: Optional[discord.abc.GuildChannel] = await bot.fetch_channel(channel_id)
-
-    return channel
+    return await resolver.resolve(("channel", channel_id), lambda: bot.fetch_channel(channel_id))
 
 
-async def get_guild_by_id(bot: discord.Client, guild_id: int):
+async def get_guild_by_id(bot: discord.Client, guild_id: int) -> Optional[discord.Guild]:
     # Get Cached Guild
     guild = bot.get_guild(guild_id)
+    if guild != None:
+        resolver.hits += 1
+        return guild
 
     # If the Guild is not cached, request directly to the Discord server
-    if guild == None:
-        guild = await bot.fetch_guild(guild_id)
+    return await resolver.resolve(("guild", guild_id), lambda: bot.fetch_guild(guild_id))
 
-    return guild
 
-
-async def get_user_by_id(bot: discord.Client, user_id: int):
-    # Get Cached Guild
+async def get_user_by_id(bot: discord.Client, user_id: int) -> Optional[discord.User]:
+    # Get Cached User
     user = bot.get_user(user_id)
+    if user != None:
+        resolver.hits += 1
+        return user
 
     # 만약 해당 유저가 캐시되어 있지 않으면 디스코드 서버에 직접 요청
-    if user == None:
-        user = await bot.fetch_user(user_id)
-
-    return user
+    return await resolver.resolve(("user", user_id), lambda: bot.fetch_user(user_id))
 
 
 def get_dummy_button():